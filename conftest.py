@@ -0,0 +1,3 @@
+# test_app.py is a Streamlit smoke-test app and scripts/test*.py are manual
+# checks of the installed models, not pytest tests
+collect_ignore = ["test_app.py", "scripts"]
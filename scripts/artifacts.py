@@ -0,0 +1,192 @@
+import argparse
+import base64
+import gzip
+import json
+import os
+import tempfile
+import time
+from .audio_extraction import AUDIO_CACHE_DIR, audio_cache_path
+from .database import DB_PATH, SOURCE_OCR, SOURCE_TRANSCRIPT, STAGE_AUDIO, STAGE_OCR, STAGE_ROWS, STAGE_TRANSCRIBE, IndexWriter
+
+# Directory the OCR and transcription results of every video are kept in,
+# one subdirectory per video content hash
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "data/artifacts")
+# Log of which content each video name was processed from (JSON Lines)
+VIDEOS_LOG = "videos.jsonl"
+# Version of the record layout, stored in the header line of each artifact
+ARTIFACT_VERSION = 1
+
+def artifact_path(video_hash, stage, artifact_dir=ARTIFACT_DIR):
+    """Path of the records a stage produced for the given video content"""
+    return os.path.join(artifact_dir, video_hash, f"{stage}.jsonl.gz")
+
+def _dumps(record):
+    return json.dumps(record, separators=(",", ":"), ensure_ascii=False)
+
+def write_records(path, records, header=None):
+    """Write records as gzipped JSON Lines, replacing path atomically
+
+    The first line is a header object ({"version": ..., **header}); readers
+    skip it. Returns the number of records written.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    count = 0
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".part", delete=False) as tmp:
+        try:
+            with gzip.GzipFile(fileobj=tmp, mode="wb", compresslevel=6, mtime=0) as f:
+                f.write((_dumps(dict(header or {}, version=ARTIFACT_VERSION)) + "\n").encode())
+                for record in records:
+                    f.write((_dumps(record) + "\n").encode())
+                    count += 1
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    os.replace(tmp.name, path)
+    return count
+
+def read_header(path):
+    """Header object of an artifact file"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.loads(f.readline())
+
+def read_records(path):
+    """Iterate over the records of an artifact file"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        f.readline()
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def record_video(video_name, video_hash, artifact_dir=ARTIFACT_DIR):
+    """Note that video_name was processed from the content video_hash
+
+    Lines are appended with a single small write, which is atomic on a
+    local file system, so workers can log concurrently.
+    """
+    os.makedirs(artifact_dir, exist_ok=True)
+    line = _dumps({"video": video_name, "content_hash": video_hash, "time": time.time()}) + "\n"
+    with open(os.path.join(artifact_dir, VIDEOS_LOG), "a", encoding="utf-8") as f:
+        f.write(line)
+
+def logged_videos(artifact_dir=ARTIFACT_DIR):
+    """{video name: content hash} of the latest processing of every video"""
+    videos = {}
+    path = os.path.join(artifact_dir, VIDEOS_LOG)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                videos[entry["video"]] = entry["content_hash"]
+    return videos
+
+def _bbox(box):
+    """Axis-aligned [x_min, y_min, x_max, y_max] of an EasyOCR box"""
+    xs = [point[0] for point in box]
+    ys = [point[1] for point in box]
+    return [int(min(xs)), int(min(ys)), int(round(max(xs))), int(round(max(ys)))]
+
+def ocr_record(frame_number, seconds, results, descriptor=None):
+    """Record of one OCR'd key frame
+
+    results is EasyOCR readtext() output; each detection keeps its
+    bounding box, text and confidence. descriptor is the frame's
+    (histogram, thumbnail) for visual search, stored base64 encoded.
+    """
+    record = {
+        "frame": int(frame_number),
+        "t": round(float(seconds), 3),
+        "text": ' '.join([result[1] for result in results]),
+        "boxes": [
+            {"box": _bbox(box), "text": text, "conf": round(float(confidence), 3)}
+            for box, text, confidence in results
+        ],
+    }
+    if descriptor is not None:
+        record["hist"] = base64.b64encode(descriptor[0]).decode()
+        record["thumb"] = base64.b64encode(descriptor[1]).decode()
+    return record
+
+def transcript_record(segment):
+    """Record of one transcript segment, with Whisper's confidence scores"""
+    record = {
+        "start": round(float(segment["start"]), 3),
+        "end": round(float(segment["end"]), 3),
+        "text": segment["text"],
+    }
+    for key in ("avg_logprob", "no_speech_prob"):
+        if segment.get(key) is not None:
+            record[key] = round(float(segment[key]), 4)
+    return record
+
+def index_records(writer, video_name, stage, records):
+    """Queue the index rows of a stage's records on an IndexWriter"""
+    if stage == STAGE_OCR:
+        for record in records:
+            writer.add_segment(video_name, SOURCE_OCR, record["t"], record["text"], frame_number=record["frame"])
+            if "hist" in record:
+                writer.add_frame_descriptor(video_name, record["frame"], record["t"],
+                                            base64.b64decode(record["hist"]), base64.b64decode(record["thumb"]))
+    elif stage == STAGE_TRANSCRIBE:
+        for record in records:
+            writer.add_segment(video_name, SOURCE_TRANSCRIPT, record["start"], record["text"], end_s=record["end"])
+
+def rebuild_index(db_path=DB_PATH, artifact_dir=ARTIFACT_DIR, audio_dir=AUDIO_CACHE_DIR):
+    """Recreate the search index from the stored artifacts, without any model
+
+    Every logged video is reindexed from the artifacts of its latest
+    content in one transaction: the rows of each stage with an artifact
+    are replaced and the stage checkpointed (the "audio" one too where the
+    decoded audio is still cached), as processing the video again would.
+    Videos and stages without artifacts (legacy rows, copies of another
+    video's checkpoints) are kept as they are. If an artifact cannot be
+    read, nothing changes. The text index is built once at the end rather
+    than row by row. Returns (videos, rows) indexed.
+    """
+    videos = logged_videos(artifact_dir)
+
+    indexed = set()
+    with IndexWriter(db_path, batch_size=10000) as writer:
+        writer.defer_text_index()
+        for video_name, video_hash in sorted(videos.items()):
+            for stage in (STAGE_OCR, STAGE_TRANSCRIBE):
+                path = artifact_path(video_hash, stage, artifact_dir)
+                if not os.path.exists(path):
+                    continue
+                sources, frame_descriptors = STAGE_ROWS[stage]
+                writer.replace(video_name, sources, frame_descriptors)
+                index_records(writer, video_name, stage, read_records(path))
+                writer.checkpoint(video_name, stage, video_hash)
+                indexed.add(video_name)
+            if video_name in indexed and os.path.exists(audio_cache_path(video_hash, audio_dir)):
+                writer.checkpoint(video_name, STAGE_AUDIO, video_hash)
+        writer.flush()
+        rows = writer.rows_written
+    return len(indexed), rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Processing result artifacts")
+    parser.add_argument("--artifacts", default=ARTIFACT_DIR, help="Artifact directory (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_parser = commands.add_parser("rebuild", help="Rebuild the search index from the artifacts")
+    rebuild_parser.add_argument("--db", default=DB_PATH, help="Index database (default: %(default)s)")
+
+    commands.add_parser("list", help="List the videos with artifacts")
+
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        start = time.time()
+        videos, rows = rebuild_index(args.db, args.artifacts)
+        print(f"Indexed {rows} rows of {videos} videos in {time.time() - start:.1f}s")
+    elif args.command == "list":
+        for video_name, video_hash in sorted(logged_videos(args.artifacts).items()):
+            stages = [stage for stage in (STAGE_OCR, STAGE_TRANSCRIBE)
+                      if os.path.exists(artifact_path(video_hash, stage, args.artifacts))]
+            print(f"{video_name} {video_hash[:12]} {', '.join(stages)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import tempfile
+import numpy as np
+from .storage import content_hash
+
+# Directory decoded audio tracks are cached in, one file per video content
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "data/audio")
+# Whisper works on 16 kHz mono audio
+SAMPLE_RATE = 16000
+# ffmpeg executable used to decode audio tracks
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+def audio_cache_path(video_hash, cache_dir=AUDIO_CACHE_DIR):
+    """Path of the cached PCM audio of the video with the given content hash"""
+    return os.path.join(cache_dir, f"{video_hash}.f32")
+
+def extract_audio(video_path, video_hash=None, cache_dir=AUDIO_CACHE_DIR):
+    """Decode the audio track of a video to 16 kHz mono float32 PCM, once
+
+    The raw samples are written to cache_dir under the video's content
+    hash, so retries, model changes and every later stage reuse them
+    instead of decoding the video again. Returns the path of the file; it
+    is empty for a video without audio.
+    """
+    video_hash = video_hash or content_hash(video_path)
+    path = audio_cache_path(video_hash, cache_dir)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=cache_dir, suffix=".part", delete=False) as tmp:
+        try:
+            command = [
+                FFMPEG_BINARY, "-nostdin", "-v", "error", "-i", video_path,
+                "-map", "0:a:0?", "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+                "-f", "f32le", "-"
+            ]
+            result = subprocess.run(command, stdout=tmp, stderr=subprocess.PIPE)
+            error = result.stderr.decode(errors="replace").strip()
+            if result.returncode != 0 and "does not contain any stream" not in error:
+                raise RuntimeError(f"ffmpeg failed on {video_path}: {error[-500:]}")
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    # Renamed into place once complete, so a crash never leaves a truncated cache
+    os.replace(tmp.name, path)
+    return path
+
+def load_audio(path):
+    """Memory-map a cached PCM file as a float32 array of samples
+
+    The mapping is copy-on-write: pages are read from disk as they are
+    used and the file itself is never modified.
+    """
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode="c")
+
+def get_audio(video_path, video_hash=None, cache_dir=AUDIO_CACHE_DIR):
+    """Samples of a video's audio track, decoded on first use"""
+    return load_audio(extract_audio(video_path, video_hash, cache_dir))
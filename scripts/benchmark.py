@@ -0,0 +1,420 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from .extract_frames import extract_frames, FRAME_SKIP, SAMPLE_MODES
+from .scene_detectors import DETECTORS
+from .database import IndexWriter, index_metadata, search_metadata, search_page
+from .synthetic_media import make_slide_video, make_speech_audio, mux_audio, synthetic_rows, write_wav
+
+# Queries timed against the synthetic index: frequent words, a rare one,
+# a phrase and a specific slide
+SEARCH_QUERIES = ("neural network", "search", "gradient descent", "slide 42")
+# Index sizes the suite searches
+SUITE_ROWS = (10000, 100000, 1000000)
+
+def benchmark_sampling(video_path, modes=SAMPLE_MODES, repeats=1):
+    """Time key frame extraction for each frame sampling mode"""
+    results = {}
+    for mode in modes:
+        timings = []
+        key_frame_count = 0
+        for _ in range(repeats):
+            start = time.perf_counter()
+            key_frames = extract_frames(video_path, sample_mode=mode)
+            timings.append(time.perf_counter() - start)
+            key_frame_count = len(key_frames)
+
+        best = min(timings)
+        results[mode] = {"seconds": best, "key_frames": key_frame_count}
+        print(f"{mode:>6}: {best:8.2f}s  ({key_frame_count} key frames)")
+
+    if "read" in results and results["read"]["seconds"] > 0:
+        baseline = results["read"]["seconds"]
+        for mode, result in results.items():
+            print(f"{mode:>6}: {baseline / result['seconds']:.2f}x vs read")
+
+    return results
+
+def benchmark_detectors(video_path, detectors=tuple(DETECTORS), repeats=1):
+    """Compare key frame counts and throughput of the scene detectors"""
+    results = {}
+    for name in detectors:
+        timings = []
+        key_frame_numbers = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            key_frames = extract_frames(video_path, detector=name)
+            timings.append(time.perf_counter() - start)
+            key_frame_numbers = [key_frame['frame_number'] for key_frame in key_frames]
+
+        best = min(timings)
+        results[name] = {"seconds": best, "key_frames": len(key_frame_numbers), "frame_numbers": key_frame_numbers}
+        print(f"{name:>10}: {best:8.2f}s  ({len(key_frame_numbers)} key frames)")
+
+    return results
+
+def benchmark_workers(video_path, worker_counts=(1, 2, 4), detector="mean"):
+    """Time key frame extraction with a growing number of worker processes"""
+    results = {}
+    for workers in worker_counts:
+        start = time.perf_counter()
+        key_frames = extract_frames(video_path, detector=detector, workers=workers)
+        seconds = time.perf_counter() - start
+        results[workers] = {"seconds": seconds, "key_frames": len(key_frames)}
+        print(f"{workers:>3} workers: {seconds:8.2f}s  ({len(key_frames)} key frames)")
+
+    return results
+
+def benchmark_ocr(video_path, batch_sizes=(1, 4, 8), threads=None, limit=32):
+    """Measure OCR frames/second over a video's key frames for each batch size"""
+    from .model_registry import get_ocr_reader
+    from .ocr_detection import batched, read_text_batch, set_ocr_threads
+
+    frames = [key_frame['frame'] for key_frame in extract_frames(video_path)][:limit]
+    reader = get_ocr_reader(['en'])
+    if threads:
+        set_ocr_threads(threads)
+    # Warm up so the first timed batch doesn't pay for lazy initialization
+    read_text_batch(reader, frames[:1])
+
+    results = {}
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        for batch in batched(frames, batch_size):
+            read_text_batch(reader, batch)
+        seconds = time.perf_counter() - start
+        results[batch_size] = {"seconds": seconds, "frames_per_second": len(frames) / seconds}
+        print(f"batch {batch_size:>3}: {len(frames) / seconds:8.2f} frames/s  ({len(frames)} frames in {seconds:.2f}s)")
+
+    return results
+
+def _sample_rows(count):
+    """Synthetic metadata rows alternating OCR frames and transcript segments"""
+    for i in range(count):
+        timestamp = f"{i // 3600:02}:{i // 60 % 60:02}:{i % 60:02}"
+        if i % 2:
+            yield ("benchmark.mp4", str(i * 15), timestamp, None, f"slide {i} neural network training loss", None)
+        else:
+            yield ("benchmark.mp4", None, timestamp, f"segment {i} we now look at gradient descent", None, None)
+
+def benchmark_indexing(rows=2000):
+    """Compare rows/second of per-row index_metadata calls and IndexWriter"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "per_row.db")
+        start = time.perf_counter()
+        for row in _sample_rows(rows):
+            index_metadata(*row, db_path=db_path)
+        seconds = time.perf_counter() - start
+        results["per_row"] = {"seconds": seconds, "rows_per_second": rows / seconds}
+
+        db_path = os.path.join(tmp, "bulk.db")
+        start = time.perf_counter()
+        with IndexWriter(db_path) as writer:
+            for row in _sample_rows(rows):
+                writer.add(*row)
+        seconds = time.perf_counter() - start
+        results["bulk"] = {"seconds": seconds, "rows_per_second": rows / seconds}
+
+    for name, result in results.items():
+        print(f"{name:>8}: {result['rows_per_second']:10.0f} rows/s  ({rows} rows in {result['seconds']:.2f}s)")
+    return results
+
+def _percentile_ms(timings, q):
+    return float(np.percentile(timings, q)) * 1000
+
+def benchmark_synthetic_video(slides=20, seconds_per_slide=5.0, fps=30, size=(1280, 720),
+                              detectors=tuple(DETECTORS), workers=1):
+    """Time key frame extraction on a generated slide video, and check the cuts
+
+    For each detector, a key frame within FRAME_SKIP frames after a slide
+    change counts as finding that cut; key frames matching no cut are
+    reported as extra.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = os.path.join(tmp, "slides.mp4")
+        truth = make_slide_video(video_path, slides, seconds_per_slide, fps, size)
+
+        for name in detectors:
+            start = time.perf_counter()
+            key_frames = extract_frames(video_path, detector=name, workers=workers)
+            seconds = time.perf_counter() - start
+
+            frame_numbers = [key_frame['frame_number'] for key_frame in key_frames]
+            found = sum(1 for cut in truth["cuts"] if any(cut <= number < cut + FRAME_SKIP for number in frame_numbers))
+            extra = sum(1 for number in frame_numbers
+                        if not any(cut <= number < cut + FRAME_SKIP for cut in truth["cuts"]))
+            results[name] = {
+                "seconds": seconds,
+                "frames_per_second": truth["frames"] / seconds,
+                "key_frames": len(frame_numbers),
+                "cut_recall": found / len(truth["cuts"]),
+                "extra_key_frames": extra,
+            }
+            print(f"{name:>10}: {truth['frames'] / seconds:8.0f} frames/s  ({len(frame_numbers)} key frames, "
+                  f"{found}/{len(truth['cuts'])} cuts found, {extra} extra)")
+    return results
+
+def benchmark_vad(duration_s=600.0):
+    """Time speech detection on generated audio and check what it keeps"""
+    from .vad import speech_chunks
+
+    samples, regions = make_speech_audio(duration_s)
+    start = time.perf_counter()
+    chunks = speech_chunks(samples)
+    seconds = time.perf_counter() - start
+
+    def covered(start_s, end_s):
+        return any(chunk_start <= start_s + 0.05 and end_s - 0.05 <= chunk_end for chunk_start, chunk_end in chunks)
+
+    result = {
+        "seconds": seconds,
+        "audio_seconds_per_second": duration_s / seconds,
+        "chunks": len(chunks),
+        "speech_recall": sum(1 for region in regions if covered(*region)) / max(len(regions), 1),
+        "kept_ratio": sum(end_s - start_s for start_s, end_s in chunks) / duration_s,
+        "speech_ratio": sum(end_s - start_s for start_s, end_s in regions) / duration_s,
+    }
+    print(f"vad: {result['audio_seconds_per_second']:8.0f}x realtime  ({len(chunks)} chunks, "
+          f"{result['kept_ratio']:.0%} of the audio kept, {result['speech_ratio']:.0%} is speech)")
+    return result
+
+def benchmark_audio_decode(duration_s=600.0):
+    """Time decoding the audio track of a generated video (needs ffmpeg)"""
+    from .audio_extraction import extract_audio
+
+    with tempfile.TemporaryDirectory() as tmp:
+        samples, _ = make_speech_audio(duration_s)
+        wav_path = os.path.join(tmp, "speech.wav")
+        write_wav(wav_path, samples)
+        video_path = os.path.join(tmp, "slides.mp4")
+        make_slide_video(video_path, slides=max(1, int(duration_s // 30)), seconds_per_slide=30.0, fps=5,
+                         size=(320, 180))
+        muxed = mux_audio(video_path, wav_path, os.path.join(tmp, "talk.mp4"))
+        if muxed is None:
+            print("audio decode: skipped (ffmpeg not installed)")
+            return {"skipped": "ffmpeg not installed"}
+
+        start = time.perf_counter()
+        extract_audio(muxed, cache_dir=os.path.join(tmp, "audio"))
+        seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        extract_audio(muxed, cache_dir=os.path.join(tmp, "audio"))
+        cached = time.perf_counter() - start
+
+    result = {"seconds": seconds, "cached_seconds": cached, "audio_seconds_per_second": duration_s / seconds}
+    print(f"audio decode: {result['audio_seconds_per_second']:8.0f}x realtime  ({cached * 1000:.1f} ms when cached)")
+    return result
+
+def benchmark_search(row_counts=SUITE_ROWS, queries=SEARCH_QUERIES, repeats=20, db_dir=None):
+    """Build synthetic indexes of growing size and time searches on them
+
+    For every size, reports the bulk indexing rate and the p50/p95 latency
+    of search_metadata() (top 50) and of the first search_page().
+    """
+    results = {}
+    with tempfile.TemporaryDirectory(dir=db_dir) as tmp:
+        for rows in row_counts:
+            db_path = os.path.join(tmp, f"search_{rows}.db")
+            start = time.perf_counter()
+            with IndexWriter(db_path, batch_size=10000) as writer:
+                writer.defer_text_index()
+                for video, source, start_s, text, frame_number in synthetic_rows(rows):
+                    writer.add_segment(video, source, start_s, text, frame_number=frame_number)
+            build_seconds = time.perf_counter() - start
+
+            result = {
+                "build_seconds": build_seconds,
+                "rows_per_second": rows / build_seconds,
+                "db_bytes": os.path.getsize(db_path),
+                "queries": {},
+            }
+            for query in queries:
+                # First run warms the connection pool and page cache
+                search_metadata(query, db_path, limit=50)
+                metadata_timings, page_timings = [], []
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    search_metadata(query, db_path, limit=50)
+                    metadata_timings.append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    search_page(query, db_path, page_size=50)
+                    page_timings.append(time.perf_counter() - start)
+                result["queries"][query] = {
+                    "search_p50_ms": _percentile_ms(metadata_timings, 50),
+                    "search_p95_ms": _percentile_ms(metadata_timings, 95),
+                    "page_p50_ms": _percentile_ms(page_timings, 50),
+                    "page_p95_ms": _percentile_ms(page_timings, 95),
+                }
+            results[rows] = result
+
+            latencies = ", ".join(
+                f"{query!r} {timings['search_p50_ms']:.1f}/{timings['page_p50_ms']:.1f} ms"
+                for query, timings in result["queries"].items()
+            )
+            print(f"{rows:>9} rows: built at {result['rows_per_second']:8.0f} rows/s; p50 search/page: {latencies}")
+    return results
+
+def environment():
+    """Machine and code version the results were measured on"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    import cv2
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "sqlite": sqlite3.sqlite_version,
+    }
+
+def run_suite(row_counts=SUITE_ROWS, slides=20, audio_seconds=600.0, ocr_frames=16, db_dir=None):
+    """Run every benchmark on synthetic data; the result is JSON serializable
+
+    Stages whose dependencies are missing (EasyOCR, ffmpeg) are reported
+    as skipped instead of failing the suite.
+    """
+    results = {"environment": environment()}
+    results["extract"] = benchmark_synthetic_video(slides=slides)
+    results["vad"] = benchmark_vad(audio_seconds)
+    results["audio_decode"] = benchmark_audio_decode(audio_seconds)
+    try:
+        import easyocr  # noqa: F401
+        with tempfile.TemporaryDirectory() as tmp:
+            video_path = os.path.join(tmp, "slides.mp4")
+            make_slide_video(video_path, slides=ocr_frames)
+            results["ocr"] = benchmark_ocr(video_path, limit=ocr_frames)
+    except ImportError:
+        print("ocr: skipped (easyocr not installed)")
+        results["ocr"] = {"skipped": "easyocr not installed"}
+    results["indexing"] = benchmark_indexing()
+    results["search"] = benchmark_search(row_counts, db_dir=db_dir)
+    return results
+
+# Result keys compared between runs; lower is better unless listed in HIGHER_IS_BETTER
+TIMING_SUFFIXES = ("seconds", "_ms")
+HIGHER_IS_BETTER = ("_per_second",)
+
+def _metrics(results, prefix=""):
+    """Flatten the comparable numbers of a result tree into {path: value}"""
+    metrics = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(_metrics(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and (
+                key.endswith(TIMING_SUFFIXES) or key.endswith(HIGHER_IS_BETTER)):
+            metrics[path] = value
+    return metrics
+
+def compare_results(baseline, current, tolerance=0.2):
+    """Return the metrics of current that are more than tolerance worse than baseline
+
+    Each regression is (metric, baseline value, current value, relative
+    change). Metrics missing from either run are ignored.
+    """
+    baseline_metrics = _metrics(baseline)
+    regressions = []
+    for path, value in _metrics(current).items():
+        before = baseline_metrics.get(path)
+        if not before or path.startswith("environment."):
+            continue
+        change = (value - before) / before
+        if path.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > tolerance:
+            regressions.append((path, before, value, change))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the video processing pipeline")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results to PATH as JSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sampling = subparsers.add_parser("sampling", help="Compare frame sampling modes")
+    sampling.add_argument("video_path")
+    sampling.add_argument("--modes", nargs="+", default=list(SAMPLE_MODES), choices=SAMPLE_MODES)
+    sampling.add_argument("--repeats", type=int, default=1)
+
+    detectors = subparsers.add_parser("detectors", help="Compare scene change detectors")
+    detectors.add_argument("video_path")
+    detectors.add_argument("--detectors", nargs="+", default=list(DETECTORS), choices=list(DETECTORS))
+    detectors.add_argument("--repeats", type=int, default=1)
+
+    workers = subparsers.add_parser("workers", help="Compare parallel extraction worker counts")
+    workers.add_argument("video_path")
+    workers.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4])
+    workers.add_argument("--detector", default="mean", choices=list(DETECTORS))
+
+    ocr = subparsers.add_parser("ocr", help="Compare OCR batch sizes")
+    ocr.add_argument("video_path")
+    ocr.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4, 8])
+    ocr.add_argument("--threads", type=int)
+    ocr.add_argument("--limit", type=int, default=32, help="Maximum key frames to OCR")
+
+    indexing = subparsers.add_parser("indexing", help="Compare per-row and bulk metadata indexing")
+    indexing.add_argument("--rows", type=int, default=2000)
+
+    search = subparsers.add_parser("search", help="Time searches on synthetic indexes of growing size")
+    search.add_argument("--rows", nargs="+", type=int, default=list(SUITE_ROWS))
+    search.add_argument("--repeats", type=int, default=20)
+    search.add_argument("--db-dir", help="Directory for the temporary databases")
+
+    suite = subparsers.add_parser("suite", help="Run every benchmark on generated videos, audio and indexes")
+    suite.add_argument("--rows", nargs="+", type=int, default=list(SUITE_ROWS))
+    suite.add_argument("--slides", type=int, default=20)
+    suite.add_argument("--audio-seconds", type=float, default=600.0)
+    suite.add_argument("--db-dir", help="Directory for the temporary databases")
+
+    compare = subparsers.add_parser("compare", help="Compare two JSON results; exits 1 on regressions")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown (default: %(default)s)")
+
+    args = parser.parse_args()
+    results = None
+    if args.command == "sampling":
+        results = benchmark_sampling(args.video_path, args.modes, args.repeats)
+    elif args.command == "detectors":
+        results = benchmark_detectors(args.video_path, args.detectors, args.repeats)
+    elif args.command == "workers":
+        results = benchmark_workers(args.video_path, args.workers, args.detector)
+    elif args.command == "ocr":
+        results = benchmark_ocr(args.video_path, args.batch_sizes, args.threads, args.limit)
+    elif args.command == "indexing":
+        results = benchmark_indexing(args.rows)
+    elif args.command == "search":
+        results = benchmark_search(args.rows, repeats=args.repeats, db_dir=args.db_dir)
+    elif args.command == "suite":
+        results = run_suite(args.rows, args.slides, args.audio_seconds, db_dir=args.db_dir)
+    elif args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare_results(baseline, current, args.tolerance)
+        for path, before, value, change in regressions:
+            print(f"REGRESSION {path}: {before:.4g} -> {value:.4g} ({change:+.0%} worse)")
+        print(f"{len(regressions)} regressions beyond {args.tolerance:.0%}")
+        sys.exit(1 if regressions else 0)
+
+    if args.json and results is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
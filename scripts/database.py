@@ -1,58 +1,554 @@
 import sqlite3
+import base64
+import html
 import json
 import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from . import metrics
 
-def setup_database():
-    """Initialize SQLite database with FTS5 table"""
+DB_PATH = "data/video_metadata.db"
+
+# Seconds a writer waits for another writer's transaction to finish
+WRITE_LOCK_TIMEOUT = 60.0
+
+# Pragmas for write connections: WAL lets searches read while a video is
+# being indexed, and synchronous=NORMAL only fsyncs at checkpoints.
+WRITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+)
+
+# Pragmas for pooled read connections: map the database file into memory
+# and keep a large page cache that stays warm between searches.
+READ_PRAGMAS = (
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-32768",
+    "PRAGMA temp_store=MEMORY",
+)
+# Prepared statements kept per read connection, keyed by SQL text
+READ_STATEMENT_CACHE = 256
+
+# Every OCR'd key frame and every transcript segment is one row of
+# segments, with numeric times so lookups by (video, time) use the B-tree
+# index. segments_fts indexes the text without storing a second copy
+# (external content) and is kept in sync by triggers.
+SCHEMA_SQL = '''
+    CREATE TABLE IF NOT EXISTS videos (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE,
+        content_hash TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS segments (
+        id INTEGER PRIMARY KEY,
+        video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+        source TEXT NOT NULL,
+        frame_number INTEGER,
+        start_s REAL NOT NULL,
+        end_s REAL,
+        text TEXT NOT NULL DEFAULT ''
+    );
+
+    CREATE INDEX IF NOT EXISTS segments_video_start ON segments (video_id, start_s);
+
+    CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts
+    USING fts5(text, content='segments', content_rowid='id');
+
+    CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+        INSERT INTO segments_fts (rowid, text) VALUES (new.id, new.text);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+        INSERT INTO segments_fts (segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS segments_au AFTER UPDATE ON segments BEGIN
+        INSERT INTO segments_fts (segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO segments_fts (rowid, text) VALUES (new.id, new.text);
+    END;
+
+    CREATE TABLE IF NOT EXISTS frame_descriptors (
+        id INTEGER PRIMARY KEY,
+        video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+        frame_number INTEGER NOT NULL,
+        start_s REAL NOT NULL,
+        histogram BLOB NOT NULL,
+        thumbnail BLOB NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        video_id INTEGER NOT NULL REFERENCES videos(id) ON DELETE CASCADE,
+        stage TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        completed_at REAL NOT NULL,
+        PRIMARY KEY (video_id, stage)
+    );
+
+    CREATE INDEX IF NOT EXISTS checkpoints_content_hash ON checkpoints (content_hash, stage);
+
+    CREATE TABLE IF NOT EXISTS index_state (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+
+    INSERT OR IGNORE INTO index_state (key, value) VALUES ('generation', 0);
+    INSERT OR IGNORE INTO index_state (key, value) VALUES ('epoch', 0);
+'''
+
+# Values of segments.source
+SOURCE_OCR = "ocr"
+SOURCE_TRANSCRIPT = "transcript"
+
+# Processing stages checkpointed per video in the checkpoints table. Key
+# frames are OCR'd as they are extracted, so the "ocr" checkpoint covers
+# both; each stage indexes its rows in the same transaction that records
+# its checkpoint.
+STAGE_OCR = "ocr"
+STAGE_AUDIO = "audio"
+STAGE_TRANSCRIBE = "transcribe"
+
+# Rows a checkpointed stage writes for a video: (segment sources, whether
+# it writes frame descriptors)
+STAGE_ROWS = {
+    STAGE_OCR: ((SOURCE_OCR,), True),
+    STAGE_AUDIO: ((), False),
+    STAGE_TRANSCRIBE: ((SOURCE_TRANSCRIPT,), False),
+}
+
+# Table the metadata lived in before the normalized schema
+LEGACY_TABLE = "video_metadata"
+
+def parse_timestamp(timestamp):
+    """Convert an HH:MM:SS (or plain seconds) timestamp to seconds"""
+    if timestamp is None or timestamp == "":
+        return 0.0
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    seconds = 0.0
+    for part in str(timestamp).split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+def _parse_legacy_timestamp(timestamp):
+    """parse_timestamp() for migrated rows, where unreadable timestamps become 0"""
     try:
-        # Ensure the data directory exists
-        os.makedirs('data', exist_ok=True)
-        
-        conn = sqlite3.connect('data/video_metadata.db')
-        c = conn.cursor()
+        return parse_timestamp(timestamp)
+    except ValueError:
+        return 0.0
+
+def bump_generation(conn):
+    """Mark the index as changed, invalidating cached search results
+
+    Runs inside the caller's transaction, so readers see the new generation
+    together with the rows that caused it.
+    """
+    conn.execute("UPDATE index_state SET value = value + 1 WHERE key = 'generation'")
+
+def migrate_legacy_metadata(conn, drop_legacy=True):
+    """Move rows of the old video_metadata table into videos/segments
+
+    Works for both the FTS5 and the plain variant of the old table. Rows
+    with OCR text become "ocr" segments, the rest "transcript" segments;
+    text timestamps are parsed into seconds (missing or unreadable ones
+    become 0). Returns the number of rows migrated (0 when there is no
+    legacy table).
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (LEGACY_TABLE,)
+    ).fetchone()
+    if not exists:
+        return 0
+
+    conn.create_function("parse_timestamp", 1, _parse_legacy_timestamp, deterministic=True)
+    with conn:
+        conn.executescript("BEGIN;" + SCHEMA_SQL)
+        conn.execute(f"""
+            INSERT OR IGNORE INTO videos (name)
+            SELECT DISTINCT video_name FROM {LEGACY_TABLE} WHERE video_name IS NOT NULL
+        """)
+        migrated = conn.execute(f"""
+            INSERT INTO segments (video_id, source, frame_number, start_s, end_s, text)
+            SELECT v.id,
+                   CASE WHEN m.ocr_text IS NOT NULL THEN '{SOURCE_OCR}' ELSE '{SOURCE_TRANSCRIPT}' END,
+                   CAST(m.frame_number AS INTEGER),
+                   parse_timestamp(m.timestamp),
+                   NULL,
+                   COALESCE(m.ocr_text, m.transcription, '')
+            FROM {LEGACY_TABLE} m JOIN videos v ON v.name = m.video_name
+        """).rowcount
+        bump_generation(conn)
+        if drop_legacy:
+            conn.execute(f"DROP TABLE {LEGACY_TABLE}")
+        else:
+            # Renamed so the rows are not migrated a second time
+            conn.execute(f"ALTER TABLE {LEGACY_TABLE} RENAME TO {LEGACY_TABLE}_legacy")
+    return migrated
+
+def create_tables(conn):
+    """Create the metadata tables if they do not exist
+
+    A database still holding the old single video_metadata table is
+    migrated to the normalized schema first.
+    """
+    migrate_legacy_metadata(conn)
+    conn.executescript(SCHEMA_SQL)
+    migrate_video_hashes(conn)
+
+def migrate_video_hashes(conn):
+    """Add the content_hash column to a videos table created before it existed"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(videos)")]
+    if "content_hash" not in columns:
+        conn.execute("ALTER TABLE videos ADD COLUMN content_hash TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS videos_content_hash ON videos (content_hash)")
+
+def connect_for_writing(db_path=DB_PATH):
+    """Open a connection tuned for bulk inserts"""
+    if os.path.dirname(db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=WRITE_LOCK_TIMEOUT)
+    for pragma in WRITE_PRAGMAS:
+        conn.execute(pragma)
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+class ReadConnectionPool:
+    """Reusable read-only connections to one database file
+
+    A connection is used by one thread at a time, but instead of being
+    closed afterwards it goes back to the pool, keeping its prepared
+    statements and page cache. Streamlit runs each rerun in a fresh thread,
+    so pooling (rather than thread-local storage) is what lets searches on
+    later reruns skip connection setup.
+    """
+
+    def __init__(self, db_path=DB_PATH, max_idle=8):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+        # Make sure the file and schema exist, since read-only
+        # connections can create neither
+        conn = connect_for_writing(db_path)
+        try:
+            create_tables(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _connect(self):
+        uri = f"file:{os.path.abspath(self.db_path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=READ_STATEMENT_CACHE)
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, or open a new one"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def release(self, conn):
+        """Return a connection to the pool"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+_read_pools = {}
+_read_pools_lock = threading.Lock()
+
+@contextmanager
+def read_connection(db_path=DB_PATH):
+    """Borrow a pooled read-only connection to db_path"""
+    with _read_pools_lock:
+        pool = _read_pools.get(db_path)
+        if pool is None:
+            pool = _read_pools[db_path] = ReadConnectionPool(db_path)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+def close_read_connections():
+    """Close all pooled read connections"""
+    with _read_pools_lock:
+        pools = list(_read_pools.values())
+        _read_pools.clear()
+    for pool in pools:
+        pool.close()
+
+def setup_database(db_path=DB_PATH):
+    """Initialize SQLite database with the metadata tables"""
+    conn = None
+    try:
+        conn = connect_for_writing(db_path)
         
-        # Create the FTS5 table for better text search capabilities
-        c.execute('''
-            CREATE VIRTUAL TABLE IF NOT EXISTS video_metadata 
-            USING fts5(
-                video_name,
-                frame_number,
-                timestamp,
-                transcription,
-                ocr_text,
-                objects_detected
-            )
-        ''')
+        # Create the tables and FTS5 index for text search
+        create_tables(conn)
         
         conn.commit()
         print("Database setup completed successfully")
     except Exception as e:
         print(f"Database setup error: {str(e)}")
     finally:
-        conn.close()
+        if conn:
+            conn.close()
+
+class IndexWriter:
+    """Bulk writer for video segments
+
+    Rows are buffered in memory and inserted with executemany in a single
+    short transaction when the writer commits, so indexing a video costs
+    one commit instead of one per row, and the database write lock is only
+    held while inserting, not while frames are OCR'd or audio transcribed.
+    Writers running side by side (e.g. the OCR and transcription branches
+    of one video) just wait for each other's commit. Used as a context
+    manager nothing is written if the block raises.
+
+    replace() and checkpoint() make reprocessing idempotent: the video's
+    previous rows are deleted and the stage recorded as done in the same
+    transaction that inserts the new rows, so a crash leaves either the
+    old rows or the new ones, never both or half of them.
+    """
+
+    def __init__(self, db_path=DB_PATH, batch_size=1000):
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self._rows_committed = 0
+        self._rows = []
+        self._frames = []
+        self._replaced = []
+        self._checkpoints = []
+        self._fts_trigger = None
+        self._changed = False
+        self._video_ids = {}
+        self._conn = connect_for_writing(db_path)
+        create_tables(self._conn)
+
+    def video_id(self, video_name):
+        """Return the id of a video, registering it if needed"""
+        if video_name not in self._video_ids:
+            self._conn.execute("INSERT OR IGNORE INTO videos (name) VALUES (?)", (video_name,))
+            row = self._conn.execute("SELECT id FROM videos WHERE name = ?", (video_name,)).fetchone()
+            self._video_ids[video_name] = row[0]
+        return self._video_ids[video_name]
+
+    def add_segment(self, video_name, source, start_s, text, end_s=None, frame_number=None):
+        """Queue one OCR frame or transcript segment"""
+        frame_number = int(frame_number) if frame_number is not None else None
+        self._rows.append((video_name, source, frame_number, float(start_s), end_s, text or ''))
+
+    def add_frame_descriptor(self, video_name, frame_number, start_s, histogram, thumbnail):
+        """Queue the visual descriptor of one key frame (see visual_search)"""
+        self._frames.append((video_name, int(frame_number), float(start_s), histogram, thumbnail))
+
+    def defer_text_index(self):
+        """Index the text of inserted rows all at once on commit
+
+        The full text index is rebuilt from the whole segments table instead
+        of being updated row by row, which is several times faster when
+        (re)loading most of the database, and slower otherwise.
+        """
+        if self._fts_trigger is None:
+            # Dropped inside the writer's transaction, so a rollback restores it
+            if not self._conn.in_transaction:
+                self._conn.execute("BEGIN")
+            self._fts_trigger = self._conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'segments_ai'"
+            ).fetchone()[0]
+            self._conn.execute("DROP TRIGGER segments_ai")
+
+    def replace(self, video_name, sources=(), frame_descriptors=False):
+        """Delete the video's existing rows of the given sources on commit"""
+        self._replaced.append((video_name, tuple(sources), frame_descriptors))
+
+    def checkpoint(self, video_name, stage, content_hash):
+        """Record on commit that a stage is done for this content of the video"""
+        self._checkpoints.append((video_name, stage, content_hash))
+
+    def copy_stage(self, video_name, stage, content_hash):
+        """Copy a stage's rows from another video with the same content
+
+        Replaces the video's own rows of that stage and checkpoints it.
+        Returns False if no other video has the stage done for this content.
+        """
+        video_id = self.video_id(video_name)
+        row = self._conn.execute('''
+            SELECT video_id FROM checkpoints
+            WHERE content_hash = ? AND stage = ? AND video_id != ?
+            LIMIT 1
+        ''', (content_hash, stage, video_id)).fetchone()
+        if row is None:
+            return False
+
+        sources, frame_descriptors = STAGE_ROWS.get(stage, ((), False))
+        delete_video_rows(self._conn, video_id, sources, frame_descriptors)
+        if sources:
+            self._conn.execute(f'''
+                INSERT INTO segments (video_id, source, frame_number, start_s, end_s, text)
+                SELECT ?, source, frame_number, start_s, end_s, text FROM segments
+                WHERE video_id = ? AND source IN ({', '.join('?' * len(sources))})
+                ORDER BY id
+            ''', (video_id, row[0]) + tuple(sources))
+        if frame_descriptors:
+            self._conn.execute('''
+                INSERT INTO frame_descriptors (video_id, frame_number, start_s, histogram, thumbnail)
+                SELECT ?, frame_number, start_s, histogram, thumbnail FROM frame_descriptors
+                WHERE video_id = ? ORDER BY id
+            ''', (video_id, row[0]))
+        self.checkpoint(video_name, stage, content_hash)
+        self._changed = True
+        return True
+
+    def add(self, video_name, frame_number, timestamp, transcription, ocr_text, objects_detected):
+        """Queue one row in the old video_metadata layout"""
+        source = SOURCE_OCR if ocr_text is not None else SOURCE_TRANSCRIPT
+        text = ocr_text if ocr_text is not None else transcription
+        self.add_segment(video_name, source, parse_timestamp(timestamp), text, frame_number=frame_number)
+
+    def _insert(self, sql, rows):
+        for start in range(0, len(rows), self.batch_size):
+            self._conn.executemany(sql, [
+                (self.video_id(row[0]),) + row[1:] for row in rows[start:start + self.batch_size]
+            ])
+
+    def flush(self):
+        """Insert the queued rows (still uncommitted, holding the write lock)"""
+        for video_name, sources, frame_descriptors in self._replaced:
+            delete_video_rows(self._conn, self.video_id(video_name), sources, frame_descriptors)
+            self._changed = True
+        self._replaced = []
+        if self._rows:
+            self._insert('''
+                INSERT INTO segments (video_id, source, frame_number, start_s, end_s, text)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', self._rows)
+            self.rows_written += len(self._rows)
+            self._rows = []
+            self._changed = True
+        if self._frames:
+            self._insert('''
+                INSERT INTO frame_descriptors (video_id, frame_number, start_s, histogram, thumbnail)
+                VALUES (?, ?, ?, ?, ?)
+            ''', self._frames)
+            self._frames = []
+            self._changed = True
+        for video_name, stage, content_hash in self._checkpoints:
+            record_checkpoint(self._conn, self.video_id(video_name), stage, content_hash)
+        self._checkpoints = []
+
+    def commit(self):
+        """Insert the queued rows and commit the transaction
 
-def index_metadata(video_name, frame_number, timestamp, transcription, ocr_text, objects_detected):
-    """Add metadata to the database."""
+        Every commit that wrote rows bumps the index generation.
+        """
+        self.flush()
+        if self._fts_trigger is not None:
+            self._conn.execute("INSERT INTO segments_fts (segments_fts) VALUES ('rebuild')")
+            self._conn.execute(self._fts_trigger)
+            self._fts_trigger = None
+        if self._changed:
+            bump_generation(self._conn)
+            self._changed = False
+        self._conn.commit()
+        metrics.count("rows_indexed", self.rows_written - self._rows_committed)
+        self._rows_committed = self.rows_written
+
+    def close(self, commit=True):
+        """Commit (or roll back) and close the connection"""
+        try:
+            if commit:
+                self.commit()
+            else:
+                self._conn.rollback()
+        finally:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(commit=exc_type is None)
+
+def delete_video_rows(conn, video_id, sources=(), frame_descriptors=False):
+    """Delete a video's segments of the given sources (and frame descriptors)"""
+    if sources:
+        conn.execute(
+            f"DELETE FROM segments WHERE video_id = ? AND source IN ({', '.join('?' * len(sources))})",
+            (video_id,) + tuple(sources)
+        )
+    if frame_descriptors:
+        conn.execute("DELETE FROM frame_descriptors WHERE video_id = ?", (video_id,))
+
+def record_checkpoint(conn, video_id, stage, content_hash):
+    """Mark a stage as done for the given content of a video
+
+    The video takes on that content hash; checkpoints recorded for other
+    content of the same video no longer count.
+    """
+    conn.execute("UPDATE videos SET content_hash = ? WHERE id = ?", (content_hash, video_id))
+    conn.execute(
+        "INSERT OR REPLACE INTO checkpoints (video_id, stage, content_hash, completed_at) VALUES (?, ?, ?, ?)",
+        (video_id, stage, content_hash, time.time())
+    )
+
+def completed_stages(video_name, content_hash, db_path=DB_PATH):
+    """Stages already done for this content of a video"""
+    with read_connection(db_path) as conn:
+        rows = conn.execute('''
+            SELECT c.stage FROM checkpoints c JOIN videos v ON v.id = c.video_id
+            WHERE v.name = ? AND c.content_hash = ?
+        ''', (video_name, content_hash)).fetchall()
+    return {row[0] for row in rows}
+
+def reuse_checkpoints(video_name, content_hash, stages, db_path=DB_PATH):
+    """Return the stages that need no processing for this content of a video
+
+    Besides the stages already done for the video, stages done for the
+    same content under another name are not run again: their rows are
+    copied to this video, replacing its own, in one transaction.
+    """
+    done = completed_stages(video_name, content_hash, db_path)
+    missing = [stage for stage in stages if stage not in done]
+    if not missing:
+        return done
+
+    with IndexWriter(db_path) as writer:
+        for stage in missing:
+            if writer.copy_stage(video_name, stage, content_hash):
+                done.add(stage)
+    return done
+
+def index_metadata(video_name, frame_number, timestamp, transcription, ocr_text, objects_detected, db_path=DB_PATH):
+    """Add metadata to the database.
+
+    Commits a single row; use IndexWriter when indexing many rows.
+    """
     try:
-        conn = sqlite3.connect("data/video_metadata.db")
-        c = conn.cursor()
-        
-        # Ensure frame_number is a string
-        frame_number = str(frame_number) if frame_number is not None else None
-        
-        # Timestamp should already be formatted as HH:MM:SS
-        c.execute('''
-            INSERT INTO video_metadata 
-            (video_name, frame_number, timestamp, transcription, ocr_text, objects_detected)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (video_name, frame_number, timestamp, transcription, ocr_text, objects_detected))
-        
-        conn.commit()
+        with IndexWriter(db_path) as writer:
+            writer.add(video_name, frame_number, timestamp, transcription, ocr_text, objects_detected)
     except Exception as e:
         print(f"Error indexing metadata: {str(e)}")
-    finally:
-        if conn:
-            conn.close()
 
 def format_timestamp(seconds):
     """Convert seconds to HH:MM:SS format"""
@@ -61,78 +557,309 @@ def format_timestamp(seconds):
     s = int(seconds % 60)
     return f"{h:02}:{m:02}:{s:02}"
 
-def search_metadata(search_query, db_path="data/video_metadata.db"):
-    """Search for metadata in the database."""
+# Search filter names mapped to segments.source values
+SEARCH_SOURCES = {
+    "ocr": SOURCE_OCR,
+    "transcript": SOURCE_TRANSCRIPT,
+}
+
+def check_sources(sources):
+    """Raise ValueError unless every name in sources is a SEARCH_SOURCES key"""
+    for source in sources or ():
+        if source not in SEARCH_SOURCES:
+            raise ValueError(f"Unknown source: {source}")
+
+def build_match_query(search_query):
+    """Turn user input into an FTS5 MATCH expression
+
+    Every word must appear, as a prefix so partially typed words still
+    match. Words are quoted, so FTS5 operators in the input are treated as
+    plain text. Returns None when the input has no searchable words.
+    """
+    terms = re.findall(r"\w+", search_query)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+# Control characters FTS5 wraps matches in, replaced by <mark> tags once
+# the text around them has been HTML-escaped
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+SEARCH_SQL = """
+    SELECT v.name, s.frame_number, s.start_s, s.end_s, s.source, s.text,
+           bm25(segments_fts) AS rank,
+           snippet(segments_fts, 0, char(2), char(3), '…', 16),
+           highlight(segments_fts, 0, char(2), char(3))
+    FROM segments_fts
+    JOIN segments s ON s.id = segments_fts.rowid
+    JOIN videos v ON v.id = s.video_id
+    WHERE segments_fts MATCH ?{source_filter}
+    ORDER BY rank
+"""
+
+def marked_html(text):
+    """HTML-escape text marked with MATCH_START/MATCH_END, marking matches with <mark> tags"""
+    return html.escape(text).replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>")
+
+def segment_result(name, frame_number, start_s, end_s, source, text, **extra):
+    """Build a search result dict from a segment row"""
+    result = {
+        "video_name": name,
+        "frame_number": frame_number,
+        "timestamp": format_timestamp(start_s),
+        "start_s": start_s,
+        "end_s": end_s,
+        "source": source,
+        "transcription": text if source == SOURCE_TRANSCRIPT else None,
+        "ocr_text": text if source == SOURCE_OCR else None,
+        "objects_detected": None,
+    }
+    result.update(extra)
+    return result
+
+def get_index_generation(db_path=DB_PATH):
+    """Current index generation; it changes whenever indexed rows change"""
+    with read_connection(db_path) as conn:
+        row = conn.execute("SELECT value FROM index_state WHERE key = 'generation'").fetchone()
+    return row[0] if row else 0
+
+def get_index_state(db_path=DB_PATH):
+    """All index_state counters, e.g. {"generation": 12, "epoch": 1}"""
+    with read_connection(db_path) as conn:
+        return dict(conn.execute("SELECT key, value FROM index_state").fetchall())
+
+def search_metadata(search_query, db_path=DB_PATH, sources=None, limit=None):
+    """Search for metadata in the database.
+
+    Uses the FTS5 index, best matches (BM25) first. sources limits the
+    search to "ocr" and/or "transcript" segments. Each result has a
+    "snippet" of the matching text and a "highlighted" copy of the full
+    text, as HTML-escaped text with matches wrapped in <mark> tags. An
+    unknown source raises ValueError.
+    """
+    check_sources(sources)
+    match = build_match_query(search_query)
+    if match is None:
+        return []
+
+    params = [match]
+    source_filter = ""
+    if sources:
+        source_filter = f" AND s.source IN ({', '.join('?' * len(sources))})"
+        params.extend(SEARCH_SOURCES[source] for source in sources)
+    query = SEARCH_SQL.format(source_filter=source_filter)
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        # Search across all text fields
-        c.execute("""
-            SELECT * FROM video_metadata 
-            WHERE transcription LIKE ? OR ocr_text LIKE ?
-        """, (f"%{search_query}%", f"%{search_query}%"))
+        with read_connection(db_path) as conn:
+            rows = conn.execute(query, params).fetchall()
         
         results = []
-        for row in c.fetchall():
-            results.append({
-                "video_name": row[0],
-                "frame_number": row[1],
-                "timestamp": row[2],
-                "transcription": row[3],
-                "ocr_text": row[4],
-                "objects_detected": row[5]
-            })
+        for row in rows:
+            results.append(segment_result(*row[:6], rank=row[6], snippet=marked_html(row[7]),
+                                          highlighted=marked_html(row[8])))
         
         return results
     except Exception as e:
         print(f"Search error: {str(e)}")
         return []
-    finally:
-        conn.close()
 
-def get_processed_videos():
+def encode_cursor(score, rowid, generation):
+    """Opaque keyset cursor pointing after the result (score, rowid) at an index generation"""
+    return base64.urlsafe_b64encode(json.dumps([score, rowid, generation]).encode()).decode()
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for anything else"""
+    try:
+        score, rowid, generation = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), int(rowid), int(generation)
+    except (TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+# Page of (id, score) pairs after a keyset position; the FTS5 sorter only
+# keeps LIMIT rows, so memory follows the page size, not the match count
+PAGE_IDS_SQL = """
+    SELECT id, score FROM (
+        SELECT hits.id, hits.score{video_rank}
+        FROM (
+            SELECT rowid AS id, bm25(segments_fts) AS score
+            FROM segments_fts WHERE segments_fts MATCH ?
+        ) hits{join}
+    )
+    WHERE (score > ? OR (score = ? AND id > ?)){cap_filter}
+    ORDER BY score, id
+    LIMIT ?
+"""
+
+SEGMENT_ROWS_SQL = """
+    SELECT s.id, v.name, s.frame_number, s.start_s, s.end_s, s.source, s.text
+    FROM segments s
+    JOIN videos v ON v.id = s.video_id
+    WHERE s.id IN ({ids})
+"""
+
+def mark_matches(text, terms, snippet_tokens=None):
+    """HTML-escape text, wrapping words starting with any of terms in <mark> tags
+
+    Mirrors what FTS5 highlight() does for prefix queries, without having
+    to run the MATCH again. With snippet_tokens, only a window of that many
+    words around the first match is returned, like snippet().
+    """
+    terms = tuple(term.lower() for term in terms)
+    tokens = list(re.finditer(r"\w+", text))
+    matched = [token.group().lower().startswith(terms) for token in tokens]
+
+    start, end = 0, len(tokens)
+    if snippet_tokens and len(tokens) > snippet_tokens:
+        first = matched.index(True) if any(matched) else 0
+        start = max(0, min(first - snippet_tokens // 4, len(tokens) - snippet_tokens))
+        end = start + snippet_tokens
+
+    pieces = []
+    position = tokens[start].start() if start else 0
+    for token, is_match in zip(tokens[start:end], matched[start:end]):
+        pieces.append(html.escape(text[position:token.start()]))
+        pieces.append(f"<mark>{html.escape(token.group())}</mark>" if is_match else html.escape(token.group()))
+        position = token.end()
+    pieces.append(html.escape(text[position:]) if end == len(tokens) else "…")
+    return ("…" if start else "") + "".join(pieces)
+
+def search_segment_ids(search_query, db_path=DB_PATH, sources=None, limit=20, after=None, per_video_cap=None):
+    """Return (segment id, BM25 score) pairs of the best matches, best first
+
+    after is a (score, id) keyset position to continue from. See
+    search_page() for per_video_cap.
+    """
+    check_sources(sources)
+    match = build_match_query(search_query)
+    if match is None:
+        return []
+
+    after_score, after_id = after or (float("-inf"), 0)
+
+    join = video_rank = cap_filter = ""
+    params = [match]
+    if sources or per_video_cap:
+        join = "\n        JOIN segments s ON s.id = hits.id"
+        if sources:
+            join += f" AND s.source IN ({', '.join('?' * len(sources))})"
+            params.extend(SEARCH_SOURCES[source] for source in sources)
+    if per_video_cap:
+        video_rank = ",\n               ROW_NUMBER() OVER (PARTITION BY s.video_id ORDER BY hits.score, hits.id) AS video_rank"
+        cap_filter = " AND video_rank <= ?"
+    params.extend([after_score, after_score, after_id])
+    if per_video_cap:
+        params.append(per_video_cap)
+    params.append(limit)
+    query = PAGE_IDS_SQL.format(video_rank=video_rank, join=join, cap_filter=cap_filter)
+
+    with read_connection(db_path) as conn:
+        return conn.execute(query, params).fetchall()
+
+def load_segment_results(hits, search_query, db_path=DB_PATH):
+    """Build search results for (segment id, score) pairs, in the given order
+
+    Matches of search_query are marked up with mark_matches(). Ids that no
+    longer exist are skipped.
+    """
+    rows = {}
+    if hits:
+        query = SEGMENT_ROWS_SQL.format(ids=", ".join("?" * len(hits)))
+        with read_connection(db_path) as conn:
+            for row in conn.execute(query, [rowid for rowid, _ in hits]):
+                rows[row[0]] = row
+
+    terms = re.findall(r"\w+", search_query)
+    results = []
+    for rowid, score in hits:
+        row = rows.get(rowid)
+        if row is None:
+            continue
+        text = row[6]
+        results.append(segment_result(*row[1:7], rank=score,
+                                      snippet=mark_matches(text, terms, snippet_tokens=16),
+                                      highlighted=mark_matches(text, terms)))
+    return results
+
+def search_page(search_query, db_path=DB_PATH, sources=None, page_size=20, cursor=None, per_video_cap=None):
+    """Return one page of search results, best matches first
+
+    Results are ordered by (BM25 score, rowid). Pass the returned
+    "next_cursor" back as cursor to get the following page; it is None on
+    the last page. per_video_cap keeps at most that many results per video
+    over all pages, so one long video cannot crowd out the rest. Rows,
+    snippets and highlights are only loaded for the page itself.
+
+    BM25 scores depend on statistics of the whole index, so any change to
+    it moves the scores of existing rows too and a cursor could no longer
+    continue where its page ended. Cursors therefore carry the index
+    generation, and one from before a change raises ValueError, as does a
+    cursor that did not come from search_page(); start over from the first
+    page then. An unknown source raises ValueError too.
+    """
+    check_sources(sources)
+    after = decode_cursor(cursor) if cursor else None
+    try:
+        # Read before the page, so a change made meanwhile shows on the next one
+        generation = get_index_generation(db_path)
+        if after is None or after[2] == generation:
+            position = after[:2] if after else None
+            page = search_segment_ids(search_query, db_path, sources, page_size, position, per_video_cap)
+            results = load_segment_results(page, search_query, db_path)
+    except Exception as e:
+        print(f"Search error: {str(e)}")
+        return {"results": [], "next_cursor": None}
+    if after is not None and after[2] != generation:
+        raise ValueError("Stale cursor: the index changed since the first page")
+
+    next_cursor = encode_cursor(page[-1][1], page[-1][0], generation) if len(page) == page_size else None
+    return {"results": results, "next_cursor": next_cursor}
+
+def get_processed_videos(db_path=DB_PATH):
     """Get list of videos that have been processed"""
     try:
-        conn = sqlite3.connect('data/video_metadata.db')
-        c = conn.cursor()
-        
-        c.execute("SELECT DISTINCT video_name FROM video_metadata")
-        videos = [row[0] for row in c.fetchall()]
+        with read_connection(db_path) as conn:
+            rows = conn.execute("SELECT name FROM videos ORDER BY name").fetchall()
         
-        return videos
+        return [row[0] for row in rows]
     except Exception as e:
         print(f"Error retrieving processed videos: {str(e)}")
         return []
-    finally:
-        conn.close()
 
-def reset_database(db_path="data/video_metadata.db"):
-    """Reset the database by dropping and recreating the table."""
+def recreate_tables(conn):
+    """Drop and recreate the metadata tables in a transaction left open
+
+    Also drops the pre-normalization table. index_state is kept so the
+    generation keeps increasing; segment ids start over, which the epoch
+    tells derived indexes (semantic_index). The caller commits.
+    """
+    conn.executescript(f'''
+        BEGIN;
+        DROP TABLE IF EXISTS segments_fts;
+        DROP TABLE IF EXISTS frame_descriptors;
+        DROP TABLE IF EXISTS checkpoints;
+        DROP TABLE IF EXISTS segments;
+        DROP TABLE IF EXISTS videos;
+        DROP TABLE IF EXISTS {LEGACY_TABLE};
+    ''' + SCHEMA_SQL)
+    migrate_video_hashes(conn)
+    bump_generation(conn)
+    conn.execute("UPDATE index_state SET value = value + 1 WHERE key = 'epoch'")
+
+def reset_database(db_path=DB_PATH):
+    """Reset the database by dropping and recreating the tables."""
+    conn = None
     try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        # Drop existing table if it exists
-        c.execute('DROP TABLE IF EXISTS video_metadata')
-        
-        # Create new table
-        c.execute('''
-            CREATE TABLE video_metadata (
-                video_name TEXT,
-                frame_number TEXT,
-                timestamp TEXT,
-                transcription TEXT,
-                ocr_text TEXT,
-                objects_detected TEXT
-            )
-        ''')
-        
+        conn = connect_for_writing(db_path)
+        recreate_tables(conn)
         conn.commit()
     except Exception as e:
         print(f"Error resetting database: {str(e)}")
     finally:
-        conn.close()
+        if conn:
+            conn.close()
 
 def process_video(video_path, video_name, db_path="data/video_metadata.db"):
     """Process a single video."""
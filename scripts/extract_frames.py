@@ -1,7 +1,12 @@
 import cv2
 import os
+import queue
+import threading
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta
+from . import metrics
+from .scene_detectors import create_detector
 
 def format_timestamp(seconds):
     """Convert seconds to HH:MM:SS format"""
@@ -24,57 +29,237 @@ def calculate_frame_difference(frame1, frame2):
     diff = cv2.absdiff(gray1, gray2)
     return np.mean(diff)
 
-def extract_frames(video_path):
-    """Extract key frames based on scene changes with optimized processing"""
-    FRAME_SKIP = 15
-    SCENE_THRESHOLD = 20.0
-    
-    cap = cv2.VideoCapture(video_path)
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    
-    # Calculate dimensions for processing
-    process_width = width // 4   # 1/4 size for processing
-    process_height = height // 4
-    
-    frame_count = 0
-    previous_frame_small = None
-    key_frames = []  # Store frames and their info
-    
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-            
-        if frame_count % FRAME_SKIP == 0:
-            # Downsize for processing
-            frame_small = cv2.resize(frame, (process_width, process_height))
-            timestamp = format_timestamp(frame_count / fps)
-            
-            is_key_frame = False
-            if previous_frame_small is not None:
-                diff = calculate_frame_difference(frame_small, previous_frame_small)
-                if diff > SCENE_THRESHOLD:
-                    is_key_frame = True
+FRAME_SKIP = 15
+
+# How sampled frames are pulled out of the capture:
+#   "read" - decode every frame with cap.read() and drop the unsampled ones
+#   "grab" - cap.grab() every frame, cap.retrieve() only the sampled ones
+#   "seek" - jump straight to each sampled frame with CAP_PROP_POS_FRAMES
+SAMPLE_MODES = ("read", "grab", "seek")
+
+def sample_frames(cap, frame_skip=FRAME_SKIP, sample_mode="grab", start_frame=0, end_frame=None):
+    """Yield (frame_number, frame) for every frame_skip-th frame of an open capture
+
+    Sampling starts at start_frame and stops before end_frame (or at the end
+    of the video when end_frame is None). The frames decoded and sampled
+    are added to the "frames_decoded" and "frames_sampled" counters (see
+    scripts/metrics.py) when the generator finishes.
+    """
+    if sample_mode not in SAMPLE_MODES:
+        raise ValueError(f"Unknown sample mode: {sample_mode}")
+
+    if sample_mode == "seek":
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if total_frames <= 0:
+            # Frame count is unknown for some containers/streams, so seeking
+            # has nothing to aim at; fall back to grabbing.
+            sample_mode = "grab"
+
+    decoded = sampled = 0
+    try:
+        if sample_mode == "seek":
+            if end_frame is not None:
+                total_frames = min(total_frames, end_frame)
+            for frame_count in range(start_frame, total_frames, frame_skip):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_count)
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                # Counts the frame read; the decoding from the previous
+                # keyframe that the seek does is not visible here
+                decoded += 1
+                sampled += 1
+                yield frame_count, frame
+            return
+
+        if start_frame > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        frame_count = start_frame
+        while cap.isOpened() and (end_frame is None or frame_count < end_frame):
+            is_sampled = (frame_count - start_frame) % frame_skip == 0
+            if sample_mode == "read":
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                decoded += 1
+                if is_sampled:
+                    sampled += 1
+                    yield frame_count, frame
             else:
-                is_key_frame = True  # First frame
-            
-            if is_key_frame:
-                # Store frame and its metadata
-                key_frames.append({
+                # grab() only demuxes and decodes into the internal buffer; the
+                # costly conversion to a BGR ndarray happens in retrieve().
+                if not cap.grab():
+                    break
+                decoded += 1
+                if is_sampled:
+                    ret, frame = cap.retrieve()
+                    if not ret:
+                        break
+                    sampled += 1
+                    yield frame_count, frame
+
+            frame_count += 1
+    finally:
+        metrics.count("frames_decoded", decoded)
+        metrics.count("frames_sampled", sampled)
+
+def _prefetch(iterable, max_in_flight):
+    """Run an iterator in a background thread, buffering at most max_in_flight items"""
+    items = queue.Queue(maxsize=max_in_flight)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # Keep retrying so the producer notices when the consumer goes away
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            close = getattr(iterable, "close", None)
+            if close:
+                close()
+            put(done)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        worker.join()
+
+def _iter_key_frames(video_path, sample_mode, detector, threshold, start_frame=0, end_frame=None):
+    """Decode a video and yield key frames one at a time
+
+    When start_frame > 0 the sample just before it is fed to the detector
+    first, so the first sample of the range is compared with the same frame
+    it would be in a sequential pass over the whole video.
+    """
+    scene_detector = create_detector(detector, threshold)
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        # Frame 0 is a valid priming frame, for a range starting at FRAME_SKIP
+        first_frame = max(start_frame - FRAME_SKIP, 0)
+        samples = sample_frames(cap, FRAME_SKIP, sample_mode, first_frame, end_frame)
+        for frame_count, frame in samples:
+            is_scene_change = scene_detector.is_scene_change(frame)
+            if frame_count < start_frame:
+                continue
+            if is_scene_change:
+                metrics.count("key_frames")
+                yield {
                     'frame': frame,
                     'frame_number': frame_count,
-                    'timestamp': timestamp
-                })
-            
-            previous_frame_small = frame_small
-        
-        frame_count += 1
+                    'seconds': frame_count / fps,
+                    'timestamp': format_timestamp(frame_count / fps)
+                }
+    finally:
+        cap.release()
+
+def _extract_shard(video_path, sample_mode, detector, threshold, start_frame, end_frame):
+    """Extract the key frames of one frame range (runs in a worker process)
+
+    Returns the key frames, the counters incremented meanwhile and the
+    worker's peak memory, which the parent merges into its own. Its CPU
+    time reaches the parent as that of a finished child once the pool is
+    shut down.
+    """
+    snapshot = metrics.counters()
+    key_frames = list(_iter_key_frames(video_path, sample_mode, detector, threshold, start_frame, end_frame))
+    return key_frames, metrics.since(snapshot), {"peak_rss_bytes": metrics.peak_rss_bytes()}
 
+def plan_shards(total_frames, workers, frame_skip=FRAME_SKIP):
+    """Split a video into at most workers (start_frame, end_frame) ranges
+
+    Boundaries fall on sampled frames, so the shards together sample exactly
+    the frames a sequential pass would.
+    """
+    total_samples = -(-total_frames // frame_skip)
+    workers = max(1, min(workers, total_samples))
+    bounds = [round(i * total_samples / workers) * frame_skip for i in range(workers + 1)]
+    bounds[-1] = total_frames
+    return [(bounds[i], bounds[i + 1]) for i in range(workers) if bounds[i] < bounds[i + 1]]
+
+def _iter_key_frames_parallel(video_path, sample_mode, detector, threshold, workers):
+    """Extract key frames from time shards in worker processes, in video order"""
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     cap.release()
+
+    if total_frames <= 0:
+        # Without a frame count there is nothing to split; decode sequentially
+        yield from _iter_key_frames(video_path, sample_mode, detector, threshold)
+        return
+
+    shards = plan_shards(total_frames, workers)
+    with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+        futures = [
+            executor.submit(_extract_shard, video_path, sample_mode, detector, threshold, start, end)
+            for start, end in shards
+        ]
+        for future in futures:
+            key_frames, counts, usage = future.result()
+            metrics.merge(counts, usage)
+            yield from key_frames
+
+def iter_key_frames(video_path, sample_mode="grab", max_in_flight=0, detector="mean", threshold=None, workers=1):
+    """Yield key frames as soon as they are found
+
+    With max_in_flight=0 decoding happens lazily in the caller's thread, so
+    only one full-resolution frame is alive at a time. A positive
+    max_in_flight decodes ahead in a background thread while the consumer
+    (e.g. OCR) works, holding at most that many key frames in the buffer.
+
+    detector names a scene detector from scene_detectors.DETECTORS; threshold
+    overrides its default threshold.
+
+    workers > 1 splits the video into that many time ranges and decodes them
+    in separate processes. Each worker seeks to its range and primes its
+    detector with the preceding sample, so the result matches a sequential
+    pass; key frames of a range are yielded once its worker finishes.
+    """
+    if workers > 1:
+        key_frames = _iter_key_frames_parallel(video_path, sample_mode, detector, threshold, workers)
+    else:
+        key_frames = _iter_key_frames(video_path, sample_mode, detector, threshold)
+    if max_in_flight > 0:
+        key_frames = _prefetch(key_frames, max_in_flight)
     return key_frames
 
+def extract_frames(video_path, sample_mode="grab", detector="mean", threshold=None, workers=1):
+    """Extract key frames based on scene changes with optimized processing
+
+    sample_mode selects how sampled frames are decoded (see SAMPLE_MODES).
+    "grab" yields the same key frames as "read" without converting the frames
+    that are skipped; "seek" is only faster when FRAME_SKIP spans several
+    keyframe intervals, since every seek decodes from the previous keyframe.
+    detector and threshold select the scene detector and workers the number
+    of processes decoding in parallel (see iter_key_frames).
+
+    Holds every key frame in memory; prefer iter_key_frames for long videos.
+    """
+    return list(iter_key_frames(video_path, sample_mode, detector=detector, threshold=threshold, workers=workers))
+
 def get_frame_info(frames_folder):
     """Read key frames info from file"""
     info_path = os.path.join(frames_folder, "key_frames_info.txt")
@@ -0,0 +1,631 @@
+import argparse
+import atexit
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from . import metrics, pipeline
+from .artifacts import record_video
+from .database import STAGE_AUDIO, STAGE_OCR, STAGE_TRANSCRIBE, reuse_checkpoints
+from .storage import content_hash
+
+JOBS_DB_PATH = "data/jobs.db"
+
+# Worker processes the app starts next to the Streamlit server
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+# Seconds between checks for new jobs when the queue is empty
+POLL_INTERVAL = 2.0
+# Running jobs not heard from for this long are assumed dead and retried
+STALE_AFTER = 300.0
+# Seconds between heartbeats of a running job
+HEARTBEAT_INTERVAL = 30.0
+# Attempts before a job that keeps dying is marked failed
+MAX_ATTEMPTS = 3
+# Seconds the app waits on shutdown for its workers to finish their current
+# job before terminating them (the job is then retried as stale)
+WORKER_SHUTDOWN_TIMEOUT = 30.0
+
+# Key frames decoded ahead of OCR; bounds the frames held in memory per video
+KEY_FRAME_BUFFER = int(os.getenv('KEY_FRAME_BUFFER', '4'))
+# Scene change detector used for key frame extraction (see scripts/scene_detectors.py)
+SCENE_DETECTOR = os.getenv('SCENE_DETECTOR', 'mean')
+# Processes decoding time ranges of a video in parallel
+EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', '1'))
+# Cores the OCR and transcription stages of one job share; by default the
+# machine's cores are split evenly between the worker processes
+PIPELINE_CPUS = int(os.getenv('PIPELINE_CPUS', '0'))
+
+# Stages of a processing job, in order (checkpointed per video, see
+# scripts/database.py)
+STAGES = (STAGE_OCR, STAGE_AUDIO, STAGE_TRANSCRIBE)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+JOBS_SCHEMA_SQL = '''
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY,
+        video_name TEXT NOT NULL,
+        video_path TEXT NOT NULL,
+        content_hash TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        worker TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        updated_at REAL,
+        finished_at REAL
+    );
+
+    CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+
+    CREATE TABLE IF NOT EXISTS job_stages (
+        job_id INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+        stage TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        progress REAL NOT NULL DEFAULT 0,
+        detail TEXT,
+        started_at REAL,
+        finished_at REAL,
+        wall_s REAL,
+        cpu_s REAL,
+        peak_rss_bytes INTEGER,
+        metrics TEXT,
+        PRIMARY KEY (job_id, stage)
+    );
+'''
+
+# Columns added after the first release, created on older job databases
+ADDED_COLUMNS = (
+    ("jobs", "content_hash", "TEXT"),
+    ("job_stages", "wall_s", "REAL"),
+    ("job_stages", "cpu_s", "REAL"),
+    ("job_stages", "peak_rss_bytes", "INTEGER"),
+    ("job_stages", "metrics", "TEXT"),
+)
+
+# Job databases whose schema this process already created
+_initialized = set()
+
+@contextmanager
+def jobs_connection(db_path=JOBS_DB_PATH, write=True):
+    """Short-lived connection to the jobs database, committed on success
+
+    Every use is one transaction; writers take the write lock up front
+    (BEGIN IMMEDIATE), so concurrent workers and the app queue up on it
+    instead of failing halfway through.
+    """
+    if db_path not in _initialized and os.path.dirname(db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        if db_path not in _initialized:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(JOBS_SCHEMA_SQL)
+            for table, column, column_type in ADDED_COLUMNS:
+                if column not in [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            _initialized.add(db_path)
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+def enqueue(video_path, video_name=None, db_path=JOBS_DB_PATH, video_hash=None):
+    """Queue a video for processing and return the job id
+
+    video_hash is the SHA-256 of the video's content if already known;
+    only pass it for a file that does not change until the job has run,
+    like the content path returned by spool_upload(). Otherwise the
+    worker computes it.
+    """
+    video_name = video_name or os.path.basename(video_path)
+    now = time.time()
+    with jobs_connection(db_path) as conn:
+        job_id = conn.execute(
+            "INSERT INTO jobs (video_name, video_path, content_hash, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (video_name, video_path, video_hash, now, now)
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO job_stages (job_id, stage) VALUES (?, ?)",
+            [(job_id, stage) for stage in STAGES]
+        )
+    return job_id
+
+def _requeue_stale(conn, now):
+    """Put running jobs whose worker stopped heartbeating back in the queue"""
+    stale = conn.execute(
+        "SELECT id, attempts FROM jobs WHERE status = ? AND updated_at < ?",
+        (RUNNING, now - STALE_AFTER)
+    ).fetchall()
+    for job in stale:
+        if job["attempts"] >= MAX_ATTEMPTS:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (FAILED, "Worker stopped responding", now, job["id"])
+            )
+        else:
+            conn.execute("UPDATE jobs SET status = ?, worker = NULL WHERE id = ?", (QUEUED, job["id"]))
+
+def claim_job(worker, db_path=JOBS_DB_PATH):
+    """Take the oldest queued job for worker, or return None
+
+    The select and update run in one write transaction, so two workers
+    never claim the same job.
+    """
+    now = time.time()
+    with jobs_connection(db_path) as conn:
+        _requeue_stale(conn, now)
+        job = conn.execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if job is None:
+            return None
+        conn.execute('''
+            UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1,
+                            started_at = ?, updated_at = ?, error = NULL
+            WHERE id = ?
+        ''', (RUNNING, worker, now, now, job["id"]))
+        return dict(job)
+
+def heartbeat(job_id, db_path=JOBS_DB_PATH):
+    """Mark a running job as still alive"""
+    with jobs_connection(db_path) as conn:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+def update_stage(job_id, stage, progress=None, status=RUNNING, detail=None, db_path=JOBS_DB_PATH):
+    """Record the status and progress (0 to 1) of one stage of a job"""
+    now = time.time()
+    with jobs_connection(db_path) as conn:
+        conn.execute('''
+            UPDATE job_stages
+            SET status = ?,
+                progress = COALESCE(?, progress),
+                detail = COALESCE(?, detail),
+                started_at = COALESCE(started_at, ?),
+                finished_at = CASE WHEN ? IN ('done', 'failed') THEN ? ELSE finished_at END
+            WHERE job_id = ? AND stage = ?
+        ''', (status, progress, detail, now, status, now, job_id, stage))
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+
+def record_stage_metrics(job_id, stage, measurement, db_path=JOBS_DB_PATH):
+    """Store what a stage run cost, as measured by metrics.measure()"""
+    with jobs_connection(db_path) as conn:
+        conn.execute(
+            "UPDATE job_stages SET wall_s = ?, cpu_s = ?, peak_rss_bytes = ?, metrics = ? WHERE job_id = ? AND stage = ?",
+            (measurement["wall_s"], measurement["cpu_s"], measurement["peak_rss_bytes"],
+             json.dumps(measurement["counters"]), job_id, stage)
+        )
+
+def finish_job(job_id, error=None, db_path=JOBS_DB_PATH):
+    """Mark a job done, or failed with an error message"""
+    now = time.time()
+    with jobs_connection(db_path) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+            (FAILED if error else DONE, error, now, now, job_id)
+        )
+
+def retry_job(job_id, db_path=JOBS_DB_PATH):
+    """Queue a failed job again"""
+    with jobs_connection(db_path) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = ?, attempts = 0, error = NULL, finished_at = NULL WHERE id = ? AND status = ?",
+            (QUEUED, job_id, FAILED)
+        )
+        conn.execute(
+            "UPDATE job_stages SET status = ?, progress = 0, finished_at = NULL WHERE job_id = ? AND status != ?",
+            (QUEUED, job_id, DONE)
+        )
+
+def _stage_info(row):
+    """A job_stages row as a dict, with its metrics decoded"""
+    info = dict(row)
+    info["metrics"] = json.loads(info["metrics"]) if info.get("metrics") else {}
+    return info
+
+def list_jobs(limit=50, db_path=JOBS_DB_PATH):
+    """Most recent jobs, newest first, each with a "stages" dict"""
+    with jobs_connection(db_path, write=False) as conn:
+        jobs = [dict(row) for row in conn.execute(
+            "SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)
+        )]
+        for job in jobs:
+            job["stages"] = {
+                row["stage"]: _stage_info(row)
+                for row in conn.execute("SELECT * FROM job_stages WHERE job_id = ?", (job["id"],))
+            }
+    return jobs
+
+def get_job(job_id, db_path=JOBS_DB_PATH):
+    """One job with its stages, or None"""
+    with jobs_connection(db_path, write=False) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["stages"] = {
+            stage["stage"]: _stage_info(stage)
+            for stage in conn.execute("SELECT * FROM job_stages WHERE job_id = ?", (job_id,))
+        }
+    return job
+
+def has_active_jobs(db_path=JOBS_DB_PATH):
+    """True while any job is queued or running"""
+    with jobs_connection(db_path, write=False) as conn:
+        row = conn.execute(
+            "SELECT 1 FROM jobs WHERE status IN (?, ?) LIMIT 1", (QUEUED, RUNNING)
+        ).fetchone()
+    return row is not None
+
+def stage_totals(db_path=JOBS_DB_PATH):
+    """Totals of every measured stage run, by stage
+
+    Returns {stage: {"runs": {status: count}, "wall_s", "cpu_s",
+    "peak_rss_bytes" (the highest), "counters": {name: total}}}. Stages
+    skipped because their content was unchanged were not measured.
+    """
+    totals = {}
+    with jobs_connection(db_path, write=False) as conn:
+        rows = conn.execute(
+            "SELECT stage, status, wall_s, cpu_s, peak_rss_bytes, metrics FROM job_stages WHERE wall_s IS NOT NULL"
+        ).fetchall()
+    for row in rows:
+        stage = totals.setdefault(row["stage"], {
+            "runs": {}, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_bytes": 0, "counters": {}
+        })
+        stage["runs"][row["status"]] = stage["runs"].get(row["status"], 0) + 1
+        stage["wall_s"] += row["wall_s"]
+        stage["cpu_s"] += row["cpu_s"] or 0.0
+        stage["peak_rss_bytes"] = max(stage["peak_rss_bytes"], row["peak_rss_bytes"] or 0)
+        for name, value in json.loads(row["metrics"] or "{}").items():
+            stage["counters"][name] = stage["counters"].get(name, 0) + value
+    return totals
+
+def metrics_text(db_path=JOBS_DB_PATH):
+    """Job and stage metrics in the Prometheus text format (served at /metrics)"""
+    with jobs_connection(db_path, write=False) as conn:
+        jobs = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+    totals = stage_totals(db_path)
+
+    def per_stage(value):
+        return [({"stage": stage}, value(total)) for stage, total in sorted(totals.items())]
+
+    families = [
+        ("jobs", "gauge", "Processing jobs, by status",
+         [({"status": status}, jobs.get(status, 0)) for status in (QUEUED, RUNNING, DONE, FAILED)]),
+        ("stage_runs_total", "counter", "Measured pipeline stage runs, by result",
+         [({"stage": stage, "status": status}, runs)
+          for stage, total in sorted(totals.items()) for status, runs in sorted(total["runs"].items())]),
+        ("stage_wall_seconds_total", "counter", "Wall time of pipeline stage runs",
+         per_stage(lambda total: total["wall_s"])),
+        ("stage_cpu_seconds_total", "counter", "CPU time of pipeline stage runs, worker processes included",
+         per_stage(lambda total: total["cpu_s"])),
+        ("stage_peak_rss_bytes", "gauge", "Highest peak resident memory of a pipeline stage process or its workers",
+         per_stage(lambda total: total["peak_rss_bytes"])),
+    ]
+    for name, help_text in metrics.COUNTERS.items():
+        families.append((f"{name}_total", "counter", help_text, [
+            ({"stage": stage}, total["counters"][name])
+            for stage, total in sorted(totals.items()) if name in total["counters"]
+        ]))
+    return metrics.prometheus_text(families)
+
+class _Heartbeat:
+    """Background thread keeping a job alive during long silent stages"""
+
+    def __init__(self, job_id, db_path):
+        self.job_id = job_id
+        self.db_path = db_path
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                heartbeat(self.job_id, self.db_path)
+            except Exception as e:
+                print(f"Error sending heartbeat for job {self.job_id}: {str(e)}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+
+def _report_progress(key_frames, job_id, total_frames, db_path, interval=2.0):
+    """Pass key frames through, recording how far into the video they are"""
+    last_report = 0.0
+    for frame_data in key_frames:
+        now = time.monotonic()
+        if total_frames and now - last_report >= interval:
+            progress = min(frame_data['frame_number'] / total_frames, 1.0)
+            update_stage(job_id, STAGE_OCR, progress, detail=f"frame {frame_data['frame_number']}", db_path=db_path)
+            last_report = now
+        yield frame_data
+
+def _warm_up_ocr():
+    if os.getenv('WARM_UP_MODELS', '1') == '1':
+        from .model_registry import get_ocr_reader
+        get_ocr_reader(['en'])
+
+def _warm_up_whisper():
+    if os.getenv('WARM_UP_MODELS', '1') == '1':
+        from .model_registry import get_whisper_model
+        get_whisper_model("base")
+
+@contextmanager
+def _measured(job, stage, db_path):
+    """Measure a stage run, then store its metrics and log them (see scripts/metrics.py)"""
+    status = FAILED
+    try:
+        with metrics.measure() as measurement:
+            yield
+        status = DONE
+    finally:
+        try:
+            record_stage_metrics(job["id"], stage, measurement, db_path)
+            metrics.log_event(dict(
+                measurement, event="stage", job_id=job["id"], video=job["video_name"],
+                content_hash=job["content_hash"], stage=stage, status=status,
+                **metrics.rates(measurement["wall_s"], measurement["counters"])
+            ))
+        except Exception as e:
+            print(f"Error recording metrics of job {job['id']}: {str(e)}")
+
+def _ocr_stage(job, db_path, threads=1):
+    """Visual branch: extract key frames and OCR them as they are found"""
+    import cv2
+    from .extract_frames import iter_key_frames
+    from .ocr_detection import ocr_detection
+
+    cap = cv2.VideoCapture(job["video_path"])
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    update_stage(job["id"], STAGE_OCR, 0.0, db_path=db_path)
+    with _measured(job, STAGE_OCR, db_path):
+        key_frames = iter_key_frames(job["video_path"], max_in_flight=KEY_FRAME_BUFFER,
+                                     detector=SCENE_DETECTOR, workers=EXTRACT_WORKERS)
+        ocr_detection(_report_progress(key_frames, job["id"], total_frames, db_path), job["video_name"],
+                      threads=threads, video_hash=job["content_hash"])
+    update_stage(job["id"], STAGE_OCR, 1.0, status=DONE, db_path=db_path)
+
+def _audio_stage(job, db_path, threads=1):
+    """Decode the audio track once into the audio cache"""
+    from .audio_extraction import extract_audio
+    from .database import IndexWriter
+
+    update_stage(job["id"], STAGE_AUDIO, 0.0, db_path=db_path)
+    with _measured(job, STAGE_AUDIO, db_path):
+        extract_audio(job["video_path"], job["content_hash"])
+        with IndexWriter() as writer:
+            writer.checkpoint(job["video_name"], STAGE_AUDIO, job["content_hash"])
+    update_stage(job["id"], STAGE_AUDIO, 1.0, status=DONE, db_path=db_path)
+
+def _transcribe_stage(job, db_path, threads=1):
+    """Audio branch: transcribe the speech of the video with Whisper"""
+    from .speech_to_text import transcribe_video
+
+    update_stage(job["id"], STAGE_TRANSCRIBE, 0.0, db_path=db_path)
+    with _measured(job, STAGE_TRANSCRIBE, db_path):
+        transcribe_video(job["video_path"], job["video_name"], threads=threads, video_hash=job["content_hash"],
+                         on_progress=lambda progress: update_stage(job["id"], STAGE_TRANSCRIBE, progress,
+                                                                   db_path=db_path))
+    update_stage(job["id"], STAGE_TRANSCRIBE, 1.0, status=DONE, db_path=db_path)
+
+def job_stages(job, db_path=JOBS_DB_PATH, cpu_budget=None):
+    """The pipeline stages of a job that still have to run
+
+    OCR and the audio branch (decoding, then transcription) do not depend
+    on each other, so they run in parallel, each asking for half of the
+    CPU budget. Stages already done (by an earlier attempt of a retried
+    job) are left out.
+    """
+    cpu_budget = cpu_budget or pipeline.CPU_BUDGET
+    done = {stage for stage, info in get_job(job["id"], db_path)["stages"].items() if info["status"] == DONE}
+    stages = [
+        pipeline.Stage(STAGE_OCR, _ocr_stage, (job, db_path),
+                       cpus=max(1, (cpu_budget + 1) // 2), warm_up=_warm_up_ocr),
+        pipeline.Stage(STAGE_AUDIO, _audio_stage, (job, db_path)),
+        pipeline.Stage(STAGE_TRANSCRIBE, _transcribe_stage, (job, db_path),
+                       deps=(STAGE_AUDIO,), cpus=max(1, cpu_budget // 2), warm_up=_warm_up_whisper),
+    ]
+    stages = [stage for stage in stages if stage.name not in done]
+    for stage in stages:
+        stage.deps = tuple(dep for dep in stage.deps if dep not in done)
+    return stages
+
+def process_job(job, db_path=JOBS_DB_PATH, cpu_budget=None):
+    """Run the processing stages of a claimed job
+
+    The video is identified by its content hash: stages already done for
+    that content (for this video, or another one with the same content)
+    are marked done without running, so re-uploading an unchanged video
+    costs a hash, and a job that died resumes after its last checkpoint.
+    """
+    if not os.path.exists(job["video_path"]):
+        raise FileNotFoundError(f"Video not found: {job['video_path']}")
+    if not job.get("content_hash"):
+        job = dict(job, content_hash=content_hash(job["video_path"]))
+        with jobs_connection(db_path) as conn:
+            conn.execute("UPDATE jobs SET content_hash = ? WHERE id = ?", (job["content_hash"], job["id"]))
+
+    reused = reuse_checkpoints(job["video_name"], job["content_hash"], STAGES)
+    for stage in reused:
+        update_stage(job["id"], stage, 1.0, status=DONE, detail="unchanged", db_path=db_path)
+    if reused:
+        # The video may have taken the results of another one with the
+        # same content; note it so rebuilds from artifacts include it
+        record_video(job["video_name"], job["content_hash"])
+
+    cpu_budget = cpu_budget or pipeline.CPU_BUDGET
+    pipeline.run_stages(job_stages(job, db_path, cpu_budget), cpu_budget)
+
+def run_worker(worker=None, db_path=JOBS_DB_PATH, poll_interval=POLL_INTERVAL, stop_event=None, once=False,
+               cpu_budget=None):
+    """Process queued jobs until stop_event is set (or the queue is empty, with once)
+
+    Each job's stages run in per-stage processes (see scripts/pipeline.py)
+    that load their model on the first job and keep it for the next ones.
+    A worker started by another process also stops when that process is
+    gone, so workers of a killed app do not linger.
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    cpu_budget = cpu_budget or PIPELINE_CPUS or None
+    parent = multiprocessing.parent_process()
+
+    try:
+        while stop_event is None or not stop_event.is_set():
+            if parent is not None and not parent.is_alive():
+                return
+            job = claim_job(worker, db_path)
+            if job is None:
+                if once:
+                    return
+                if stop_event is not None:
+                    stop_event.wait(poll_interval)
+                else:
+                    time.sleep(poll_interval)
+                continue
+
+            print(f"{worker}: processing job {job['id']} ({job['video_name']})")
+            try:
+                with _Heartbeat(job["id"], db_path):
+                    process_job(job, db_path, cpu_budget)
+                finish_job(job["id"], db_path=db_path)
+            except Exception as e:
+                print(f"Error processing job {job['id']}: {str(e)}")
+                traceback.print_exc()
+                for stage, info in get_job(job["id"], db_path)["stages"].items():
+                    if info["status"] == RUNNING:
+                        update_stage(job["id"], stage, status=FAILED, db_path=db_path)
+                finish_job(job["id"], error=str(e), db_path=db_path)
+    finally:
+        pipeline.shutdown()
+
+def _split_cpus(processes):
+    """Default CPU budget of each of processes workers"""
+    return PIPELINE_CPUS or max(1, (os.cpu_count() or 1) // max(processes, 1))
+
+_workers = []
+_workers_lock = threading.Lock()
+# Event telling the workers of this process to stop, created with the first one
+_stop_event = None
+_atexit_registered = False
+
+def ensure_workers(count=JOB_WORKERS, db_path=JOBS_DB_PATH):
+    """Keep count worker processes running for this server process
+
+    Workers are spawned rather than forked, so they do not inherit the
+    caller's threads (Streamlit's server), and load their own models.
+    They are not daemonic, since their stages run in child processes of
+    their own; stop_workers() stops them, and runs when this process exits.
+    """
+    global _stop_event, _atexit_registered
+    with _workers_lock:
+        _workers[:] = [process for process in _workers if process.is_alive()]
+        context = multiprocessing.get_context("spawn")
+        if _stop_event is None:
+            _stop_event = context.Event()
+        if not _atexit_registered:
+            # Registered after multiprocessing's own exit handler, so it runs
+            # first and the workers are told to stop before being joined
+            atexit.register(stop_workers)
+            _atexit_registered = True
+        while len(_workers) < count:
+            process = context.Process(target=run_worker, kwargs={
+                "db_path": db_path, "cpu_budget": _split_cpus(count), "stop_event": _stop_event
+            })
+            process.start()
+            _workers.append(process)
+        return len(_workers)
+
+def stop_workers(timeout=WORKER_SHUTDOWN_TIMEOUT):
+    """Stop the workers started by ensure_workers()
+
+    Workers finish the job they are processing; those still busy after
+    timeout seconds are terminated.
+    """
+    global _stop_event
+    with _workers_lock:
+        if _stop_event is not None:
+            _stop_event.set()
+        deadline = time.monotonic() + timeout
+        for process in _workers:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        _workers.clear()
+        _stop_event = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Video processing job queue")
+    parser.add_argument("--db", default=JOBS_DB_PATH, help="Jobs database (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker_parser = commands.add_parser("worker", help="Run worker processes")
+    worker_parser.add_argument("--processes", type=int, default=JOB_WORKERS)
+    worker_parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+
+    enqueue_parser = commands.add_parser("enqueue", help="Queue videos for processing")
+    enqueue_parser.add_argument("paths", nargs="+")
+
+    commands.add_parser("status", help="List recent jobs")
+    commands.add_parser("metrics", help="Print job and stage metrics in the Prometheus text format")
+
+    retry_parser = commands.add_parser("retry", help="Queue a failed job again")
+    retry_parser.add_argument("job_id", type=int)
+
+    args = parser.parse_args()
+    if args.command == "worker":
+        cpu_budget = _split_cpus(args.processes)
+        if args.processes <= 1:
+            run_worker(db_path=args.db, once=args.once, cpu_budget=cpu_budget)
+        else:
+            context = multiprocessing.get_context("spawn")
+            processes = [
+                context.Process(target=run_worker,
+                                kwargs={"db_path": args.db, "once": args.once, "cpu_budget": cpu_budget})
+                for _ in range(args.processes)
+            ]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+    elif args.command == "enqueue":
+        for path in args.paths:
+            print(f"Queued job {enqueue(path, db_path=args.db)} for {path}")
+    elif args.command == "status":
+        for job in list_jobs(db_path=args.db):
+            stages = ", ".join(
+                f"{stage} {info['status']} {info['progress']:.0%}"
+                + (f" {info['wall_s']:.1f}s" if info["wall_s"] is not None else "")
+                for stage, info in job["stages"].items()
+            )
+            print(f"{job['id']:>5} {job['status']:<8} {job['video_name']} ({stages}){' - ' + job['error'] if job['error'] else ''}")
+    elif args.command == "metrics":
+        print(metrics_text(args.db), end="")
+    elif args.command == "retry":
+        retry_job(args.job_id, db_path=args.db)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import mimetypes
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+from .storage import SPOOL_DIR
+
+# Address the media server listens on; the browser must be able to reach it
+MEDIA_HOST = os.getenv("MEDIA_HOST", "127.0.0.1")
+MEDIA_PORT = int(os.getenv("MEDIA_PORT", "8502"))
+# URL the browser uses for the server, if not http://MEDIA_HOST:MEDIA_PORT
+# (e.g. behind a proxy)
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "")
+# Bytes written to the socket at a time
+COPY_CHUNK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def parse_range(header, size):
+    """Parse a single-range Range header into an inclusive (start, end)
+
+    Returns None when the whole file should be sent (no header, several
+    ranges or a unit other than bytes) and raises ValueError for a range
+    that cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        raise ValueError("Empty range")
+    if not start:
+        # Suffix range: the last n bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    """Serves the videos of media_dir with byte range support (HTTP 206)
+
+    Browsers request small ranges of a video as the user seeks, so playback
+    starts at once and jumping to a search hit only fetches the bytes
+    around it. /metrics serves the processing metrics of the job queue
+    in the Prometheus text format.
+    """
+
+    media_dir = SPOOL_DIR
+    protocol_version = "HTTP/1.1"
+
+    def _send_metrics(self, send_body):
+        from .job_queue import metrics_text
+
+        try:
+            body = metrics_text().encode()
+        except Exception as e:
+            self.send_error(500, f"Error collecting metrics: {str(e)}")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _file_path(self):
+        name = unquote(urlsplit(self.path).path).lstrip("/")
+        # Only the videos spooled by name: nothing in subdirectories, and no
+        # dotfiles such as the content store (.content/) or partial writes
+        if not name or "/" in name or os.sep in name or name.startswith(".") or name.endswith(".part"):
+            return None
+        root = os.path.realpath(self.media_dir)
+        path = os.path.realpath(os.path.join(root, name))
+        if not path.startswith(root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def _send_file(self, send_body):
+        path = self._file_path()
+        if path is None:
+            self.send_error(404, "File not found")
+            return
+
+        size = os.path.getsize(path)
+        try:
+            byte_range = parse_range(self.headers.get("Range"), size)
+        except ValueError:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if byte_range is None:
+            start, end = 0, size - 1
+            self.send_response(200)
+        else:
+            start, end = byte_range
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        length = end - start + 1 if size else 0
+        self.send_header("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Cache-Control", "private, max-age=3600")
+        self.end_headers()
+        if not send_body:
+            return
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = length
+            try:
+                while remaining > 0:
+                    chunk = f.read(min(COPY_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                # The browser cancels range requests whenever the user seeks
+                self.close_connection = True
+
+    def do_GET(self):
+        if urlsplit(self.path).path == "/metrics":
+            self._send_metrics(send_body=True)
+        else:
+            self._send_file(send_body=True)
+
+    def do_HEAD(self):
+        if urlsplit(self.path).path == "/metrics":
+            self._send_metrics(send_body=False)
+        else:
+            self._send_file(send_body=False)
+
+    def log_message(self, format, *args):
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_media_server(host=MEDIA_HOST, port=MEDIA_PORT, media_dir=SPOOL_DIR):
+    """Start the media server in a background thread, once per process
+
+    Returns the server; later calls return the running one.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            os.makedirs(media_dir, exist_ok=True)
+            handler = type("Handler", (MediaRequestHandler,), {"media_dir": media_dir})
+            server = ThreadingHTTPServer((host, port), handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True, name="media-server").start()
+            _server = server
+        return _server
+
+def stop_media_server():
+    """Stop the background media server, if running"""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.shutdown()
+            _server.server_close()
+            _server = None
+
+def media_url(name):
+    """URL of a file of the media directory on the media server"""
+    if MEDIA_BASE_URL:
+        base_url = MEDIA_BASE_URL.rstrip("/")
+    else:
+        host, port = _server.server_address[:2] if _server else (MEDIA_HOST, MEDIA_PORT)
+        host = "localhost" if host in ("0.0.0.0", "127.0.0.1") else host
+        base_url = f"http://{host}:{port}"
+    return f"{base_url}/{quote(name)}"
+
+if __name__ == "__main__":
+    # Serve the spool directory on its own, e.g. behind a reverse proxy
+    server = start_media_server()
+    print(f"Serving {SPOOL_DIR} on http://{MEDIA_HOST}:{MEDIA_PORT}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stop_media_server()
@@ -0,0 +1,165 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# JSON Lines file every finished pipeline stage is logged to ("" to disable)
+METRICS_LOG = os.getenv("METRICS_LOG", "data/metrics.jsonl")
+# Prefix of the exported Prometheus metric names
+METRIC_PREFIX = "video_search"
+
+# Counters the pipeline code increments, with their help text
+COUNTERS = {
+    "frames_decoded": "Video frames decoded while sampling",
+    "frames_sampled": "Sampled frames compared by the scene detector",
+    "key_frames": "Key frames found",
+    "ocr_frames": "Key frames OCR'd (including OCR cache hits)",
+    "ocr_seconds": "Seconds spent in OCR",
+    "audio_seconds": "Seconds of audio transcribed",
+    "speech_seconds": "Seconds of detected speech sent to Whisper",
+    "rows_indexed": "Segment rows committed to the search index",
+}
+
+_counters = Counter()
+_counters_lock = threading.Lock()
+# Worker usage merged while measure() blocks run, one dict per block
+_measuring = []
+
+def count(name, value=1):
+    """Add value to a counter of this process"""
+    with _counters_lock:
+        _counters[name] += value
+
+def counters():
+    """Snapshot of this process's counters"""
+    with _counters_lock:
+        return dict(_counters)
+
+def merge(values, usage=None):
+    """Add counters measured in another process (e.g. a worker) to this one
+
+    usage is what the worker reports of its own resources (see
+    process_usage()): its cpu_s is added to the CPU time of the running
+    measure() blocks and its peak_rss_bytes counts towards their peak.
+    Only report cpu_s for workers that outlive the block (e.g. a pool kept
+    between videos); the CPU time of joined children is counted anyway.
+    """
+    with _counters_lock:
+        _counters.update(values)
+        for measured in _measuring:
+            measured["cpu_s"] += (usage or {}).get("cpu_s", 0.0)
+            measured["peak_rss_bytes"] = max(measured["peak_rss_bytes"],
+                                             (usage or {}).get("peak_rss_bytes") or 0)
+
+def since(snapshot):
+    """Counters incremented since snapshot was taken, as {name: increase}"""
+    return {name: value - snapshot.get(name, 0) for name, value in counters().items()
+            if value != snapshot.get(name, 0)}
+
+def cpu_seconds():
+    """User and system CPU time of this process and its finished children"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def peak_rss_bytes():
+    """Peak resident memory of this process so far, or None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def process_usage():
+    """CPU time and peak resident memory of this process alone
+
+    What a worker process reports back with its results, see merge().
+    """
+    times = os.times()
+    return {"cpu_s": times.user + times.system, "peak_rss_bytes": peak_rss_bytes()}
+
+@contextmanager
+def measure():
+    """Measure the block; the yielded dict is filled in when it exits
+
+    Keys: wall_s, cpu_s (of this process, its finished children and the
+    workers whose usage was merged), peak_rss_bytes (the highest of this
+    process and those workers, each over its whole life, which for
+    long-lived processes includes earlier videos) and counters (the
+    counters incremented by the block and the workers it merged).
+    """
+    result = {}
+    workers = {"cpu_s": 0.0, "peak_rss_bytes": 0}
+    snapshot = counters()
+    start_wall = time.perf_counter()
+    start_cpu = cpu_seconds()
+    with _counters_lock:
+        _measuring.append(workers)
+    try:
+        yield result
+    finally:
+        with _counters_lock:
+            _measuring[:] = [measured for measured in _measuring if measured is not workers]
+        peak = peak_rss_bytes()
+        result.update(
+            wall_s=time.perf_counter() - start_wall,
+            cpu_s=cpu_seconds() - start_cpu + workers["cpu_s"],
+            peak_rss_bytes=max(peak, workers["peak_rss_bytes"]) if peak is not None else None,
+            counters=since(snapshot),
+        )
+
+def rates(wall_s, values):
+    """Throughput figures derived from a stage's wall time and counters"""
+    derived = {}
+    if values.get("ocr_seconds"):
+        derived["ocr_frames_per_second"] = values.get("ocr_frames", 0) / values["ocr_seconds"]
+    if values.get("frames_decoded"):
+        derived["sampled_ratio"] = values.get("frames_sampled", 0) / values["frames_decoded"]
+    if values.get("audio_seconds") and wall_s:
+        # Below 1 is faster than real time
+        derived["asr_real_time_factor"] = wall_s / values["audio_seconds"]
+    return derived
+
+def log_event(event, path=METRICS_LOG):
+    """Append an event to the metrics log as one JSON line
+
+    Lines are written with a single small write, so processes can log
+    concurrently.
+    """
+    if not path:
+        return
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    line = json.dumps(dict(event, time=time.time()), separators=(",", ":")) + "\n"
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items())) + "}"
+
+def prometheus_text(metrics):
+    """Render metrics in the Prometheus text exposition format
+
+    metrics is a list of (name, type, help, samples) with samples a list
+    of (labels dict, value); names get METRIC_PREFIX.
+    """
+    lines = []
+    for name, metric_type, help_text, samples in metrics:
+        name = f"{METRIC_PREFIX}_{name}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(labels)} {float(value)}")
+    return "\n".join(lines) + "\n"
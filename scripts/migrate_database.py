@@ -0,0 +1,45 @@
+import argparse
+import glob
+import time
+from .database import DB_PATH, SCHEMA_SQL, connect_for_writing, migrate_legacy_metadata
+
+def migrate_database(db_path, keep_legacy=False, vacuum=False):
+    """Convert one database from the video_metadata table to videos/segments"""
+    conn = connect_for_writing(db_path)
+    try:
+        start = time.perf_counter()
+        migrated = migrate_legacy_metadata(conn, drop_legacy=not keep_legacy)
+        conn.executescript(SCHEMA_SQL)
+        if vacuum:
+            conn.execute("VACUUM")
+        seconds = time.perf_counter() - start
+    finally:
+        conn.close()
+
+    print(f"{db_path}: migrated {migrated} rows in {seconds:.2f}s")
+    return migrated
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate metadata databases to the normalized schema")
+    parser.add_argument("paths", nargs="*", default=[DB_PATH],
+                        help="Database files or glob patterns (default: %(default)s)")
+    parser.add_argument("--keep-legacy", action="store_true",
+                        help="Keep the old table (as video_metadata_legacy) after copying its rows")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="Reclaim the space of the dropped table")
+    args = parser.parse_args()
+
+    total = 0
+    for pattern in args.paths:
+        db_paths = sorted(glob.glob(pattern))
+        if not db_paths:
+            print(f"No database found at {pattern}")
+        for db_path in db_paths:
+            try:
+                total += migrate_database(db_path, args.keep_legacy, args.vacuum)
+            except Exception as e:
+                print(f"Error migrating {db_path}: {str(e)}")
+    print(f"Migrated {total} rows in total")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import gc
+import os
+import threading
+from collections import OrderedDict
+
+# Most models kept loaded at once; the least recently used is dropped first
+MAX_LOADED_MODELS = int(os.getenv("MAX_LOADED_MODELS", "4"))
+# Loaded models are evicted while less than this much memory is available
+MIN_AVAILABLE_MB = int(os.getenv("MODEL_MIN_AVAILABLE_MB", "1024"))
+
+# Models live at module level, so they are shared by every Streamlit session
+# and survive reruns for as long as the server process is alive.
+_models = OrderedDict()
+_lock = threading.RLock()
+
+def default_device():
+    """Return "cuda" when a GPU is usable, otherwise "cpu" """
+    try:
+        import torch
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    except ImportError:
+        return "cpu"
+
+def available_memory_mb():
+    """Memory available to new allocations in MB, or None if unknown"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+def _memory_is_tight():
+    available = available_memory_mb()
+    return available is not None and available < MIN_AVAILABLE_MB
+
+def _make_room():
+    """Evict least recently used models until limits are respected"""
+    evicted = False
+    while _models and (len(_models) >= MAX_LOADED_MODELS or _memory_is_tight()):
+        key, _ = _models.popitem(last=False)
+        print(f"Evicted model {key}")
+        evicted = True
+    if evicted:
+        gc.collect()
+
+def get_model(key, loader):
+    """Return the model cached under key, loading it with loader() on first use"""
+    with _lock:
+        if key in _models:
+            _models.move_to_end(key)
+            return _models[key]
+
+        _make_room()
+        model = loader()
+        _models[key] = model
+        return model
+
+def get_ocr_reader(languages=("en",), device=None):
+    """Shared easyocr.Reader for the given languages and device"""
+    device = device or default_device()
+    key = ("easyocr", tuple(languages), device)
+
+    def load():
+        import easyocr
+        return easyocr.Reader(list(languages), gpu=device != "cpu")
+
+    return get_model(key, load)
+
+def get_whisper_model(name="base", device=None):
+    """Shared Whisper model of the given size and device"""
+    device = device or default_device()
+    key = ("whisper", name, device)
+
+    def load():
+        import whisper
+        return whisper.load_model(name, device=device)
+
+    return get_model(key, load)
+
+def warm_up(ocr_languages=("en",), whisper_model="base"):
+    """Load the models used by the pipeline ahead of the first upload"""
+    get_ocr_reader(ocr_languages)
+    get_whisper_model(whisper_model)
+
+def evict(key=None):
+    """Drop one cached model, or every cached model when key is None"""
+    with _lock:
+        if key is None:
+            _models.clear()
+        else:
+            _models.pop(key, None)
+    gc.collect()
+
+def loaded_models():
+    """Keys of the currently loaded models, least recently used first"""
+    with _lock:
+        return list(_models)
+
+if __name__ == "__main__":
+    # Downloads the model weights, e.g. while building an image
+    warm_up()
+    print(f"Loaded models: {loaded_models()}")
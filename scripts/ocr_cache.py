@@ -0,0 +1,169 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from .scene_detectors import dhash
+
+# Frames whose hashes differ in at most this many bits share OCR results
+MAX_HAMMING_DISTANCE = 8
+MAX_ENTRIES = 20000
+# Seconds a write waits for another process holding the cache's write lock
+CACHE_LOCK_TIMEOUT = 30.0
+
+# Number of set bits for every byte value, to popcount packed hashes
+_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint16)
+
+def frame_key(frame):
+    """Perceptual key under which a frame's OCR results are cached"""
+    return dhash(frame)
+
+def _to_json(results):
+    """Convert EasyOCR readtext() output into JSON friendly lists"""
+    return [
+        [[[float(x), float(y)] for x, y in box], text, float(confidence)]
+        for box, text, confidence in results
+    ]
+
+class OCRCache:
+    """Persistent OCR result cache keyed by a perceptual hash of the frame
+
+    Lookups return the results of the closest cached frame within
+    max_distance bits, so a slide shown again (in the same or another
+    video) is not OCR'd twice. Entries live in SQLite and are mirrored in
+    memory in least recently used order; the oldest are evicted beyond
+    max_entries. Hits only update last_used in memory; the times are
+    written with the next put() or flush(), so a hit costs no commit.
+    """
+
+    def __init__(self, db_path="data/ocr_cache.db", max_entries=MAX_ENTRIES, max_distance=MAX_HAMMING_DISTANCE):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # hash bytes -> results
+        self._matrix = None  # hashes as an (n, hash_bytes) uint8 array
+        self._keys = []
+        self._touched = {}  # hash bytes -> last_used not yet written
+
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Shared by the job workers: WAL lets them read while one writes
+        self._conn = sqlite3.connect(db_path, timeout=CACHE_LOCK_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                hash BLOB PRIMARY KEY,
+                results TEXT,
+                last_used REAL
+            )
+        ''')
+        rows = self._conn.execute(
+            "SELECT hash, results FROM ocr_cache ORDER BY last_used DESC LIMIT ?", (max_entries,)
+        ).fetchall()
+        for key, results in reversed(rows):
+            self._entries[bytes(key)] = json.loads(results)
+
+    def _nearest(self, key):
+        """Return the cached hash closest to key within max_distance, if any"""
+        if key in self._entries:
+            return key
+        if not self._entries:
+            return None
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = np.frombuffer(b''.join(self._keys), dtype=np.uint8).reshape(len(self._keys), -1)
+        if self._matrix.shape[1] != len(key):
+            return None
+
+        query = np.frombuffer(key, dtype=np.uint8)
+        distances = _POPCOUNT[np.bitwise_xor(self._matrix, query)].sum(axis=1)
+        best = int(np.argmin(distances))
+        if distances[best] <= self.max_distance:
+            return self._keys[best]
+        return None
+
+    def get(self, key):
+        """Return cached OCR results for a frame key, or None"""
+        with self._lock:
+            match = self._nearest(key)
+            if match is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(match)
+            self._touched[match] = time.time()
+            return self._entries[match]
+
+    def _write_touched(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE ocr_cache SET last_used = ? WHERE hash = ?",
+                [(last_used, key) for key, last_used in self._touched.items()]
+            )
+            self._touched = {}
+
+    def flush(self):
+        """Write the last_used times of the hits since the last write"""
+        with self._lock:
+            if self._touched:
+                self._write_touched()
+                self._conn.commit()
+
+    def put(self, key, results):
+        """Store OCR results (readtext() output) for a frame key"""
+        results = _to_json(results)
+        with self._lock:
+            self._entries[key] = results
+            self._entries.move_to_end(key)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (hash, results, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(results), time.time())
+            )
+
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._touched.pop(old_key, None)
+                evicted.append((old_key,))
+            if evicted:
+                self._conn.executemany("DELETE FROM ocr_cache WHERE hash = ?", evicted)
+            self._write_touched()
+            self._conn.commit()
+            self._matrix = None
+
+    def stats(self):
+        """Hit/miss counters and size of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            self._entries.clear()
+            self._touched = {}
+            self._matrix = None
+            self._conn.execute("DELETE FROM ocr_cache")
+            self._conn.commit()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_ocr_cache():
+    """Process-wide OCR cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OCRCache()
+        return _cache
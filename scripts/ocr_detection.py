@@ -1,33 +1,128 @@
-import easyocr
 import os
-from .database import index_metadata
-
-def ocr_detection(key_frames, video_name):
-    """Perform OCR on frames using easyOCR."""
-    # Initialize EasyOCR reader once
-    reader = easyocr.Reader(['en'])
-    
-    for frame_data in key_frames:
-        # Original frame number from extract_frames
-        original_frame_number = frame_data['frame_number']
-        
-        # Original timestamp from extract_frames
-        original_timestamp = frame_data['timestamp']
-        
-        # Perform OCR on the frame
-        results = reader.readtext(frame_data['frame'])
-        
-        # Combine all detected text
-        text = ' '.join([result[1] for result in results])
-        
-        try:
-            index_metadata(
-                video_name=video_name,
-                frame_number=str(original_frame_number),  # Original frame number
-                timestamp=original_timestamp,  # Original timestamp
-                transcription=None,
-                ocr_text=text,
-                objects_detected=None
-            )
-        except Exception as e:
-            print(f"Error indexing metadata: {str(e)}")
\ No newline at end of file
+import time
+from . import metrics
+from .artifacts import artifact_path, index_records, ocr_record, record_video, write_records
+from .database import IndexWriter, SOURCE_OCR, STAGE_OCR
+from .model_registry import get_ocr_reader
+from .ocr_cache import frame_key, get_ocr_cache
+from .visual_search import frame_descriptor
+
+# Key frames sent through the text detector together
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "8"))
+# Text crops sent through the recognizer together
+RECOGNITION_BATCH_SIZE = 32
+
+def batched(iterable, size):
+    """Group an iterable into lists of at most size items"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def set_ocr_threads(threads):
+    """Limit the CPU threads torch uses for OCR inference in this process"""
+    import torch
+    torch.set_num_threads(threads)
+
+def read_text_batch(reader, frames, recognition_batch_size=RECOGNITION_BATCH_SIZE, workers=0):
+    """Run OCR on a list of frames, returning one readtext() result list per frame
+
+    Frames of the same size go through detection as one batch and share
+    recognizer batches; mixed sizes are split into same-size groups.
+    """
+    if len(frames) == 1:
+        return [reader.readtext(frames[0], batch_size=recognition_batch_size, workers=workers)]
+
+    groups = {}
+    for idx, frame in enumerate(frames):
+        groups.setdefault(frame.shape, []).append(idx)
+
+    results = [None] * len(frames)
+    for indices in groups.values():
+        group_results = reader.readtext_batched(
+            [frames[idx] for idx in indices],
+            batch_size=recognition_batch_size,
+            workers=workers
+        )
+        for idx, frame_results in zip(indices, group_results):
+            results[idx] = frame_results
+    return results
+
+def read_text_cached(reader, frames, cache, workers=0):
+    """Like read_text_batch, but serve frames seen before from the OCR cache"""
+    keys = [frame_key(frame) for frame in frames]
+    results = [cache.get(key) for key in keys]
+
+    missing = [idx for idx, cached in enumerate(results) if cached is None]
+    if missing:
+        fresh = read_text_batch(reader, [frames[idx] for idx in missing], workers=workers)
+        for idx, frame_results in zip(missing, fresh):
+            cache.put(keys[idx], frame_results)
+            results[idx] = frame_results
+    return results
+
+def ocr_detection(key_frames, video_name, batch_size=OCR_BATCH_SIZE, threads=None, workers=0, use_cache=True,
+                  describe_frames=True, video_hash=None):
+    """Perform OCR on frames using easyOCR.
+
+    Key frames are processed batch_size at a time; batch_size=1 runs the
+    per-frame readtext() path. threads caps torch's CPU threads and workers
+    sets the recognizer's data loader workers. With use_cache, frames that
+    look like an already OCR'd frame reuse its results (see ocr_cache).
+    With describe_frames, each key frame's visual descriptor is stored too,
+    for searching by image (see visual_search). The video's previous OCR
+    rows are replaced; with video_hash, the records are also saved as an
+    artifact (see artifacts) and the "ocr" stage is checkpointed for that
+    content.
+
+    Returns one record per key frame: frame number, time, text and the
+    bounding box, text and confidence of every detection.
+    """
+    # Shared EasyOCR reader, loaded once per process
+    reader = get_ocr_reader(['en'])
+    if threads:
+        set_ocr_threads(threads)
+    cache = get_ocr_cache() if use_cache else None
+
+    records = []
+    with IndexWriter() as writer:
+        writer.replace(video_name, (SOURCE_OCR,), frame_descriptors=describe_frames)
+        for batch in batched(key_frames, batch_size):
+            # Perform OCR on the whole batch
+            frames = [frame_data['frame'] for frame_data in batch]
+            start = time.perf_counter()
+            if cache is not None:
+                batch_results = read_text_cached(reader, frames, cache, workers=workers)
+            else:
+                batch_results = read_text_batch(reader, frames, workers=workers)
+            metrics.count("ocr_seconds", time.perf_counter() - start)
+            metrics.count("ocr_frames", len(frames))
+
+            batch_records = [
+                ocr_record(
+                    frame_data['frame_number'],  # Original frame number
+                    frame_data['seconds'],
+                    results,
+                    frame_descriptor(frame_data['frame']) if describe_frames else None
+                )
+                for frame_data, results in zip(batch, batch_results)
+            ]
+            index_records(writer, video_name, STAGE_OCR, batch_records)
+            records.extend(batch_records)
+        if video_hash:
+            # Saved before the checkpoint is committed, so every
+            # checkpointed stage has its artifact
+            write_records(artifact_path(video_hash, STAGE_OCR), records,
+                          {"stage": STAGE_OCR, "content_hash": video_hash})
+            record_video(video_name, video_hash)
+            writer.checkpoint(video_name, STAGE_OCR, video_hash)
+
+    if cache is not None:
+        cache.flush()
+        stats = cache.stats()
+        print(f"OCR cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+    return records
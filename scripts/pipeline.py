@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# CPU cores the stages of one video may use together
+CPU_BUDGET = int(os.getenv("PIPELINE_CPUS", str(os.cpu_count() or 1)))
+
+class Stage:
+    """One step of a processing DAG
+
+    func(*args, threads=n) runs in the stage's own process once every stage
+    named in deps has finished; n is the number of cores granted out of the
+    CPU budget (at most cpus). warm_up, if given, runs once when the
+    stage's process starts, e.g. to load a model.
+    """
+
+    def __init__(self, name, func, args=(), deps=(), cpus=1, warm_up=None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.deps = tuple(deps)
+        self.cpus = cpus
+        self.warm_up = warm_up
+
+# One long-lived single-process executor per stage name, so a stage's
+# models stay loaded from one video to the next
+_executors = {}
+_executors_lock = threading.Lock()
+
+def _executor(stage):
+    with _executors_lock:
+        executor = _executors.get(stage.name)
+        if executor is None:
+            executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=stage.warm_up
+            )
+            _executors[stage.name] = executor
+        return executor
+
+def _discard_executor(name):
+    """Forget the executor of a stage whose process died"""
+    with _executors_lock:
+        executor = _executors.pop(name, None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+def shutdown():
+    """Stop every stage process"""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown()
+
+def run_stages(stages, cpu_budget=CPU_BUDGET):
+    """Run a DAG of stages, independent ones in parallel, and return {name: result}
+
+    Ready stages start in the given order as long as the cores of running
+    stages stay within cpu_budget; a stage asking for more than is free
+    waits, unless nothing else runs, in which case it gets what there is.
+    If a stage fails, the running ones are allowed to finish, stages
+    depending on it are not started and the first error is raised.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in by_name]
+        if missing:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages {missing}")
+
+    results = {}
+    running = {}  # future -> (stage, cores)
+    pending = list(stages)
+    error = None
+
+    while pending or running:
+        if error is None:
+            free = cpu_budget - sum(cores for _, cores in running.values())
+            for stage in list(pending):
+                if any(dep not in results for dep in stage.deps):
+                    continue
+                cores = min(stage.cpus, free) if not running else stage.cpus
+                if cores > free or cores < 1:
+                    continue
+                future = _executor(stage).submit(stage.func, *stage.args, threads=cores)
+                running[future] = (stage, cores)
+                pending.remove(stage)
+                free -= cores
+            if not running:
+                raise RuntimeError(f"Stages cannot run: {[stage.name for stage in pending]}")
+        elif not running:
+            break
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            stage, _ = running.pop(future)
+            try:
+                results[stage.name] = future.result()
+            except BrokenProcessPool as e:
+                _discard_executor(stage.name)
+                error = error or RuntimeError(f"Stage {stage.name} crashed: {str(e)}")
+            except Exception as e:
+                error = error or e
+
+    if error is not None:
+        raise error
+    return results
@@ -0,0 +1,155 @@
+import cv2
+import numpy as np
+
+# Size of the grayscale thumbnail the cheap detectors work on
+THUMBNAIL_SIZE = (64, 36)
+
+def to_thumbnail(frame, size=THUMBNAIL_SIZE):
+    """Downsample a BGR frame to a small grayscale thumbnail"""
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+def phash(frame, hash_size=8):
+    """Compute a hash_size**2-bit perceptual hash (DCT based) of a BGR frame"""
+    size = hash_size * 4
+    gray = to_thumbnail(frame, (size, size)).astype(np.float32)
+    low_freq = cv2.dct(gray)[:hash_size, :hash_size]
+    bits = (low_freq > np.median(low_freq)).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def dhash(frame, size=THUMBNAIL_SIZE):
+    """Compute a difference hash of a BGR frame as packed bytes
+
+    One bit per horizontally adjacent thumbnail pixel pair. The default
+    64x36 grid is fine enough to tell apart slides that only differ in a
+    few lines of text.
+    """
+    width, height = size
+    gray = to_thumbnail(frame, (width + 1, height))
+    bits = gray[:, 1:] > gray[:, :-1]
+    return np.packbits(bits).tobytes()
+
+def color_histogram(frame, bins=(8, 4, 4)):
+    """Normalized HSV color histogram of a thumbnail, as a flat float32 array"""
+    small = cv2.resize(frame, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1, 2], None, list(bins), [0, 180, 0, 256, 0, 256]).ravel()
+    return hist / hist.sum()
+
+def hamming_distance(hash1, hash2):
+    """Number of differing bits between two integer hashes"""
+    return bin(hash1 ^ hash2).count('1')
+
+class SceneDetector:
+    """Base class for scene change detectors
+
+    A detector is fed every sampled frame in order and keeps the features of
+    the previous sample, so each frame is reduced exactly once. Subclasses
+    implement features() and distance(); a scene change is reported when the
+    distance to the previous sample exceeds threshold. The first frame is
+    always a scene change.
+    """
+    name = None
+    default_threshold = None
+
+    def __init__(self, threshold=None):
+        self.threshold = self.default_threshold if threshold is None else threshold
+        self.previous = None
+
+    def reset(self):
+        """Forget the previous frame"""
+        self.previous = None
+
+    def features(self, frame):
+        raise NotImplementedError
+
+    def distance(self, previous, current):
+        raise NotImplementedError
+
+    def is_scene_change(self, frame):
+        """Return True if frame starts a new scene"""
+        current = self.features(frame)
+        previous, self.previous = self.previous, current
+        if previous is None:
+            return True
+        return self.distance(previous, current) > self.threshold
+
+class MeanDiffDetector(SceneDetector):
+    """Mean absolute grayscale difference at 1/4 resolution (the original detector)"""
+    name = "mean"
+    default_threshold = 20.0
+
+    def features(self, frame):
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (width // 4, height // 4))
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def distance(self, previous, current):
+        return np.mean(cv2.absdiff(previous, current))
+
+class HistogramDetector(SceneDetector):
+    """Total variation distance between grayscale histograms of a thumbnail"""
+    name = "histogram"
+    default_threshold = 0.15
+
+    def __init__(self, threshold=None, bins=32):
+        super().__init__(threshold)
+        self.bins = bins
+
+    def features(self, frame):
+        thumbnail = to_thumbnail(frame)
+        levels = (thumbnail.ravel().astype(np.int32) * self.bins) >> 8
+        hist = np.bincount(levels, minlength=self.bins)
+        return hist / thumbnail.size
+
+    def distance(self, previous, current):
+        return 0.5 * np.abs(previous - current).sum()
+
+class PHashDetector(SceneDetector):
+    """Hamming distance between 64-bit perceptual hashes"""
+    name = "phash"
+    default_threshold = 10
+
+    def features(self, frame):
+        return phash(frame)
+
+    def distance(self, previous, current):
+        return hamming_distance(previous, current)
+
+class BlockDiffDetector(SceneDetector):
+    """Fraction of thumbnail blocks whose mean absolute difference is large
+
+    Text changing on an otherwise static slide barely moves the global mean,
+    but it shifts several blocks at once; motion confined to one or two
+    blocks (a cursor, a webcam overlay) stays below threshold.
+    """
+    name = "block"
+    default_threshold = 0.15
+
+    def __init__(self, threshold=None, grid=(4, 4), block_threshold=1.0):
+        super().__init__(threshold)
+        self.grid = grid
+        self.block_threshold = block_threshold
+
+    def features(self, frame):
+        return to_thumbnail(frame).astype(np.int16)
+
+    def distance(self, previous, current):
+        rows, cols = self.grid
+        diff = np.abs(previous - current)
+        height, width = diff.shape
+        diff = diff[:height - height % rows, :width - width % cols]
+        blocks = diff.reshape(rows, diff.shape[0] // rows, cols, diff.shape[1] // cols)
+        block_means = blocks.mean(axis=(1, 3))
+        return np.mean(block_means > self.block_threshold)
+
+DETECTORS = {
+    detector.name: detector
+    for detector in (MeanDiffDetector, HistogramDetector, PHashDetector, BlockDiffDetector)
+}
+
+def create_detector(name="mean", threshold=None):
+    """Create a scene detector by name"""
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown scene detector: {name}")
+    return DETECTORS[name](threshold)
@@ -0,0 +1,152 @@
+import re
+import threading
+from collections import OrderedDict
+from .database import DB_PATH, get_index_generation, search_metadata, search_page
+from .semantic_index import hybrid_search
+
+MAX_CACHED_SEARCHES = 512
+# Times cached_search_pages() starts over when the index changes under it
+STALE_PAGE_RETRIES = 3
+
+def normalize_query(search_query):
+    """Reduce a query to the words FTS5 matches on, so equivalent input shares an entry"""
+    return " ".join(re.findall(r"\w+", search_query.lower()))
+
+class SearchCache:
+    """Process-wide LRU cache of search results
+
+    Entries are tagged with the index generation they were computed at.
+    Writers bump the generation on every committed batch, so once it
+    changes all cached entries are dropped instead of being served stale.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_SEARCHES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def get(self, key, generation):
+        """Return the cached value for key at generation, or None"""
+        with self._lock:
+            if generation != self._generation:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._generation = generation
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, generation, value):
+        """Cache value for key, unless the index moved on meanwhile"""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Hit/miss counters and size of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "generation": self._generation,
+        }
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+
+_cache = SearchCache()
+
+def get_search_cache():
+    """The process-wide search cache"""
+    return _cache
+
+def group_by_video(results):
+    """Group search results by video name, keeping their order"""
+    video_results = {}
+    for result in results:
+        video_results.setdefault(result['video_name'], []).append(result)
+    return video_results
+
+def _cached(kind, compute, search_query, db_path, sources, limit):
+    key = (kind, db_path, normalize_query(search_query), tuple(sorted(sources or ())), limit)
+    generation = get_index_generation(db_path)
+    value = _cache.get(key, generation)
+    if value is None:
+        value = compute()
+        _cache.put(key, generation, value)
+    return value
+
+def cached_search(search_query, db_path=DB_PATH, sources=None, limit=None):
+    """search_metadata() served from the cache while the index is unchanged
+
+    The returned list is shared with the cache and must not be modified.
+    """
+    return _cached("results", lambda: search_metadata(search_query, db_path, sources, limit),
+                   search_query, db_path, sources, limit)
+
+def cached_search_by_video(search_query, db_path=DB_PATH, sources=None, limit=None):
+    """Cached search results grouped by video (see group_by_video)
+
+    The returned dict is shared with the cache and must not be modified.
+    """
+    return _cached("by_video", lambda: group_by_video(cached_search(search_query, db_path, sources, limit)),
+                   search_query, db_path, sources, limit)
+
+def cached_search_page(search_query, db_path=DB_PATH, sources=None, page_size=20, cursor=None, per_video_cap=None):
+    """search_page() served from the cache while the index is unchanged
+
+    A cached page is only reused for the generation it was read at, and
+    cursors only work within it (see search_page). The returned dict must
+    not be modified.
+    """
+    return _cached(("page", page_size, cursor, per_video_cap),
+                   lambda: search_page(search_query, db_path, sources, page_size, cursor, per_video_cap),
+                   search_query, db_path, sources, None)
+
+def cached_search_pages(search_query, pages, db_path=DB_PATH, sources=None, page_size=20, per_video_cap=None):
+    """The first pages pages of results, concatenated, and whether more exist
+
+    Each page is cached on its own, so showing one more page only queries
+    the new one. If the index changes while the pages are read, they are
+    read again from the first one.
+    """
+    for attempt in range(STALE_PAGE_RETRIES + 1):
+        results = []
+        cursor = None
+        try:
+            for _ in range(pages):
+                page = cached_search_page(search_query, db_path, sources, page_size, cursor, per_video_cap)
+                results.extend(page["results"])
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            return results, cursor is not None
+        except ValueError:
+            # Past the first page, our own cursors can only have gone stale
+            if cursor is None or attempt == STALE_PAGE_RETRIES:
+                raise
+
+def cached_hybrid_search(search_query, db_path=DB_PATH, sources=None, limit=20):
+    """hybrid_search() served from the cache while the index is unchanged
+
+    The returned list is shared with the cache and must not be modified.
+    """
+    return _cached("hybrid", lambda: hybrid_search(search_query, db_path, sources, limit),
+                   search_query, db_path, sources, limit)
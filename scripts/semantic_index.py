@@ -0,0 +1,401 @@
+import json
+import math
+import os
+import re
+import threading
+import zlib
+import numpy as np
+from .database import (DB_PATH, SEARCH_SOURCES, check_sources, get_index_state, load_segment_results,
+                       read_connection, search_segment_ids)
+from .model_registry import get_model
+
+# Embedder used when none is given (see EMBEDDERS)
+DEFAULT_EMBEDDER = os.getenv("SEMANTIC_EMBEDDER", "hashing")
+# Libraries with at least this many segments get a coarse quantizer, so a
+# search only scores the rows of the clusters closest to the query
+COARSE_MIN_ROWS = int(os.getenv("SEMANTIC_COARSE_MIN_ROWS", "50000"))
+# Clusters scored per search when the coarse quantizer is used
+COARSE_PROBES = 8
+# Rows embedded and written at a time while indexing
+EMBED_BATCH_SIZE = 2048
+# Rank offset of reciprocal rank fusion; 60 is the usual choice
+RRF_K = 60
+# Fewest keyword and semantic candidates a hybrid search fuses; larger
+# limits take twice the limit, so the fused list does not run dry early
+HYBRID_CANDIDATES = 100
+
+class HashingEmbedder:
+    """Offline embedder: signed feature hashing of words and character trigrams
+
+    Needs no model or network. Words sharing trigrams ("network",
+    "networks", "networking") get similar vectors, so it tolerates
+    inflections and OCR typos, but it does not know synonyms. fit() learns
+    IDF weights so frequent words count less. Vectors are L2-normalized.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.idf = None
+        self._word_features = {}
+
+    def _features(self, word):
+        """(bucket, signed weight) pairs of one lowercased word, memoized"""
+        features = self._word_features.get(word)
+        if features is None:
+            padded = f"<{word}>"
+            grams = [(word, 1.0)] + [(padded[i:i + 3], 0.5) for i in range(len(padded) - 2)]
+            features = []
+            for gram, weight in grams:
+                h = zlib.crc32(gram.encode())
+                features.append((h % self.dim, weight if h & 0x80000000 else -weight))
+            if len(self._word_features) < 200000:
+                self._word_features[word] = features
+        return features
+
+    def _counts(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            vector = matrix[row]
+            for word in re.findall(r"\w+", text.lower()):
+                for bucket, weight in self._features(word):
+                    vector[bucket] += weight
+        # Sublinear term frequency
+        return np.sign(matrix) * np.log1p(np.abs(matrix))
+
+    def fit(self, batches):
+        """Learn IDF weights from batches (lists) of texts"""
+        document_counts = np.zeros(self.dim, dtype=np.float64)
+        documents = 0
+        for texts in batches:
+            document_counts += (self._counts(texts) != 0).sum(axis=0)
+            documents += len(texts)
+        self.idf = (np.log((1 + documents) / (1 + document_counts)) + 1).astype(np.float32)
+        return self
+
+    def embed(self, texts):
+        """Embed a list of texts as an (n, dim) float32 array"""
+        matrix = self._counts(texts)
+        if self.idf is not None:
+            matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def save(self, index_dir):
+        if self.idf is not None:
+            np.save(os.path.join(index_dir, "idf.npy"), self.idf)
+
+    def load(self, index_dir):
+        path = os.path.join(index_dir, "idf.npy")
+        self.idf = np.load(path) if os.path.exists(path) else None
+
+class SentenceTransformerEmbedder:
+    """Embedder backed by a sentence-transformers model
+
+    Understands paraphrases ("neural network" ~ "deep learning model"), but
+    needs the sentence-transformers package and its model weights.
+    """
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name=os.getenv("SEMANTIC_MODEL", "all-MiniLM-L6-v2")):
+        self.model_name = model_name
+        self.model = get_model(("sentence-transformers", model_name), self._load)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.model_name)
+
+    def fit(self, batches):
+        return self
+
+    def embed(self, texts):
+        return self.model.encode(list(texts), batch_size=64, normalize_embeddings=True).astype(np.float32)
+
+    def save(self, index_dir):
+        pass
+
+    def load(self, index_dir):
+        pass
+
+# Embedders available by name
+EMBEDDERS = {
+    HashingEmbedder.name: HashingEmbedder,
+    SentenceTransformerEmbedder.name: SentenceTransformerEmbedder,
+}
+
+def create_embedder(name=None):
+    """Instantiate an embedder by name (see EMBEDDERS)"""
+    name = name or DEFAULT_EMBEDDER
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder {name!r}, expected one of {', '.join(EMBEDDERS)}")
+    return EMBEDDERS[name]()
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+class SemanticIndex:
+    """Embeddings of every segment, kept next to the metadata database
+
+    Vectors are stored row by row in a flat float32 file that is memory
+    mapped for searching, so the matrix is paged in by the OS instead of
+    loaded. New segments are embedded and appended when the index
+    generation moves on; a database reset (new epoch), a different
+    embedder or too many deleted segments trigger a full rebuild.
+    """
+
+    def __init__(self, db_path=DB_PATH, index_dir=None, embedder=None):
+        self.db_path = db_path
+        self.index_dir = index_dir or os.path.splitext(db_path)[0] + "_semantic"
+        self.embedder = embedder or create_embedder()
+        self.meta = None
+        self.vectors = None
+        self.ids = None
+        self.centroids = None
+        self.lists = None
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    def _load(self):
+        """Map the index files described by meta.json"""
+        meta_path = self._path("meta.json")
+        if not os.path.exists(meta_path):
+            self.meta = None
+            return
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+        count, dim = self.meta["count"], self.meta["dim"]
+        if count:
+            self.vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(count, dim))
+            self.ids = np.memmap(self._path("ids.i64"), dtype=np.int64, mode="r", shape=(count,))
+        else:
+            self.vectors = np.zeros((0, dim), dtype=np.float32)
+            self.ids = np.zeros(0, dtype=np.int64)
+        self.centroids = self.lists = None
+        if self.meta.get("clusters") and count:
+            self.centroids = np.load(self._path("centroids.npy"))
+            self.lists = np.memmap(self._path("lists.i32"), dtype=np.int32, mode="r", shape=(count,))
+        self.embedder.load(self.index_dir)
+
+    def _iter_rows(self, after_id=0):
+        """Yield batches of (id, text) rows of segments with id > after_id"""
+        with read_connection(self.db_path) as conn:
+            while True:
+                rows = conn.execute(
+                    "SELECT id, text FROM segments WHERE id > ? ORDER BY id LIMIT ?",
+                    (after_id, EMBED_BATCH_SIZE)
+                ).fetchall()
+                if not rows:
+                    return
+                yield rows
+                after_id = rows[-1][0]
+
+    def _append(self, state):
+        """Embed segments added since the last update and append them"""
+        count, dim = self.meta["count"], self.meta["dim"]
+        last_id = self.meta["last_id"]
+        with open(self._path("vectors.f32"), "ab") as vectors_file, \
+             open(self._path("ids.i64"), "ab") as ids_file, \
+             open(self._path("lists.i32"), "ab") as lists_file:
+            # Drop rows written after meta.json by an interrupted update
+            vectors_file.truncate(count * dim * 4)
+            ids_file.truncate(count * 8)
+            lists_file.truncate(count * 4 if self.meta.get("clusters") else 0)
+            for rows in self._iter_rows(last_id):
+                vectors = self.embedder.embed([text for _, text in rows])
+                vectors_file.write(vectors.tobytes())
+                ids_file.write(np.array([rowid for rowid, _ in rows], dtype=np.int64).tobytes())
+                if self.meta.get("clusters"):
+                    lists_file.write(self._assign(vectors).tobytes())
+                count += len(rows)
+                last_id = rows[-1][0]
+
+        self.meta.update(count=count, last_id=last_id,
+                         generation=state["generation"], epoch=state.get("epoch", 0))
+        _write_json(self._path("meta.json"), self.meta)
+
+    def rebuild(self):
+        """Embed every segment from scratch"""
+        with self._lock:
+            self._rebuild(get_index_state(self.db_path))
+            self._load()
+
+    def _rebuild(self, state):
+        os.makedirs(self.index_dir, exist_ok=True)
+        for name in ("meta.json", "vectors.f32", "ids.i64", "lists.i32", "centroids.npy"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+
+        self.embedder.fit([text for _, text in rows] for rows in self._iter_rows())
+        self.embedder.save(self.index_dir)
+        self.meta = {"embedder": self.embedder.name, "dim": self.embedder.dim,
+                     "count": 0, "last_id": 0, "clusters": 0}
+        self._append(state)
+        if self.meta["count"] >= COARSE_MIN_ROWS:
+            self._load()
+            self._train_quantizer()
+
+    def _assign(self, vectors):
+        """Nearest centroid of each vector"""
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _train_quantizer(self, iterations=10, sample_size=50000):
+        """Cluster the vectors with spherical k-means and record each row's cluster"""
+        count = self.meta["count"]
+        clusters = max(1, int(math.sqrt(count)))
+        rng = np.random.default_rng(0)
+        sample = np.asarray(self.vectors[np.sort(rng.choice(count, min(count, sample_size), replace=False))])
+        centroids = sample[rng.choice(len(sample), clusters, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Clusters that lost all their rows keep their old centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+        self.centroids = centroids.astype(np.float32)
+        np.save(self._path("centroids.npy"), self.centroids)
+        with open(self._path("lists.i32"), "wb") as f:
+            for start in range(0, count, EMBED_BATCH_SIZE * 8):
+                f.write(self._assign(np.asarray(self.vectors[start:start + EMBED_BATCH_SIZE * 8])).tobytes())
+        self.meta["clusters"] = clusters
+        _write_json(self._path("meta.json"), self.meta)
+
+    def refresh(self):
+        """Bring the index up to date with the database"""
+        with self._lock:
+            if self.meta is None:
+                self._load()
+            state = get_index_state(self.db_path)
+            if (self.meta is None
+                    or self.meta["embedder"] != self.embedder.name
+                    or self.meta["dim"] != self.embedder.dim
+                    or self.meta["epoch"] != state.get("epoch", 0)):
+                self._rebuild(state)
+            elif self.meta["generation"] != state["generation"]:
+                with read_connection(self.db_path) as conn:
+                    live = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+                # Vectors of deleted segments are only skipped at search time
+                if live < self.meta["count"] // 2:
+                    self._rebuild(state)
+                else:
+                    self._append(state)
+            else:
+                return
+            self._load()
+
+    def search(self, search_query, top_k=50, probes=COARSE_PROBES):
+        """Return (segment id, cosine similarity) pairs closest to the query"""
+        if self.meta is None or not self.meta["count"]:
+            return []
+        query = self.embedder.embed([search_query])[0]
+        if not query.any():
+            return []
+
+        if self.centroids is not None:
+            nearest = np.argsort(self.centroids @ query)[-probes:]
+            rows = np.flatnonzero(np.isin(self.lists, nearest))
+            scores = self.vectors[rows] @ query
+        else:
+            rows = None
+            scores = self.vectors @ query
+
+        top_k = min(top_k, len(scores))
+        if not top_k:
+            return []
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        positions = best if rows is None else rows[best]
+        return [(int(self.ids[position]), float(scores[idx])) for position, idx in zip(positions, best)]
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_semantic_index(db_path=DB_PATH):
+    """Process-wide, up to date semantic index of a database"""
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None:
+            index = _indexes[db_path] = SemanticIndex(db_path)
+    index.refresh()
+    return index
+
+def _filter_sources(hits, sources, db_path):
+    """Keep the (id, score) hits whose segment comes from one of sources"""
+    if not sources or not hits:
+        return hits
+    allowed = [SEARCH_SOURCES[source] for source in sources]
+    with read_connection(db_path) as conn:
+        keep = {row[0] for row in conn.execute(
+            f"SELECT id FROM segments WHERE id IN ({', '.join('?' * len(hits))})"
+            f" AND source IN ({', '.join('?' * len(allowed))})",
+            [rowid for rowid, _ in hits] + allowed
+        )}
+    return [hit for hit in hits if hit[0] in keep]
+
+def semantic_search(search_query, db_path=DB_PATH, sources=None, limit=20):
+    """Search by similarity of meaning instead of matching words
+
+    Results look like search_metadata() results; "rank" is the negated
+    cosine similarity, so lower is better as with BM25. An unknown source
+    raises ValueError.
+    """
+    check_sources(sources)
+    try:
+        index = get_semantic_index(db_path)
+        # Over-fetch so filtering by source still leaves about limit hits
+        hits = index.search(search_query, top_k=limit * (4 if sources else 1))
+        hits = _filter_sources(hits, sources, db_path)[:limit]
+        return load_segment_results([(rowid, -score) for rowid, score in hits], search_query, db_path)
+    except Exception as e:
+        print(f"Semantic search error: {str(e)}")
+        return []
+
+def reciprocal_rank_fusion(rankings, k=RRF_K, weights=None):
+    """Merge ranked lists of ids into one, best first
+
+    Each id scores sum(weight / (k + rank)) over the lists it appears in,
+    so only the order of each list matters, not its score scale.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, rowid in enumerate(ranking, start=1):
+            fused[rowid] = fused.get(rowid, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
+
+def hybrid_search(search_query, db_path=DB_PATH, sources=None, limit=20, candidates=None, semantic_weight=1.0):
+    """Search combining FTS5 keyword matches and semantic similarity
+
+    The best candidates (by default max(HYBRID_CANDIDATES, 2 * limit)) of
+    both are merged with reciprocal rank fusion, so exact matches still
+    come first while segments that only say something similar are found
+    too. "rank" is the negated fused score (lower is better). An unknown
+    source raises ValueError.
+    """
+    check_sources(sources)
+    candidates = candidates or max(HYBRID_CANDIDATES, 2 * limit)
+    try:
+        keyword_hits = search_segment_ids(search_query, db_path, sources, limit=candidates)
+        index = get_semantic_index(db_path)
+        semantic_hits = index.search(search_query, top_k=candidates * (4 if sources else 1))
+        semantic_hits = _filter_sources(semantic_hits, sources, db_path)[:candidates]
+
+        fused = reciprocal_rank_fusion(
+            [[rowid for rowid, _ in keyword_hits], [rowid for rowid, _ in semantic_hits]],
+            weights=[1.0, semantic_weight]
+        )
+        # A little extra, in case some vectors belong to deleted segments
+        hits = [(rowid, -score) for rowid, score in fused[:limit + 10]]
+        return load_segment_results(hits, search_query, db_path)[:limit]
+    except Exception as e:
+        print(f"Hybrid search error: {str(e)}")
+        return []
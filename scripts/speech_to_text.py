@@ -1,6 +1,19 @@
-import whisper
+import multiprocessing
+import multiprocessing.util
 import os
-from .database import index_metadata
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from . import metrics
+from .artifacts import artifact_path, index_records, record_video, transcript_record, write_records
+from .audio_extraction import SAMPLE_RATE, extract_audio, load_audio
+from .database import IndexWriter, SOURCE_TRANSCRIPT, STAGE_TRANSCRIBE
+from .model_registry import get_whisper_model
+from .vad import speech_chunks
+
+# Whisper model size used for transcription
+WHISPER_MODEL = "base"
 
 def format_timestamp(seconds):
     """Convert seconds to HH:MM:SS format"""
@@ -13,30 +26,151 @@ def format_timestamp(seconds):
         print(f"Error formatting timestamp: {str(e)}")
         return "00:00:00"
 
-def process_audio(video_path):
-    """Extract and transcribe audio from video"""
-    video_name = os.path.basename(video_path)
-    
-    try:
-        # Load Whisper model
-        model = whisper.load_model("base")
-        
-        # Transcribe audio
-        result = model.transcribe(video_path)
-        
-        # Process segments
-        for segment in result["segments"]:
-            # Format timestamp to HH:MM:SS
-            timestamp = format_timestamp(segment["start"])
-            
-            index_metadata(
-                video_name=video_name,
-                frame_number=None,
-                timestamp=timestamp,  # Now in HH:MM:SS format
-                transcription=segment["text"],
-                ocr_text=None,
-                objects_detected=None
+def transcribe_chunk(audio_path, start_s, end_s):
+    """Transcribe one chunk of a cached audio file
+
+    Returns Whisper's segments with timestamps relative to the whole
+    recording, clipped to the chunk, and the CPU time and peak memory of
+    this process (see metrics.process_usage()), so a chunk worker's usage
+    counts towards the transcribe stage.
+    """
+    start_cpu = metrics.process_usage()["cpu_s"]
+    audio = load_audio(audio_path)
+    samples = np.array(audio[int(start_s * SAMPLE_RATE):int(end_s * SAMPLE_RATE)])
+    result = get_whisper_model(WHISPER_MODEL).transcribe(samples, condition_on_previous_text=False)
+    segments = []
+    for segment in result["segments"]:
+        text = segment["text"].strip()
+        if text:
+            segments.append({
+                "start": min(start_s + segment["start"], end_s),
+                "end": min(start_s + segment["end"], end_s),
+                "text": text,
+                "avg_logprob": segment.get("avg_logprob"),
+                "no_speech_prob": segment.get("no_speech_prob"),
+            })
+    usage = metrics.process_usage()
+    usage["cpu_s"] -= start_cpu
+    return segments, usage
+
+def _init_chunk_worker():
+    """Chunk workers use one core each and keep the model loaded"""
+    import torch
+    torch.set_num_threads(1)
+    get_whisper_model(WHISPER_MODEL)
+
+# Pool of chunk workers, kept between videos so the models stay loaded
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def _chunk_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_chunk_worker
             )
-            
+            # Pipeline stage processes skip atexit handlers, so shut the
+            # pool down from a multiprocessing finalizer instead, ahead of
+            # the one closing its queues; otherwise their exit would wait
+            # forever on the idle chunk workers
+            multiprocessing.util.Finalize(_pool, _pool.shutdown, exitpriority=100)
+            _pool_workers = workers
+        return _pool
+
+def _discard_pool(pool):
+    """Forget a pool whose worker died, so the next call starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+def transcribe_audio(audio_path, workers=1, on_progress=None):
+    """Transcribe the speech of a cached audio file, chunk by chunk
+
+    Silence is skipped (see scripts/vad.py) and the speech chunks are
+    transcribed by a pool of single-threaded worker processes, which
+    scales better on CPU than more torch threads on one long file. With
+    workers=1 the chunks run in this process. Returns the segments ordered
+    by time; on_progress(fraction) is called as chunks finish.
+    """
+    audio = load_audio(audio_path)
+    chunks = speech_chunks(audio)
+    metrics.count("audio_seconds", len(audio) / SAMPLE_RATE)
+    metrics.count("speech_seconds", sum(end_s - start_s for start_s, end_s in chunks))
+    if not chunks:
+        return []
+
+    if workers > 1 and len(chunks) > 1:
+        pool = _chunk_pool(workers)
+        starts, ends = zip(*chunks)
+        results = pool.map(transcribe_chunk, [audio_path] * len(chunks), starts, ends)
+    else:
+        results = (transcribe_chunk(audio_path, start_s, end_s) for start_s, end_s in chunks)
+
+    segments = []
+    try:
+        for done, (chunk_segments, usage) in enumerate(results, 1):
+            segments.extend(chunk_segments)
+            if workers > 1 and len(chunks) > 1:
+                # The chunk workers outlive the stage, so their CPU time is
+                # not among this process's finished children
+                metrics.merge({}, usage)
+            if on_progress:
+                on_progress(done / len(chunks))
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    segments.sort(key=lambda segment: segment["start"])
+    return segments
+
+def transcribe_video(video_path, video_name=None, threads=None, video_hash=None, on_progress=None):
+    """Extract and transcribe audio from video, raising on errors
+
+    The audio track is decoded once into the audio cache (see
+    scripts/audio_extraction.py), then its speech is transcribed in
+    chunks by threads worker processes (one core each). The previous
+    transcript of video_name (by default the file name) is replaced; with
+    video_hash, the records are also saved as an artifact (see
+    scripts/artifacts.py) and the "transcribe" stage is checkpointed for
+    that content.
+
+    Returns one record per segment (start, end, text and Whisper's
+    avg_logprob and no_speech_prob).
+    """
+    video_name = video_name or os.path.basename(video_path)
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    audio_path = extract_audio(video_path, video_hash)
+    segments = transcribe_audio(audio_path, workers=threads or 1, on_progress=on_progress)
+
+    records = [transcript_record(segment) for segment in segments]
+
+    # Index all segments in one transaction
+    with IndexWriter() as writer:
+        writer.replace(video_name, (SOURCE_TRANSCRIPT,))
+        index_records(writer, video_name, STAGE_TRANSCRIBE, records)
+        if video_hash:
+            write_records(artifact_path(video_hash, STAGE_TRANSCRIBE), records,
+                          {"stage": STAGE_TRANSCRIBE, "content_hash": video_hash})
+            record_video(video_name, video_hash)
+            writer.checkpoint(video_name, STAGE_TRANSCRIBE, video_hash)
+    return records
+
+def process_audio(video_path, threads=None, video_hash=None, on_progress=None):
+    """Extract and transcribe audio from video (see transcribe_video)
+
+    Returns the transcript records, or None on error.
+    """
+    try:
+        return transcribe_video(video_path, threads=threads, video_hash=video_hash, on_progress=on_progress)
     except Exception as e:
         print(f"Error processing audio: {str(e)}")
@@ -0,0 +1,246 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+# Bytes read, hashed and uploaded at a time (a multiple of 256 KB, as GCS
+# resumable uploads require)
+CHUNK_SIZE = 8 * 1024 * 1024
+# Directory uploads are spooled to; workers, cv2 and Whisper read from it
+SPOOL_DIR = "temp"
+# Subdirectory of SPOOL_DIR holding the uploads by content hash
+SPOOL_CONTENT_DIR = ".content"
+# Storage backend used by get_storage(): "gcs" or "local"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "gcs")
+# Artifacts uploaded at the same time in the background
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+
+def content_hash(path):
+    """SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _link_or_copy(source, path):
+    """Point path at the file source (a hard link where possible), atomically"""
+    tmp_path = path + ".part"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, path)
+
+def spool_upload(fileobj, name, spool_dir=SPOOL_DIR):
+    """Stream a file-like object to the spool directory in chunks
+
+    The content is stored under its hash (spool_dir/.content/<sha256> plus
+    the file extension), a file that never changes once written, and
+    spool_dir/name is pointed at it for playback by name. Jobs process the
+    content path, so re-uploading a video under the same name while its
+    first upload is still queued does not change what that job reads.
+
+    Returns (content path, sha256 of the content). Files are written next
+    to their destination and renamed into place, so readers never see a
+    partial file; memory use is one chunk however large the upload.
+    """
+    content_dir = os.path.join(spool_dir, SPOOL_CONTENT_DIR)
+    os.makedirs(content_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=content_dir, suffix=".part", delete=False) as tmp:
+        try:
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    video_hash = digest.hexdigest()
+    name = os.path.basename(name)
+    content_path = os.path.join(content_dir, video_hash + os.path.splitext(name)[1].lower())
+    os.replace(tmp.name, content_path)
+    _link_or_copy(content_path, os.path.join(spool_dir, name))
+    return content_path, video_hash
+
+class LocalStorage:
+    """Storage backend keeping objects as files under a root directory"""
+
+    # Whether signed_url() returns URLs a browser can stream from
+    can_sign_urls = False
+
+    def __init__(self, root="data/storage"):
+        self.root = root
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def ensure_ready(self):
+        """Create the root directory if needed"""
+        os.makedirs(self.root, exist_ok=True)
+        return True
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def upload_stream(self, fileobj, key):
+        """Store the content of a file-like object under key, chunk by chunk"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".part", delete=False) as tmp:
+            shutil.copyfileobj(fileobj, tmp, CHUNK_SIZE)
+        os.replace(tmp.name, path)
+
+    def upload_file(self, local_path, key):
+        """Store a local file under key"""
+        with open(local_path, "rb") as f:
+            self.upload_stream(f, key)
+
+    def signed_url(self, key, expires_s=3600):
+        """Local files have no URL of their own; serve them with media_server"""
+        return None
+
+    def download_file(self, key, local_path):
+        """Copy the object stored under key to local_path"""
+        if os.path.dirname(local_path):
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = local_path + ".part"
+        shutil.copyfile(self._path(key), tmp_path)
+        os.replace(tmp_path, local_path)
+        return local_path
+
+class GCSStorage:
+    """Storage backend for a Google Cloud Storage bucket
+
+    Uploads and downloads stream in CHUNK_SIZE pieces (resumable uploads),
+    so objects never have to fit in memory.
+    """
+
+    can_sign_urls = True
+
+    def __init__(self, bucket_name=None, client=None):
+        from google.cloud import storage
+        self.client = client or storage.Client()
+        self.bucket_name = bucket_name or os.getenv("BUCKET_NAME", "smart-video-449213-temp")
+        self.bucket = self.client.bucket(self.bucket_name)
+
+    def _blob(self, key):
+        return self.bucket.blob(key, chunk_size=CHUNK_SIZE)
+
+    def ensure_ready(self):
+        """Create the bucket if it does not exist yet"""
+        if not self.bucket.exists():
+            self.bucket = self.client.create_bucket(self.bucket_name)
+        return True
+
+    def exists(self, key):
+        return self._blob(key).exists()
+
+    def upload_stream(self, fileobj, key):
+        """Store the content of a file-like object under key, chunk by chunk"""
+        self._blob(key).upload_from_file(fileobj)
+
+    def upload_file(self, local_path, key):
+        """Store a local file under key"""
+        self._blob(key).upload_from_filename(local_path)
+
+    def signed_url(self, key, expires_s=3600):
+        """Time-limited URL the browser can stream the object from
+
+        GCS serves byte ranges itself, so the player seeks without going
+        through the app.
+        """
+        return self._blob(key).generate_signed_url(version="v4", expiration=timedelta(seconds=expires_s), method="GET")
+
+    def download_file(self, key, local_path):
+        """Download the object stored under key to local_path"""
+        if os.path.dirname(local_path):
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = local_path + ".part"
+        self._blob(key).download_to_filename(tmp_path)
+        os.replace(tmp_path, local_path)
+        return local_path
+
+BACKENDS = {
+    "local": LocalStorage,
+    "gcs": GCSStorage,
+}
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Process-wide storage backend selected by STORAGE_BACKEND"""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+            _storage = BACKENDS[STORAGE_BACKEND]()
+        return _storage
+
+class ArtifactUploader:
+    """Uploads local files to storage in background threads
+
+    submit() returns immediately with a future; uploads run UPLOAD_WORKERS
+    at a time, so processing does not wait for the network.
+    """
+
+    def __init__(self, storage=None, workers=UPLOAD_WORKERS):
+        self.storage = storage
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def _upload(self, local_path, key):
+        try:
+            (self.storage or get_storage()).upload_file(local_path, key)
+        except Exception as e:
+            print(f"Error uploading {local_path} to {key}: {str(e)}")
+            raise
+
+    def submit(self, local_path, key):
+        """Upload local_path as key in the background"""
+        future = self._executor.submit(self._upload, local_path, key)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+
+    def pending(self):
+        """Number of uploads queued or running"""
+        with self._lock:
+            return len(self._pending)
+
+    def wait(self):
+        """Block until every submitted upload has finished"""
+        with self._lock:
+            futures = list(self._pending)
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+_uploader = None
+
+def get_uploader():
+    """Process-wide background artifact uploader"""
+    global _uploader
+    with _storage_lock:
+        if _uploader is None:
+            _uploader = ArtifactUploader()
+        return _uploader
@@ -0,0 +1,129 @@
+import random
+import shutil
+import subprocess
+import wave
+import cv2
+import numpy as np
+
+# Words slides and index rows are made of; a few are much more frequent
+# than the rest, like in real lecture text
+VOCABULARY = (
+    "neural network training loss gradient descent model data learning layer "
+    "attention transformer token vector matrix optimizer batch epoch weight bias "
+    "activation convolution pooling dropout embedding encoder decoder sequence "
+    "regression classification accuracy precision recall feature label sample "
+    "kernel tensor inference latency throughput memory cache index query search"
+).split()
+
+def sample_words(rng, count):
+    """count words of VOCABULARY, Zipf distributed"""
+    ranks = np.arange(1, len(VOCABULARY) + 1)
+    weights = 1.0 / ranks
+    return [VOCABULARY[idx] for idx in rng.choice(len(VOCABULARY), size=count, p=weights / weights.sum())]
+
+def make_slide_video(path, slides=10, seconds_per_slide=5.0, fps=30, size=(1280, 720), seed=0):
+    """Write a deterministic video of text slides with hard cuts between them
+
+    Every slide has its own background color and a title with the slide
+    number above a few lines of words, rendered with cv2.putText. Returns
+    the ground truth: {"frames", "fps", "cuts" (first frame of every slide),
+    "texts" (the words of every slide)}.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open video writer for {path}")
+
+    frames_per_slide = int(round(seconds_per_slide * fps))
+    cuts, texts = [], []
+    try:
+        for slide in range(slides):
+            background = tuple(int(value) for value in rng.integers(20, 100, size=3))
+            frame = np.full((height, width, 3), background, dtype=np.uint8)
+            lines = [f"Slide {slide + 1}"] + [' '.join(sample_words(rng, 4)) for _ in range(3)]
+            for line_number, line in enumerate(lines):
+                scale = 2.0 if line_number == 0 else 1.2
+                y = int(height * (0.2 + 0.18 * line_number))
+                cv2.putText(frame, line, (int(width * 0.08), y), cv2.FONT_HERSHEY_SIMPLEX,
+                            scale * width / 1280, (255, 255, 255), max(1, width // 400), cv2.LINE_AA)
+            cuts.append(slide * frames_per_slide)
+            texts.append(' '.join(lines))
+            for _ in range(frames_per_slide):
+                writer.write(frame)
+    finally:
+        writer.release()
+    return {"frames": slides * frames_per_slide, "fps": fps, "cuts": cuts, "texts": texts}
+
+def make_speech_audio(duration_s=60.0, sample_rate=16000, seed=0, speech_ratio=0.6):
+    """Deterministic float32 audio alternating "speech" and silence
+
+    Speech is stood in for by amplitude-modulated tone bursts over a low
+    noise floor, which is what the energy VAD keys on. speech_ratio (0 to
+    1) sets the length of the silences; they are at least 0.5 s, so very
+    high ratios are only approached. Returns (samples, speech regions as
+    (start_s, end_s) pairs).
+    """
+    if not 0 < speech_ratio <= 1:
+        raise ValueError(f"speech_ratio must be in (0, 1], not {speech_ratio}")
+    # Longest silence, so silences average roughly what speech_ratio asks for
+    max_silence_s = max(0.5, 8.0 * (1 - speech_ratio) / speech_ratio)
+    rng = np.random.default_rng(seed)
+    samples = (rng.standard_normal(int(duration_s * sample_rate)) * 0.002).astype(np.float32)
+    regions = []
+    t = 0.5
+    while t < duration_s - 1:
+        length = min(float(rng.uniform(1.0, 8.0)), duration_s - t - 0.5)
+        start = int(t * sample_rate)
+        n = int(length * sample_rate)
+        time_s = np.arange(n) / sample_rate
+        tone = np.sin(2 * np.pi * float(rng.uniform(120, 300)) * time_s)
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * time_s)
+        samples[start:start + n] += (0.3 * tone * envelope).astype(np.float32)
+        regions.append((round(t, 3), round(t + length, 3)))
+        t += length + float(rng.uniform(0.5, max_silence_s))
+    return samples, regions
+
+def write_wav(path, samples, sample_rate=16000):
+    """Write float samples in [-1, 1] as a 16-bit mono WAV file"""
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+def mux_audio(video_path, wav_path, output_path):
+    """Combine a silent video and a WAV file with ffmpeg, if it is installed
+
+    Returns output_path, or None when ffmpeg is not available.
+    """
+    if shutil.which("ffmpeg") is None:
+        return None
+    subprocess.run(
+        ["ffmpeg", "-nostdin", "-v", "error", "-y", "-i", video_path, "-i", wav_path,
+         "-c:v", "copy", "-c:a", "aac", "-shortest", output_path],
+        check=True
+    )
+    return output_path
+
+def synthetic_rows(count, videos=100, seed=0):
+    """Index rows like those of real videos: (video, source, start_s, text, frame_number)
+
+    Half OCR'd key frames, half transcript segments, spread over videos.
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    block = 10000
+    for first in range(0, count, block):
+        # Words are drawn a block at a time, so millions of rows stay cheap
+        words = sample_words(np_rng, min(block, count - first) * 8)
+        for i in range(first, min(first + block, count)):
+            video = f"synthetic_{i % videos:04d}.mp4"
+            position = i // videos
+            offset = (i - first) * 8
+            text = ' '.join(words[offset:offset + rng.randint(4, 8)])
+            if i % 2:
+                yield video, "ocr", position * 5.0, f"slide {position} {text}", position * 150
+            else:
+                yield video, "transcript", position * 5.0, text, None
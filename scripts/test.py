@@ -1,7 +1,11 @@
 import streamlit as st
-import sqlite3
-import os
+import sys
 from datetime import timedelta
+from pathlib import Path
+
+# `streamlit run scripts/test.py` puts scripts/ on the path, not the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from scripts.database import read_connection
 
 def format_timestamp(seconds):
     """Convert seconds to HH:MM:SS format"""
@@ -10,11 +14,9 @@ def format_timestamp(seconds):
 def get_video_names():
     """Get list of all unique video names from database"""
     try:
-        conn = sqlite3.connect('data/video_metadata.db')
-        c = conn.cursor()
-        c.execute("SELECT DISTINCT video_name FROM video_metadata")
-        videos = [row[0] for row in c.fetchall()]
-        conn.close()
+        with read_connection() as conn:
+            c = conn.execute("SELECT name FROM videos ORDER BY name")
+            videos = [row[0] for row in c.fetchall()]
         return videos
     except Exception as e:
         print(f"Error getting video names: {str(e)}")
@@ -23,17 +25,14 @@ def get_video_names():
 def get_timestamps(video_name):
     """Get all timestamps for a specific video"""
     try:
-        conn = sqlite3.connect('data/video_metadata.db')
-        c = conn.cursor()
-        c.execute("""
-            SELECT DISTINCT timestamp 
-            FROM video_metadata 
-            WHERE video_name = ? 
-            AND timestamp != ''
-            ORDER BY CAST(timestamp AS FLOAT)
-        """, (video_name,))
-        timestamps = [float(row[0]) for row in c.fetchall() if row[0]]
-        conn.close()
+        with read_connection() as conn:
+            c = conn.execute("""
+                SELECT DISTINCT s.start_s 
+                FROM segments s JOIN videos v ON v.id = s.video_id 
+                WHERE v.name = ? 
+                ORDER BY s.start_s
+            """, (video_name,))
+            timestamps = [row[0] for row in c.fetchall()]
         return timestamps
     except Exception as e:
         print(f"Error getting timestamps: {str(e)}")
@@ -42,19 +41,20 @@ def get_timestamps(video_name):
 def get_results_at_timestamp(video_name, timestamp, tolerance=1.0):
     """Get OCR and transcription results near the timestamp"""
     try:
-        conn = sqlite3.connect('data/video_metadata.db')
-        c = conn.cursor()
-        
-        # Get results within tolerance seconds of the timestamp
-        c.execute("""
-            SELECT timestamp, transcription, ocr_text
-            FROM video_metadata
-            WHERE video_name = ?
-            AND CAST(timestamp AS FLOAT) BETWEEN ? - ? AND ? + ?
-        """, (video_name, timestamp, tolerance, timestamp, tolerance))
-        
-        results = c.fetchall()
-        conn.close()
+        with read_connection() as conn:
+            # Get results within tolerance seconds of the timestamp
+            # (served by the (video_id, start_s) index)
+            c = conn.execute("""
+                SELECT s.start_s,
+                       CASE WHEN s.source = 'transcript' THEN s.text END,
+                       CASE WHEN s.source = 'ocr' THEN s.text END
+                FROM segments s JOIN videos v ON v.id = s.video_id
+                WHERE v.name = ?
+                AND s.start_s BETWEEN ? AND ?
+                ORDER BY s.start_s
+            """, (video_name, timestamp - tolerance, timestamp + tolerance))
+            
+            results = c.fetchall()
         return results
     except Exception as e:
         print(f"Error getting results: {str(e)}")
@@ -127,19 +127,16 @@ def main():
         st.sidebar.write(f"Total timestamps: {len(timestamps)}")
         
         # Count entries with transcription and OCR
-        conn = sqlite3.connect('data/video_metadata.db')
-        c = conn.cursor()
-        
-        c.execute("""
-            SELECT 
-                COUNT(CASE WHEN transcription != '' THEN 1 END) as transcription_count,
-                COUNT(CASE WHEN ocr_text != '' THEN 1 END) as ocr_count
-            FROM video_metadata
-            WHERE video_name = ?
-        """, (selected_video,))
-        
-        trans_count, ocr_count = c.fetchone()
-        conn.close()
+        with read_connection() as conn:
+            c = conn.execute("""
+                SELECT 
+                    COUNT(CASE WHEN s.source = 'transcript' AND s.text != '' THEN 1 END) as transcription_count,
+                    COUNT(CASE WHEN s.source = 'ocr' AND s.text != '' THEN 1 END) as ocr_count
+                FROM segments s JOIN videos v ON v.id = s.video_id
+                WHERE v.name = ?
+            """, (selected_video,))
+            
+            trans_count, ocr_count = c.fetchone()
         
         st.sidebar.write(f"Segments with transcription: {trans_count}")
         st.sidebar.write(f"Frames with OCR text: {ocr_count}")
@@ -0,0 +1,121 @@
+import os
+import numpy as np
+from .audio_extraction import SAMPLE_RATE
+
+# Length of the frames whose energy is compared, in seconds
+VAD_FRAME_S = 0.03
+# Frames this many dB above the noise floor count as speech
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "12"))
+# Frames quieter than this (dBFS) are always silence
+VAD_MIN_DB = float(os.getenv("VAD_MIN_DB", "-50"))
+# Pauses shorter than this stay inside a speech region
+VAD_MIN_SILENCE_S = 0.5
+# Speech regions shorter than this are dropped as clicks and noise
+VAD_MIN_SPEECH_S = 0.25
+# Audio kept around each speech region, so words are not clipped
+VAD_PADDING_S = 0.2
+# Longest chunk handed to Whisper at once (its window is 30 s)
+MAX_CHUNK_S = float(os.getenv("MAX_CHUNK_S", "30"))
+# Speech regions closer than this are transcribed together, for context
+MAX_CHUNK_GAP_S = 2.0
+# Frames whose energy is computed at a time, bounding memory on long recordings
+ENERGY_BLOCK_FRAMES = 10000
+
+def frame_energies(audio, sample_rate=SAMPLE_RATE, frame_s=VAD_FRAME_S):
+    """RMS energy of consecutive frames of audio, in dBFS"""
+    frame_length = max(int(sample_rate * frame_s), 1)
+    count = len(audio) // frame_length
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    energies = np.empty(count, dtype=np.float32)
+    for first in range(0, count, ENERGY_BLOCK_FRAMES):
+        last = min(first + ENERGY_BLOCK_FRAMES, count)
+        frames = np.asarray(audio[first * frame_length:last * frame_length], dtype=np.float32)
+        frames = frames.reshape(last - first, frame_length)
+        energies[first:last] = np.sqrt(np.mean(np.square(frames), axis=1))
+    return 20 * np.log10(np.maximum(energies, 1e-10))
+
+def _runs(mask):
+    """(start, end) frame index pairs of the runs of True in mask"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+def speech_regions(audio, sample_rate=SAMPLE_RATE, frame_s=VAD_FRAME_S, margin_db=VAD_MARGIN_DB,
+                   min_db=VAD_MIN_DB, min_silence_s=VAD_MIN_SILENCE_S, min_speech_s=VAD_MIN_SPEECH_S,
+                   padding_s=VAD_PADDING_S, energies=None):
+    """Find the parts of audio containing speech, as (start_s, end_s) pairs
+
+    An energy detector: a frame is speech when it is margin_db louder than
+    the noise floor of the recording (its 10th percentile frame) and louder
+    than min_db. Audio that never gets much quieter than that (music, a
+    constant noise bed, speech without pauses) has no floor to compare
+    with, so all of it above min_db counts as speech rather than none.
+    Short pauses are bridged, short blips dropped and every region padded
+    a little. energies, if given, are the frame_energies() of audio.
+    """
+    if energies is None:
+        energies = frame_energies(audio, sample_rate, frame_s)
+    if len(energies) == 0:
+        return []
+    floor, loud = np.percentile(energies, [10, 90])
+    if loud - floor < margin_db:
+        threshold = min_db
+    else:
+        threshold = max(float(floor) + margin_db, min_db)
+
+    regions = []
+    for start, end in _runs(energies > threshold):
+        start_s, end_s = start * frame_s, end * frame_s
+        if regions and start_s - regions[-1][1] < min_silence_s:
+            regions[-1][1] = end_s
+        else:
+            regions.append([start_s, end_s])
+
+    duration = len(audio) / sample_rate
+    padded = []
+    for start_s, end_s in regions:
+        if end_s - start_s < min_speech_s:
+            continue
+        start_s, end_s = max(start_s - padding_s, 0.0), min(end_s + padding_s, duration)
+        if padded and start_s <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end_s)
+        else:
+            padded.append((start_s, end_s))
+    return padded
+
+def _split_point(energies, start_s, end_s, frame_s):
+    """Quietest frame boundary in the second half of [start_s, end_s]
+
+    Of equally quiet frames the last one wins, so evenly loud audio is cut
+    into chunks as long as allowed.
+    """
+    first = int((start_s + (end_s - start_s) / 2) / frame_s)
+    last = max(int(end_s / frame_s), first + 1)
+    window = energies[first:last]
+    if len(window) == 0:
+        return end_s
+    return (first + len(window) - 1 - int(np.argmin(window[::-1]))) * frame_s
+
+def speech_chunks(audio, sample_rate=SAMPLE_RATE, max_chunk_s=MAX_CHUNK_S, max_gap_s=MAX_CHUNK_GAP_S,
+                  **vad_options):
+    """Split the speech of audio into chunks of at most max_chunk_s seconds
+
+    Returns (start_s, end_s) pairs covering every speech region and none
+    of the long silences. Regions less than max_gap_s apart are packed into
+    one chunk while it fits, so Whisper gets more context; regions
+    longer than a chunk are cut at their quietest moment.
+    """
+    frame_s = vad_options.get("frame_s", VAD_FRAME_S)
+    energies = frame_energies(audio, sample_rate, frame_s)
+
+    chunks = []
+    for start_s, end_s in speech_regions(audio, sample_rate, energies=energies, **vad_options):
+        if chunks and start_s - chunks[-1][1] <= max_gap_s and end_s - chunks[-1][0] <= max_chunk_s:
+            chunks[-1] = (chunks[-1][0], end_s)
+            continue
+        while end_s - start_s > max_chunk_s:
+            split_s = _split_point(energies, start_s, start_s + max_chunk_s, frame_s)
+            chunks.append((start_s, split_s))
+            start_s = split_s
+        chunks.append((start_s, end_s))
+    return chunks
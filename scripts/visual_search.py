@@ -0,0 +1,176 @@
+import html
+import threading
+import cv2
+import numpy as np
+from .database import DB_PATH, SOURCE_OCR, get_index_state, read_connection, segment_result
+from .scene_detectors import color_histogram, to_thumbnail
+
+# Grayscale thumbnail compared for the layout of a frame
+LAYOUT_SIZE = (16, 9)
+# Share of the similarity coming from the layout vs the color histogram
+LAYOUT_WEIGHT = 0.7
+# Frames further than this from the query image are not reported
+MAX_DISTANCE = 0.2
+
+def frame_descriptor(frame):
+    """Compact visual descriptor of a BGR frame: (histogram bytes, thumbnail bytes)
+
+    A float16 HSV color histogram and a 16x9 grayscale thumbnail of the
+    layout, 400 bytes per key frame in total.
+    """
+    return color_histogram(frame).astype(np.float16).tobytes(), to_thumbnail(frame, LAYOUT_SIZE).tobytes()
+
+def descriptor_vectors(histograms, thumbnails):
+    """Turn stored descriptors into unit vectors whose dot product is the similarity
+
+    histograms is an (n, bins) array, thumbnails an (n, pixels) array. The
+    similarity is LAYOUT_WEIGHT times the cosine of the mean-centered
+    thumbnails plus the rest times the Bhattacharyya coefficient of the
+    histograms, so one matrix-vector product scores every key frame.
+    """
+    layout = thumbnails.astype(np.float32)
+    layout -= layout.mean(axis=1, keepdims=True)
+    layout /= np.maximum(np.linalg.norm(layout, axis=1, keepdims=True), 1e-6)
+    colors = np.sqrt(np.maximum(histograms.astype(np.float32), 0))
+    colors /= np.maximum(np.linalg.norm(colors, axis=1, keepdims=True), 1e-6)
+    return np.hstack([layout * LAYOUT_WEIGHT ** 0.5, colors * (1 - LAYOUT_WEIGHT) ** 0.5])
+
+def _frame_vector(frame):
+    histogram, thumbnail = frame_descriptor(frame)
+    return descriptor_vectors(np.frombuffer(histogram, dtype=np.float16)[None],
+                              np.frombuffer(thumbnail, dtype=np.uint8)[None])[0]
+
+def decode_image(data):
+    """Decode an uploaded image file (bytes) into a BGR frame"""
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode image")
+    return image
+
+class VisualIndex:
+    """In-memory matrix of every key frame descriptor of a database
+
+    Descriptors added since the last search are appended when the index
+    generation changes; everything is reloaded when rows were deleted.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.generation = None
+        self.last_id = 0
+        self.rows = []  # (video name, frame number, start_s) per descriptor
+        self.vectors = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Load descriptors written since the last refresh"""
+        with self._lock:
+            generation = get_index_state(self.db_path)["generation"]
+            if generation == self.generation:
+                return
+            with read_connection(self.db_path) as conn:
+                count = conn.execute("SELECT COUNT(*) FROM frame_descriptors").fetchone()[0]
+                rows = self._fetch(conn, self.last_id)
+                if len(self.rows) + len(rows) != count:
+                    # Rows were deleted since the last refresh: reload everything
+                    self._reset()
+                    rows = self._fetch(conn, 0)
+            self._append(rows)
+            self.generation = generation
+
+    def _fetch(self, conn, after_id):
+        return conn.execute('''
+            SELECT d.id, v.name, d.frame_number, d.start_s, d.histogram, d.thumbnail
+            FROM frame_descriptors d
+            JOIN videos v ON v.id = d.video_id
+            WHERE d.id > ?
+            ORDER BY d.id
+        ''', (after_id,)).fetchall()
+
+    def _reset(self):
+        self.last_id = 0
+        self.rows = []
+        self.vectors = None
+
+    def _append(self, rows):
+        if not rows:
+            return
+        histograms = np.frombuffer(b''.join(row[4] for row in rows), dtype=np.float16).reshape(len(rows), -1)
+        thumbnails = np.frombuffer(b''.join(row[5] for row in rows), dtype=np.uint8).reshape(len(rows), -1)
+        vectors = descriptor_vectors(histograms, thumbnails)
+        self.vectors = vectors if self.vectors is None else np.vstack([self.vectors, vectors])
+        self.rows.extend(row[1:4] for row in rows)
+        self.last_id = rows[-1][0]
+
+    def distances(self, frame):
+        """Distance from frame to every indexed key frame, 0 for identical frames"""
+        return 1 - self.vectors @ _frame_vector(frame)
+
+    def search(self, frame, limit=10, per_video=1, max_distance=MAX_DISTANCE):
+        """Return (video name, frame number, start_s, distance) of the closest key frames
+
+        At most per_video frames are returned for each video, closest first.
+        """
+        if not self.rows:
+            return []
+        distances = self.distances(frame)
+        candidates = np.flatnonzero(distances <= max_distance)
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+
+        matches = []
+        per_video_counts = {}
+        for idx in candidates:
+            name, frame_number, start_s = self.rows[idx]
+            if per_video_counts.get(name, 0) >= per_video:
+                continue
+            per_video_counts[name] = per_video_counts.get(name, 0) + 1
+            matches.append((name, frame_number, start_s, float(distances[idx])))
+            if len(matches) == limit:
+                break
+        return matches
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_visual_index(db_path=DB_PATH):
+    """Process-wide, up to date visual index of a database"""
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None:
+            index = _indexes[db_path] = VisualIndex(db_path)
+    index.refresh()
+    return index
+
+def search_by_image(image, db_path=DB_PATH, limit=10, per_video=1, max_distance=MAX_DISTANCE):
+    """Find the videos showing an image (a BGR frame or encoded image bytes)
+
+    Results look like search_metadata() results with source "frame"; they
+    carry the OCR text of the matching key frame as "ocr_text" (empty if
+    none), and "distance" and "similarity" instead of a BM25 rank.
+    """
+    try:
+        frame = decode_image(image) if isinstance(image, (bytes, bytearray)) else image
+        matches = get_visual_index(db_path).search(frame, limit, per_video, max_distance)
+
+        texts = {}
+        if matches:
+            with read_connection(db_path) as conn:
+                for name, frame_number, _, _ in matches:
+                    row = conn.execute('''
+                        SELECT s.text FROM segments s JOIN videos v ON v.id = s.video_id
+                        WHERE v.name = ? AND s.frame_number = ? AND s.source = ?
+                    ''', (name, frame_number, SOURCE_OCR)).fetchone()
+                    texts[name, frame_number] = row[0] if row else ''
+
+        results = []
+        for name, frame_number, start_s, distance in matches:
+            text = texts[name, frame_number]
+            results.append(segment_result(
+                name, frame_number, start_s, None, "frame", text,
+                ocr_text=text, rank=distance, distance=distance, similarity=1 - distance,
+                snippet=f"{1 - distance:.0%} visual match", highlighted=html.escape(text)
+            ))
+        return results
+    except Exception as e:
+        print(f"Visual search error: {str(e)}")
+        return []
@@ -1,52 +1,78 @@
 import streamlit as st
-from scripts.extract_frames import extract_frames
-from scripts.ocr_detection import ocr_detection
-from scripts.speech_to_text import process_audio
-from scripts.database import reset_database, search_metadata
+from scripts.database import reset_database
+from scripts.job_queue import DONE, FAILED, enqueue, ensure_workers, has_active_jobs, list_jobs
+from scripts.media_server import MEDIA_BASE_URL, media_url, start_media_server
+from scripts.metrics import rates
+from scripts.search_cache import cached_hybrid_search, cached_search_pages, group_by_video
+from scripts.storage import SPOOL_DIR, get_storage, get_uploader, spool_upload
+from scripts.visual_search import search_by_image
+import html
 import os
-import base64
-from google.cloud import storage
+import time
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Seconds between refreshes of the job list while videos are processing
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '3'))
+# Search results fetched per "Load more results" click
+RESULTS_PAGE_SIZE = int(os.getenv('RESULTS_PAGE_SIZE', '50'))
+# Most results listed for a single video (0 for no limit)
+RESULTS_PER_VIDEO = int(os.getenv('RESULTS_PER_VIDEO', '0'))
+
+# Where the player streams videos from: "signed" (signed storage URLs),
+# "local" (scripts/media_server.py serving the spool directory, reached by
+# the browser at MEDIA_BASE_URL) or unset to use signed URLs whenever the
+# storage backend can make them
+VIDEO_SOURCE = os.getenv('VIDEO_SOURCE', '')
+
+# Icon shown next to a search result, by segment source
+SOURCE_ICONS = {"ocr": "🔍", "transcript": "👄", "frame": "🖼️"}
+
 # Initialize session state
 if 'initialized' not in st.session_state:
     st.session_state.initialized = False
 
-# Initialize Google Cloud Storage client
+# Initialize the storage backend (Google Cloud Storage unless STORAGE_BACKEND=local)
 try:
-    storage_client = storage.Client()
-    bucket_name = os.getenv('BUCKET_NAME', 'smart-video-449213-temp')
-    bucket = storage_client.bucket(bucket_name)
+    storage = get_storage()
     st.session_state.initialized = True
 except Exception as e:
-    logger.error(f"Error initializing Google Cloud Storage: {str(e)}")
+    logger.error(f"Error initializing storage: {str(e)}")
     st.error("Error initializing storage. Please try again later.")
 
-def ensure_bucket_exists():
-    """Ensure the bucket exists, create if it doesn't"""
+# Videos are processed by background worker processes (see
+# scripts/job_queue.py); they load the OCR and Whisper models themselves
+# and keep running across reruns and page reloads
+try:
+    ensure_workers()
+except Exception as e:
+    logger.error(f"Error starting job workers: {str(e)}")
+
+# The media server also serves the processing metrics at /metrics, so it
+# runs from the start rather than when the first video is played
+try:
+    start_media_server()
+except Exception as e:
+    logger.error(f"Error starting media server: {str(e)}")
+
+def ensure_storage_ready():
+    """Ensure the storage bucket (or directory) exists, create if it doesn't"""
     try:
-        if not bucket.exists():
-            bucket = storage_client.create_bucket(bucket_name)
-        return bucket
+        return storage.ensure_ready()
     except Exception as e:
-        logger.error(f"Error ensuring bucket exists: {str(e)}")
+        logger.error(f"Error ensuring storage exists: {str(e)}")
         st.error("Error accessing storage. Please try again later.")
         return None
 
-def upload_to_gcs(file_bytes, destination_blob_name):
-    """Upload a file to Google Cloud Storage"""
-    blob = bucket.blob(destination_blob_name)
-    blob.upload_from_string(file_bytes)
-    return blob
-
-def download_from_gcs(source_blob_name):
-    """Download a file from Google Cloud Storage"""
-    blob = bucket.blob(source_blob_name)
-    return blob.download_as_bytes()
+def local_video_path(video_name):
+    """Path of a video in the spool directory, fetched from storage if missing"""
+    video_path = os.path.join(SPOOL_DIR, video_name)
+    if not os.path.exists(video_path):
+        storage.download_file(f"videos/{video_name}", video_path)
+    return video_path
 
 def display_uploaded_videos(uploaded_files, cols=3):
     """Display uploaded videos in a grid"""
@@ -58,11 +84,96 @@ def display_uploaded_videos(uploaded_files, cols=3):
             st.video(uploaded_file)
             st.caption(uploaded_file.name)
 
-def get_video_data_url(blob_name):
-    """Get video data URL from Google Cloud Storage"""
-    video_bytes = download_from_gcs(blob_name)
-    base64_video = base64.b64encode(video_bytes).decode()
-    return f"data:video/mp4;base64,{base64_video}"
+def get_video_url(video_name):
+    """URL the player streams a video from, with byte range support
+
+    The browser only fetches the parts of the video it plays, instead of
+    the whole file being inlined into the page. Raises when no URL the
+    browser can reach is available.
+    """
+    source = VIDEO_SOURCE or ('signed' if storage.can_sign_urls else 'local')
+    if source == 'signed':
+        url = storage.signed_url(f"videos/{video_name}")
+        if not url:
+            raise RuntimeError("The storage backend cannot sign URLs; set VIDEO_SOURCE=local and MEDIA_BASE_URL")
+        return url
+    if not MEDIA_BASE_URL:
+        # The media server's own address only works for a browser on
+        # this machine, and not at all from an HTTPS page
+        raise RuntimeError(
+            "Set MEDIA_BASE_URL to the address browsers reach the media server at "
+            "(e.g. http://localhost:8502 when running locally)"
+        )
+    local_video_path(video_name)
+    start_media_server()
+    return media_url(video_name)
+
+def display_jobs(limit=10):
+    """Show the most recent processing jobs with per-stage progress"""
+    jobs = list_jobs(limit)
+    if not jobs:
+        return
+    
+    st.header("Processing Jobs")
+    st.checkbox("Refresh while processing", value=True, key='auto_refresh_jobs')
+    for job in jobs:
+        if job['status'] == DONE:
+            st.success(f"✅ {job['video_name']}")
+        elif job['status'] == FAILED:
+            st.error(f"❌ {job['video_name']}: {job['error']}")
+        else:
+            st.info(f"⏳ {job['video_name']} ({job['status']})")
+            for stage, info in job['stages'].items():
+                st.progress(info['progress'], text=f"{stage}: {info['status']}")
+
+def display_stats(limit=20):
+    """Sidebar panel showing where the processing time of a video went"""
+    jobs = [
+        job for job in list_jobs(limit)
+        if any(info['wall_s'] is not None for info in job['stages'].values())
+    ]
+    if not jobs:
+        return
+    
+    with st.sidebar:
+        st.header("Processing Stats")
+        jobs_by_id = {job['id']: job for job in jobs}
+        job_id = st.selectbox("Video", list(jobs_by_id),
+                              format_func=lambda job_id: f"{jobs_by_id[job_id]['video_name']} (job {job_id})")
+        job = jobs_by_id[job_id]
+        
+        rows = []
+        counters = {}
+        figures = {}
+        for stage, info in job['stages'].items():
+            if info['wall_s'] is None:
+                rows.append({"stage": stage, "wall (s)": None, "CPU (s)": None, "peak RSS (MB)": None,
+                             "note": info['detail'] or info['status']})
+                continue
+            rows.append({
+                "stage": stage,
+                "wall (s)": round(info['wall_s'], 1),
+                "CPU (s)": round(info['cpu_s'], 1),
+                "peak RSS (MB)": round(info['peak_rss_bytes'] / 2**20) if info['peak_rss_bytes'] else None,
+                "note": "",
+            })
+            for name, value in info['metrics'].items():
+                counters[name] = counters.get(name, 0) + value
+            figures.update(rates(info['wall_s'], info['metrics']))
+        st.dataframe(rows, hide_index=True)
+        
+        if 'frames_decoded' in counters:
+            st.metric("Frames decoded / sampled", f"{counters['frames_decoded']:,} / {counters.get('frames_sampled', 0):,}")
+        if 'key_frames' in counters:
+            st.metric("Key frames", f"{counters['key_frames']:,}")
+        if 'ocr_frames_per_second' in figures:
+            st.metric("OCR frames/s", f"{figures['ocr_frames_per_second']:.2f}")
+        if 'asr_real_time_factor' in figures:
+            st.metric("ASR real-time factor", f"{figures['asr_real_time_factor']:.2f}",
+                      help="Transcription time per second of audio; below 1 is faster than real time")
+        if 'rows_indexed' in counters:
+            st.metric("Rows indexed", f"{counters['rows_indexed']:,}")
+        st.caption(f"Prometheus metrics: {media_url('metrics')}")
 
 def main():
     st.title("Video Processing and Search")
@@ -72,8 +183,8 @@ def main():
         return
 
     try:
-        # Ensure bucket exists
-        if not ensure_bucket_exists():
+        # Ensure the bucket (or storage directory) exists
+        if not ensure_storage_ready():
             return
         
         # File upload
@@ -89,92 +200,95 @@ def main():
                 st.text(f"📁 {file.name}")
             
             if st.button("Process New Videos"):
-                main_status = st.empty()
-                sub_status = st.empty()
-                progress_bar = st.progress(0)
-                
-                total_files = len(uploaded_files)
-                for idx, uploaded_file in enumerate(uploaded_files):
+                for uploaded_file in uploaded_files:
                     try:
-                        # Upload to GCS
-                        blob_name = f"videos/{uploaded_file.name}"
-                        upload_to_gcs(uploaded_file.getvalue(), blob_name)
-                        
-                        main_status.info(f"Processing file {idx + 1}/{total_files}: {uploaded_file.name}")
-                        
-                        # Extract frames
-                        sub_status.info(f"🎬 Extracting key frames...")
-                        video_bytes = download_from_gcs(blob_name)
-                        key_frames = extract_frames(video_bytes)
-                        sub_status.success(f"✓ Extracted {len(key_frames)} key frames")
-                        
-                        # Process frames and upload results
-                        sub_status.info(f"🔍 Processing OCR...")
-                        ocr_results = ocr_detection(key_frames, uploaded_file.name)
-                        upload_to_gcs(str(ocr_results).encode(), f"results/ocr/{uploaded_file.name}.json")
-                        sub_status.success("✓ OCR processing complete")
-                        
-                        # Process audio
-                        sub_status.info("🎤 Processing audio...")
-                        audio_results = process_audio(video_bytes)
-                        upload_to_gcs(str(audio_results).encode(), f"results/audio/{uploaded_file.name}.json")
-                        sub_status.success("✓ Audio processing complete")
-                        
-                        progress_bar.progress((idx + 1) / total_files)
-                        main_status.success(f"✅ Completed processing {uploaded_file.name}")
+                        # Stream the upload to a local spool file named by its
+                        # content hash, which the workers (cv2 and Whisper)
+                        # read directly, and copy that file to storage in
+                        # the background
+                        uploaded_file.seek(0)
+                        video_path, video_hash = spool_upload(uploaded_file, uploaded_file.name)
+                        get_uploader().submit(video_path, f"videos/{uploaded_file.name}")
                         
+                        # Stages already done for this content are skipped
+                        job_id = enqueue(video_path, uploaded_file.name, video_hash=video_hash)
+                        st.info(f"📥 Queued {uploaded_file.name} (job {job_id})")
                     except Exception as e:
-                        main_status.error(f"❌ Error processing {uploaded_file.name}: {str(e)}")
-                        continue
-                
-                if progress_bar.progress == 1.0:
-                    st.success("🎉 All files processed successfully!")
+                        st.error(f"❌ Error queuing {uploaded_file.name}: {str(e)}")
+                ensure_workers()
+        
+        display_jobs()
+        display_stats()
 
         # Search interface
         st.header("Search Videos")
         search_query = st.text_input("Enter search term")
+        search_in = st.radio("Search in:", ["All", "OCR text", "Transcript"], horizontal=True)
+        sources = {"All": None, "OCR text": ["ocr"], "Transcript": ["transcript"]}[search_in]
+        similar = st.checkbox("Also find similar wording", help="Adds semantic matches to the exact word matches")
+        screenshot = st.file_uploader("Or find the video showing an image", type=['png', 'jpg', 'jpeg'])
+        
+        # Start again from the first page whenever the search changes
+        if st.session_state.get('result_search') != (search_query, search_in, similar):
+            st.session_state.result_search = (search_query, search_in, similar)
+            st.session_state.result_pages = 1
         
-        if search_query:
-            results = search_metadata(search_query, "data/video_metadata.db")
+        if screenshot is not None:
+            # Key frames that look like the image, best match per video first
+            results = search_by_image(screenshot.getvalue(), "data/video_metadata.db", limit=20, per_video=5)
+            video_results = group_by_video(results)
+            if not results:
+                st.info("No key frame looks like this image")
+        elif search_query:
+            # Only the best matches are fetched, a page at a time; pages are
+            # cached until the index changes, so reruns (e.g. picking another
+            # video) skip the search entirely
+            if similar:
+                limit = RESULTS_PAGE_SIZE * st.session_state.result_pages
+                results = cached_hybrid_search(search_query, "data/video_metadata.db", sources=sources, limit=limit)
+                has_more = len(results) == limit
+            else:
+                results, has_more = cached_search_pages(
+                    search_query,
+                    st.session_state.result_pages,
+                    "data/video_metadata.db",
+                    sources=sources,
+                    page_size=RESULTS_PAGE_SIZE,
+                    per_video_cap=RESULTS_PER_VIDEO or None
+                )
+            video_results = group_by_video(results)
             
-            if results:
-                # Group results by video
-                video_results = {}
-                for result in results:
-                    video_name = result['video_name']
-                    if video_name not in video_results:
-                        video_results[video_name] = []
-                    video_results[video_name].append(result)
-                
+            if has_more and st.button("Load more results"):
+                st.session_state.result_pages += 1
+                st.rerun()
+        
+        if screenshot is not None or search_query:
+            if video_results:
                 # Create a video selector
                 video_names = list(video_results.keys())
                 selected_video = st.selectbox("Select video to play:", video_names)
                 
-                # Get the video file path
-                video_path = f"temp/{selected_video}"
+                try:
+                    video_url = get_video_url(selected_video)
+                except Exception as e:
+                    logger.error(f"Error getting URL of {selected_video}: {str(e)}")
+                    st.error(f"Cannot play {selected_video}: {str(e)}")
+                    video_url = None
                 
-                if os.path.exists(video_path):
-                    # Prepare the video data URL
-                    video_data_url = get_video_data_url(video_path)
-                    
+                if video_url:
                     # Build the buttons HTML
                     button_html = ""
+                    # Snippets and highlights are HTML-escaped already
                     for result in video_results[selected_video]:
-                        if result['ocr_text']:
-                            source_icon = "🔍"
-                            text = result['ocr_text'][:50] + "..."
-                        elif result['transcription']:
-                            source_icon = "👄"
-                            text = result['transcription'][:50] + "..."
-                        else:
+                        source_icon = SOURCE_ICONS.get(result['source'])
+                        if not source_icon:
                             continue
-                        
-                        # Get hours, minutes, seconds as integers
-                        h, m, s = map(int, result['timestamp'].split(':'))
+                        text = result['snippet']
+                        timestamp = html.escape(result['timestamp'])
                         
                         # Build the button HTML
                         button_html += f"""
-                        <button onclick="seekToTime({h}, {m}, {s})" style="
+                        <button onclick="seekToTime({result['start_s']})" style="
                             background-color: #f0f2f6;
                             border: none;
                             padding: 10px;
@@ -184,7 +298,7 @@ def main():
                             width: 100%;
                             text-align: left;
                             ">
-                            {source_icon} {result['timestamp']}<br>
+                            {source_icon} {timestamp}<br>
                             <small>{text}</small>
                         </button>
                         """
@@ -192,31 +306,26 @@ def main():
                     # Build the expanders HTML
                     expanders_html = ""
                     for result in video_results[selected_video]:
-                        if result['ocr_text']:
-                            source_icon = "🔍"
-                            text = result['ocr_text']
-                        elif result['transcription']:
-                            source_icon = "👄"
-                            text = result['transcription']
-                        else:
+                        source_icon = SOURCE_ICONS.get(result['source'])
+                        if not source_icon:
                             continue
-                        
-                        h, m, s = map(int, result['timestamp'].split(':'))
+                        text = result['highlighted']
+                        timestamp = html.escape(result['timestamp'])
                         
                         # Build the expander content
                         expander_content = f"""
                         <div style="border: 1px solid #ddd; padding: 10px; margin-bottom: 10px;">
-                            <strong>{source_icon} at {result['timestamp']} - {text[:50]}...</strong>
+                            <strong>{source_icon} at {timestamp} - {result['snippet']}</strong>
                             <p>Full text: {text}</p>
-                            <p>Timestamp: {result['timestamp']}</p>
-                            <button onclick="seekToTime({h}, {m}, {s})" style="
+                            <p>Timestamp: {timestamp}</p>
+                            <button onclick="seekToTime({result['start_s']})" style="
                                 background-color: #f0f2f6;
                                 border: none;
                                 padding: 5px 10px;
                                 border-radius: 5px;
                                 cursor: pointer;
                                 ">
-                                ⏱️ Jump to {result['timestamp']}
+                                ⏱️ Jump to {timestamp}
                             </button>
                         </div>
                         """
@@ -228,7 +337,7 @@ def main():
                         <!-- Video Player -->
                         <div style="flex: 2; margin-right: 20px;">
                             <video id="myVideo" width="100%" controls>
-                                <source src="{video_data_url}" type="video/mp4">
+                                <source src="{html.escape(video_url)}" type="video/mp4">
                                 Your browser does not support the video element.
                             </video>
                         </div>
@@ -248,9 +357,8 @@ def main():
                     <script>
                         var video = document.getElementById('myVideo');
                     
-                        function seekToTime(hours, minutes, seconds) {{
-                            var totalSeconds = hours * 3600 + minutes * 60 + seconds;
-                            video.currentTime = totalSeconds;
+                        function seekToTime(seconds) {{
+                            video.currentTime = seconds;
                             video.play();
                         }}
                     </script>
@@ -258,12 +366,16 @@ def main():
                     
                     # Render the combined HTML content
                     st.components.v1.html(html_content, height=800)
-                else:
-                    st.error(f"Video file not found: {video_path}")
 
     except Exception as e:
         logger.error(f"Error in main function: {str(e)}")
         st.error(f"An error occurred: {str(e)}")
+    
+    # Poll the job queue while videos are processing; the jobs themselves
+    # run in the workers, so reloading the page does not interrupt them
+    if st.session_state.get('auto_refresh_jobs', True) and has_active_jobs():
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,46 @@
+import sqlite3
+
+from scripts import artifacts
+from scripts.database import SOURCE_OCR, SOURCE_TRANSCRIPT, STAGE_OCR, STAGE_TRANSCRIBE, IndexWriter, search_metadata
+
+
+def segment_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute('''
+            SELECT v.name, COUNT(s.id) FROM videos v LEFT JOIN segments s ON s.video_id = v.id
+            GROUP BY v.name
+        ''').fetchall())
+    finally:
+        conn.close()
+
+
+def write_artifacts(artifact_dir, video_name, video_hash):
+    ocr = [artifacts.ocr_record(30, 1.0, [([[0, 0], [9, 0], [9, 9], [0, 9]], "rebuilt slide", 0.9)])]
+    transcript = [artifacts.transcript_record({"start": 0.0, "end": 2.0, "text": "rebuilt speech"})]
+    artifacts.write_records(artifacts.artifact_path(video_hash, STAGE_OCR, artifact_dir), ocr)
+    artifacts.write_records(artifacts.artifact_path(video_hash, STAGE_TRANSCRIBE, artifact_dir), transcript)
+    artifacts.record_video(video_name, video_hash, artifact_dir)
+
+
+def test_rebuild_keeps_videos_without_artifacts(tmp_path):
+    db_path = str(tmp_path / "index.db")
+    artifact_dir = str(tmp_path / "artifacts")
+
+    with IndexWriter(db_path) as writer:
+        # A migrated legacy video: rows but no artifacts and no checkpoints
+        writer.add_segment("legacy.mp4", SOURCE_OCR, 5.0, "legacy slide")
+        writer.add_segment("legacy.mp4", SOURCE_TRANSCRIPT, 6.0, "legacy speech")
+        # A processed video whose rows are stale
+        writer.add_segment("processed.mp4", SOURCE_OCR, 1.0, "stale slide")
+    write_artifacts(artifact_dir, "processed.mp4", "a" * 64)
+
+    assert artifacts.rebuild_index(db_path, artifact_dir, str(tmp_path / "audio")) == (1, 2)
+    assert segment_counts(db_path) == {"legacy.mp4": 2, "processed.mp4": 2}
+    assert [r["video_name"] for r in search_metadata("legacy", db_path)] == ["legacy.mp4", "legacy.mp4"]
+    assert {r["video_name"] for r in search_metadata("rebuilt", db_path)} == {"processed.mp4"}
+    assert search_metadata("stale", db_path) == []
+
+    # Rebuilding again replaces the rows rather than adding to them
+    artifacts.rebuild_index(db_path, artifact_dir, str(tmp_path / "audio"))
+    assert segment_counts(db_path) == {"legacy.mp4": 2, "processed.mp4": 2}
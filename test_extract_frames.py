@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from scripts.extract_frames import FRAME_SKIP, extract_frames, plan_shards
+from scripts.synthetic_media import make_slide_video
+
+
+@pytest.fixture(scope="module")
+def slide_video(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("video") / "slides.mp4")
+    make_slide_video(path, slides=8, seconds_per_slide=2.0, size=(320, 240))
+    return path
+
+
+@pytest.mark.parametrize("total_frames", [1, 14, 15, 16, 480, 1001])
+@pytest.mark.parametrize("workers", [1, 2, 3, 7])
+def test_plan_shards_cover_the_sampled_frames(total_frames, workers):
+    shards = plan_shards(total_frames, workers)
+
+    assert 1 <= len(shards) <= workers
+    assert shards[0][0] == 0 and shards[-1][1] == total_frames
+    assert all(shards[i][1] == shards[i + 1][0] for i in range(len(shards) - 1))
+    assert all(start % FRAME_SKIP == 0 and start < end for start, end in shards)
+
+
+@pytest.mark.parametrize("workers", [2, 3, 7])
+def test_parallel_extraction_matches_sequential(slide_video, workers):
+    sequential = extract_frames(slide_video)
+    parallel = extract_frames(slide_video, workers=workers)
+
+    assert [frame["frame_number"] for frame in parallel] == [frame["frame_number"] for frame in sequential]
+    assert all(np.array_equal(a["frame"], b["frame"]) for a, b in zip(parallel, sequential))
+    assert len(sequential) > 1
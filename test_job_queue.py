@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from scripts import job_queue
+from scripts.database import STAGE_AUDIO, STAGE_OCR, STAGE_TRANSCRIBE
+from scripts.job_queue import DONE, FAILED, QUEUED, RUNNING
+
+
+def _claim_all(db_path, worker):
+    """Claim jobs until the queue is empty (runs in a worker process)"""
+    claimed = []
+    while True:
+        job = job_queue.claim_job(worker, db_path)
+        if job is None:
+            return claimed
+        claimed.append(job["id"])
+
+
+def _run_stub(stage, job, db_path):
+    """Stand-in for a real stage: log the run and fail if asked to"""
+    job_queue.update_stage(job["id"], stage, 0.0, db_path=db_path)
+    workdir = os.path.dirname(db_path)
+    with open(os.path.join(workdir, "runs.log"), "a") as f:
+        f.write(stage + "\n")
+    if os.path.exists(os.path.join(workdir, f"fail-{stage}")):
+        raise RuntimeError(f"{stage} failed")
+    job_queue.update_stage(job["id"], stage, 1.0, status=DONE, db_path=db_path)
+
+
+def _stub_ocr(job, db_path, threads=1):
+    _run_stub(STAGE_OCR, job, db_path)
+
+
+def _stub_audio(job, db_path, threads=1):
+    _run_stub(STAGE_AUDIO, job, db_path)
+
+
+def _stub_transcribe(job, db_path, threads=1):
+    _run_stub(STAGE_TRANSCRIBE, job, db_path)
+
+
+def _make_stale(db_path, job_id):
+    with job_queue.jobs_connection(db_path) as conn:
+        conn.execute("UPDATE jobs SET updated_at = updated_at - ? WHERE id = ?",
+                     (job_queue.STALE_AFTER + 1, job_id))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+def test_each_job_is_claimed_once(db_path):
+    job_ids = [job_queue.enqueue(f"video{i}.mp4", db_path=db_path) for i in range(40)]
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=4, mp_context=context) as executor:
+        claims = list(executor.map(_claim_all, [db_path] * 4, [f"worker{i}" for i in range(4)]))
+
+    claimed = [job_id for worker_claims in claims for job_id in worker_claims]
+    assert sorted(claimed) == job_ids
+    for job_id in job_ids:
+        job = job_queue.get_job(job_id, db_path)
+        assert (job["status"], job["attempts"]) == (RUNNING, 1)
+
+
+def test_stale_jobs_are_requeued_until_max_attempts(db_path):
+    job_id = job_queue.enqueue("video.mp4", db_path=db_path)
+
+    for attempt in range(1, job_queue.MAX_ATTEMPTS + 1):
+        job = job_queue.claim_job(f"worker{attempt}", db_path)
+        assert (job["id"], job_queue.get_job(job_id, db_path)["attempts"]) == (job_id, attempt)
+        # A running job that keeps heartbeating is left alone
+        assert job_queue.claim_job("other", db_path) is None
+        _make_stale(db_path, job_id)
+
+    assert job_queue.claim_job("last", db_path) is None
+    job = job_queue.get_job(job_id, db_path)
+    assert (job["status"], job["error"]) == (FAILED, "Worker stopped responding")
+
+
+def test_job_stages_skip_done_stages(db_path):
+    job_id = job_queue.enqueue("video.mp4", db_path=db_path)
+    job_queue.update_stage(job_id, STAGE_AUDIO, 1.0, status=DONE, db_path=db_path)
+
+    stages = job_queue.job_stages(job_queue.get_job(job_id, db_path), db_path, cpu_budget=2)
+    assert [stage.name for stage in stages] == [STAGE_OCR, STAGE_TRANSCRIBE]
+    assert stages[1].deps == ()
+
+
+def test_failing_stage_fails_job_and_retry_resumes(tmp_path, db_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "_ocr_stage", _stub_ocr)
+    monkeypatch.setattr(job_queue, "_audio_stage", _stub_audio)
+    monkeypatch.setattr(job_queue, "_transcribe_stage", _stub_transcribe)
+    monkeypatch.setattr(job_queue, "reuse_checkpoints", lambda *args: [])
+    monkeypatch.setenv("WARM_UP_MODELS", "0")
+    video_path = tmp_path / "video.mp4"
+    video_path.write_bytes(b"not really a video")
+    job_id = job_queue.enqueue(str(video_path), db_path=db_path, video_hash="0" * 64)
+
+    (tmp_path / f"fail-{STAGE_TRANSCRIBE}").touch()
+    job_queue.run_worker("worker", db_path, poll_interval=0, once=True, cpu_budget=2)
+    job = job_queue.get_job(job_id, db_path)
+    assert (job["status"], job["error"]) == (FAILED, f"{STAGE_TRANSCRIBE} failed")
+    assert {stage: info["status"] for stage, info in job["stages"].items()} == {
+        STAGE_OCR: DONE, STAGE_AUDIO: DONE, STAGE_TRANSCRIBE: FAILED
+    }
+
+    job_queue.retry_job(job_id, db_path)
+    job = job_queue.get_job(job_id, db_path)
+    assert (job["status"], job["stages"][STAGE_TRANSCRIBE]["status"]) == (QUEUED, QUEUED)
+
+    (tmp_path / f"fail-{STAGE_TRANSCRIBE}").unlink()
+    job_queue.run_worker("worker", db_path, poll_interval=0, once=True, cpu_budget=2)
+    job = job_queue.get_job(job_id, db_path)
+    assert job["status"] == DONE
+    assert all(info["status"] == DONE for info in job["stages"].values())
+    runs = (tmp_path / "runs.log").read_text().split()
+    assert sorted(runs) == sorted([STAGE_OCR, STAGE_AUDIO, STAGE_TRANSCRIBE, STAGE_TRANSCRIBE])
+
+
+def test_stop_workers_stops_idle_workers(db_path):
+    assert job_queue.ensure_workers(2, db_path) == 2
+    workers = list(job_queue._workers)
+    # Live workers are kept, not started again
+    assert job_queue.ensure_workers(2, db_path) == 2
+    assert job_queue._workers == workers
+
+    job_queue.stop_workers(timeout=30)
+    assert job_queue._workers == []
+    assert [worker.exitcode for worker in workers] == [0, 0]
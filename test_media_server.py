@@ -0,0 +1,55 @@
+import io
+import os
+import urllib.error
+import urllib.request
+
+import pytest
+
+from scripts.media_server import start_media_server, stop_media_server
+from scripts.storage import SPOOL_CONTENT_DIR, spool_upload
+
+
+@pytest.fixture
+def server(tmp_path):
+    spool_dir = str(tmp_path / "spool")
+    os.makedirs(spool_dir)
+    server = start_media_server("127.0.0.1", 0, spool_dir)
+    yield spool_dir, f"http://127.0.0.1:{server.server_address[1]}"
+    stop_media_server()
+
+
+def fetch(url, headers=None):
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {})) as response:
+        return response.status, dict(response.headers), response.read()
+
+
+def status(url):
+    try:
+        return fetch(url)[0]
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_serves_spooled_videos_by_name(server):
+    spool_dir, base_url = server
+    spool_upload(io.BytesIO(b"0123456789"), "my video.mp4", spool_dir)
+
+    code, headers, body = fetch(f"{base_url}/my%20video.mp4")
+    assert (code, body, headers["Content-Type"]) == (200, b"0123456789", "video/mp4")
+    assert "Access-Control-Allow-Origin" not in headers
+
+    code, headers, body = fetch(f"{base_url}/my%20video.mp4", {"Range": "bytes=2-4"})
+    assert (code, body, headers["Content-Range"]) == (206, b"234", "bytes 2-4/10")
+
+
+def test_refuses_everything_else(server, tmp_path):
+    spool_dir, base_url = server
+    _, video_hash = spool_upload(io.BytesIO(b"0123456789"), "video.mp4", spool_dir)
+    os.makedirs(os.path.join(spool_dir, "frames_video"))
+    (tmp_path / "spool" / "frames_video" / "frame.jpg").write_bytes(b"jpeg")
+    (tmp_path / "spool" / ".hidden.mp4").write_bytes(b"hidden")
+    (tmp_path / "secret.mp4").write_bytes(b"secret")
+
+    for path in [f"{SPOOL_CONTENT_DIR}/{video_hash}.mp4", f"{SPOOL_CONTENT_DIR}%2F{video_hash}.mp4",
+                 ".hidden.mp4", "frames_video/frame.jpg", "..%2Fsecret.mp4", "", "missing.mp4"]:
+        assert status(f"{base_url}/{path}") == 404, path
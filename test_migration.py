@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+from scripts.database import LEGACY_TABLE, connect_for_writing, create_tables, migrate_legacy_metadata
+
+LEGACY_ROWS = [
+    # video_name, frame_number, timestamp, transcription, ocr_text, objects_detected
+    ("a.mp4", "0", "00:00:00", None, "Title slide", None),
+    ("a.mp4", "450", "00:00:15", None, "Second slide", None),
+    ("a.mp4", None, "00:01:02", "hello there", None, None),
+    ("b.mp4", "30", "01:00:01", None, "late slide", None),
+    ("b.mp4", None, "12.5", "plain seconds", None, None),
+    ("b.mp4", None, "", "empty timestamp", None, None),
+    ("b.mp4", None, None, "missing timestamp", None, None),
+    ("b.mp4", None, "not a time", "bad timestamp", None, None),
+]
+
+
+def make_legacy_db(db_path, fts=True):
+    conn = sqlite3.connect(db_path)
+    columns = "video_name, frame_number, timestamp, transcription, ocr_text, objects_detected"
+    if fts:
+        conn.execute(f"CREATE VIRTUAL TABLE {LEGACY_TABLE} USING fts5({columns})")
+    else:
+        conn.execute(f"CREATE TABLE {LEGACY_TABLE} ({columns})")
+    conn.executemany(f"INSERT INTO {LEGACY_TABLE} ({columns}) VALUES (?, ?, ?, ?, ?, ?)", LEGACY_ROWS)
+    conn.commit()
+    conn.close()
+
+
+def generation(conn):
+    return conn.execute("SELECT value FROM index_state WHERE key = 'generation'").fetchone()[0]
+
+
+@pytest.mark.parametrize("fts", [True, False])
+def test_migrate_legacy_metadata(tmp_path, fts):
+    db_path = str(tmp_path / "index.db")
+    make_legacy_db(db_path, fts)
+
+    conn = connect_for_writing(db_path)
+    assert migrate_legacy_metadata(conn) == len(LEGACY_ROWS)
+    create_tables(conn)
+
+    assert conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0] == 2
+    rows = conn.execute('''
+        SELECT v.name, s.source, s.frame_number, s.start_s, s.text
+        FROM segments s JOIN videos v ON v.id = s.video_id ORDER BY s.id
+    ''').fetchall()
+    assert sorted(rows) == sorted([
+        ("a.mp4", "ocr", 0, 0.0, "Title slide"),
+        ("a.mp4", "ocr", 450, 15.0, "Second slide"),
+        ("a.mp4", "transcript", None, 62.0, "hello there"),
+        ("b.mp4", "ocr", 30, 3601.0, "late slide"),
+        ("b.mp4", "transcript", None, 12.5, "plain seconds"),
+        ("b.mp4", "transcript", None, 0.0, "empty timestamp"),
+        ("b.mp4", "transcript", None, 0.0, "missing timestamp"),
+        ("b.mp4", "transcript", None, 0.0, "bad timestamp"),
+    ])
+    # The migrated text is searchable
+    assert conn.execute("SELECT COUNT(*) FROM segments_fts WHERE segments_fts MATCH 'slide'").fetchone()[0] == 3
+    assert generation(conn) == 1
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (LEGACY_TABLE,)).fetchone() is None
+
+    # A second run finds nothing to migrate and changes nothing
+    assert migrate_legacy_metadata(conn) == 0
+    create_tables(conn)
+    assert conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0] == len(LEGACY_ROWS)
+    assert generation(conn) == 1
+    conn.close()
+
+
+def test_keep_legacy_table(tmp_path):
+    db_path = str(tmp_path / "index.db")
+    make_legacy_db(db_path)
+
+    conn = connect_for_writing(db_path)
+    assert migrate_legacy_metadata(conn, drop_legacy=False) == len(LEGACY_ROWS)
+    assert migrate_legacy_metadata(conn, drop_legacy=False) == 0
+    assert conn.execute(f"SELECT COUNT(*) FROM {LEGACY_TABLE}_legacy").fetchone()[0] == len(LEGACY_ROWS)
+    assert conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0] == len(LEGACY_ROWS)
+    conn.close()
@@ -0,0 +1,136 @@
+from collections import Counter
+
+import pytest
+
+from scripts import search_cache, semantic_index
+from scripts.database import SOURCE_OCR, IndexWriter, encode_cursor, mark_matches, search_metadata, search_page
+from scripts.synthetic_media import synthetic_rows
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    db_path = str(tmp_path / "index.db")
+    with IndexWriter(db_path) as writer:
+        for video, source, start_s, text, frame_number in synthetic_rows(2000, videos=10):
+            writer.add_segment(video, source, start_s, text, frame_number=frame_number)
+    return db_path
+
+
+def all_pages(search_query, db_path, page_size, **kwargs):
+    """Every page of a search, as lists of results"""
+    pages, cursor = [], None
+    while True:
+        page = search_page(search_query, db_path, page_size=page_size, cursor=cursor, **kwargs)
+        pages.append(page["results"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def key(result):
+    return result["video_name"], result["source"], result["start_s"]
+
+
+def test_results_are_html_escaped(tmp_path):
+    db_path = str(tmp_path / "index.db")
+    with IndexWriter(db_path) as writer:
+        writer.add_segment("slides.mp4", SOURCE_OCR, 1.0, '<script>alert("x")</script> & scripted')
+
+    found = search_metadata("script", db_path) + search_page("script", db_path)["results"]
+    assert len(found) == 2
+    for result in found:
+        for key in ("snippet", "highlighted"):
+            assert "<script>" not in result[key]
+            assert "&lt;<mark>script</mark>&gt;" in result[key]
+            assert "&amp; <mark>scripted</mark>" in result[key]
+
+
+def test_mark_matches():
+    assert mark_matches("a <b> c", ["b"]) == "a &lt;<mark>b</mark>&gt; c"
+    assert mark_matches(" ".join(["x"] * 20 + ["hit"]), ["hit"], snippet_tokens=8).endswith("x <mark>hit</mark>")
+
+
+@pytest.mark.parametrize("search_query,sources", [
+    ("gradient", None), ("neural network", None), ("slide", ["ocr"]), ("training", ["transcript"]),
+])
+def test_pages_follow_search_metadata_order(index_path, search_query, sources):
+    expected = search_metadata(search_query, index_path, sources)
+    pages = all_pages(search_query, index_path, page_size=7, sources=sources)
+
+    assert len(expected) > 7
+    assert all(len(page) == 7 for page in pages[:-1])
+    found = [result for page in pages for result in page]
+    assert [result["rank"] for result in found] == pytest.approx([result["rank"] for result in expected])
+    assert [key(result) for result in found] == [key(result) for result in expected]
+
+
+def test_inserts_between_pages_do_not_shift_pages(index_path):
+    first = search_page("gradient", index_path, page_size=10)
+    second = search_page("gradient", index_path, page_size=10, cursor=first["next_cursor"])
+    # Rows that do not even match move every BM25 score a little
+    with IndexWriter(index_path) as writer:
+        for i in range(20):
+            writer.add_segment("late.mp4", SOURCE_OCR, float(i), "unrelated words")
+
+    # A cursor from before the insert is refused rather than continuing
+    # from a position that no longer means the same
+    with pytest.raises(ValueError, match="Stale cursor"):
+        search_page("gradient", index_path, page_size=10, cursor=first["next_cursor"])
+
+    # Starting over pages through the new ranking without gaps or repeats
+    pages = all_pages("gradient", index_path, page_size=10)
+    found = [key(result) for page in pages for result in page]
+    assert found == [key(result) for result in search_metadata("gradient", index_path)]
+    assert len(first["results"]) == len(second["results"]) == 10
+
+
+def test_cached_pages_start_over_when_the_index_changes(index_path, monkeypatch):
+    calls = []
+
+    def insert_after_first_page(*args):
+        page = search_page(*args)
+        calls.append(args[4])
+        if len(calls) == 1:
+            with IndexWriter(index_path) as writer:
+                writer.add_segment("late.mp4", SOURCE_OCR, 0.0, "gradient")
+        return page
+
+    monkeypatch.setattr(search_cache, "search_page", insert_after_first_page)
+    search_cache.get_search_cache().clear()
+    results, has_more = search_cache.cached_search_pages("gradient", 3, index_path, page_size=10)
+
+    assert has_more
+    assert [key(result) for result in results] == [key(result) for result in search_metadata("gradient", index_path)][:30]
+    assert calls.count(None) == 2
+
+
+@pytest.mark.parametrize("cap", [1, 3])
+def test_per_video_cap(index_path, cap):
+    found = [result for page in all_pages("neural", index_path, page_size=4, per_video_cap=cap) for result in page]
+    per_video = Counter(result["video_name"] for result in found)
+    assert set(per_video.values()) == {cap}
+    assert len(per_video) == 10
+    # The kept results are each video's best ones
+    for video in per_video:
+        best = [key(result) for result in search_metadata("neural", index_path) if result["video_name"] == video][:cap]
+        assert [key(result) for result in found if result["video_name"] == video] == best
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "e30=", encode_cursor("x", 1, 1)[:-2], encode_cursor(1.0, 2, 3)[:-4]])
+def test_malformed_cursor_raises_value_error(index_path, cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        search_page("gradient", index_path, cursor=cursor)
+
+
+@pytest.mark.parametrize("search", [search_metadata, search_page, semantic_index.hybrid_search,
+                                    semantic_index.semantic_search])
+def test_unknown_source_raises_value_error(index_path, search):
+    with pytest.raises(ValueError, match="Unknown source: slides"):
+        search("gradient", index_path, sources=["ocr", "slides"])
+
+
+def test_hybrid_search_fills_large_limits(index_path):
+    for limit in (20, 250):
+        results = semantic_index.hybrid_search("gradient descent", index_path, limit=limit)
+        assert len(results) == limit
+        assert len({key(result) for result in results}) == limit
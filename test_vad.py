@@ -0,0 +1,64 @@
+import numpy as np
+
+from scripts.synthetic_media import make_speech_audio
+from scripts.vad import MAX_CHUNK_S, VAD_FRAME_S, speech_chunks, speech_regions
+
+SAMPLE_RATE = 16000
+
+
+def tone(duration_s, amplitude=0.3, frequency=220.0):
+    t = np.arange(int(duration_s * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def overlap(region, regions):
+    return sum(max(0.0, min(region[1], end) - max(region[0], start)) for start, end in regions)
+
+
+def test_speech_regions_find_speech_and_skip_silence():
+    audio, truth = make_speech_audio(120.0, speech_ratio=0.5)
+    regions = speech_regions(audio)
+
+    for region in truth:
+        assert overlap(region, regions) >= 0.95 * (region[1] - region[0])
+    detected = sum(end - start for start, end in regions)
+    spoken = sum(end - start for start, end in truth)
+    assert spoken <= detected < 120.0 * 0.8
+
+
+def test_speech_without_a_noise_floor_is_kept():
+    # Constant loudness has no quiet frames to compare with
+    regions = speech_regions(tone(20.0))
+    assert len(regions) == 1
+    assert regions[0][0] == 0.0 and regions[0][1] > 19.9
+
+
+def test_digital_silence_has_no_speech():
+    silence = np.zeros(20 * SAMPLE_RATE, dtype=np.float32)
+    assert speech_regions(silence) == []
+    assert speech_chunks(silence) == []
+
+
+def test_chunks_are_capped_and_cover_all_speech():
+    audio = tone(95.0)
+    chunks = speech_chunks(audio)
+
+    assert len(chunks) == 4
+    assert all(end - start <= MAX_CHUNK_S for start, end in chunks)
+    assert chunks[0][0] == 0.0 and chunks[-1][1] > 94.9
+    assert all(chunks[i][1] == chunks[i + 1][0] for i in range(len(chunks) - 1))
+
+    audio, _ = make_speech_audio(300.0, speech_ratio=0.9)
+    assert all(end - start <= MAX_CHUNK_S for start, end in speech_chunks(audio))
+
+
+def test_long_speech_is_split_at_the_quietest_frame():
+    audio = tone(50.0)
+    # A short dip, bridged as a pause, in the second half of the first 30 s
+    dip_start, dip_end = 22.0, 22.12
+    audio[int(dip_start * SAMPLE_RATE):int(dip_end * SAMPLE_RATE)] *= 0.001
+    chunks = speech_chunks(audio)
+
+    assert len(chunks) == 2
+    assert dip_start - VAD_FRAME_S <= chunks[0][1] <= dip_end
+    assert chunks[1] == (chunks[0][1], chunks[1][1])